@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from benchmarks.treegen import TreeSpec, generate_log, generate_tree
+from src.operations import Operations
+
+# Наборы параметров дерева для разных масштабов
+SCALES = {
+    "tiny": TreeSpec(depth=2, fanout=2, files_per_dir=5, mean_size=2048),
+    "small": TreeSpec(depth=3, fanout=4, files_per_dir=10, mean_size=4096),
+    "medium": TreeSpec(depth=4, fanout=5, files_per_dir=20, mean_size=8192),
+    "large": TreeSpec(depth=5, fanout=6, files_per_dir=25, mean_size=16384),
+}
+LOG_LINES = {"tiny": 10_000, "small": 100_000, "medium": 1_000_000, "large": 5_000_000}
+
+
+class Bench:
+    """
+    Рабочая директория с синтетическим деревом "tree" и логом "log.txt".
+    Каждый замер получает свежий экземпляр Operations с отдельным кэшем.
+    """
+
+    def __init__(self, scale: str, tmp: str):
+        self.scale = scale
+        self.spec = SCALES[scale]
+        self.root = os.path.join(tmp, "data")
+        self.cache_root = os.path.join(tmp, "cache")
+        self.tree = generate_tree(os.path.join(self.root, "tree"), self.spec)
+        self.log_bytes = generate_log(os.path.join(self.root, "log.txt"), LOG_LINES[scale])
+        os.makedirs(os.path.join(self.root, "dst"))
+        self._caches = 0
+
+    def ops(self, warm: Operations = None) -> Operations:
+        """
+        Возвращает новый Operations с пустым кэшем (или тот же кэш, что у warm).
+        """
+        if warm is not None:
+            return Operations(self.root, warm.cache_dir)
+        self._caches += 1
+        return Operations(self.root, os.path.join(self.cache_root, str(self._caches)))
+
+    def reset(self, *names: str) -> None:
+        for name in names:
+            path = os.path.join(self.root, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+
+
+def measure(run: callable, setup: callable = None, repeat: int = 3) -> list[float]:
+    """
+    Замеряет run() repeat раз; setup() выполняется перед каждым замером и не учитывается.
+    Вывод операций подавляется.
+    """
+    timings = []
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for _ in range(repeat):
+            context = setup() if setup else None
+            started = time.perf_counter()
+            run(context)
+            timings.append(time.perf_counter() - started)
+            if context is not None:
+                context.close()
+    return timings
+
+
+def cases(bench: Bench) -> dict:
+    """
+    Сценарии замеров: имя -> (setup, run, обработанный объем в байтах).
+    """
+    tree_bytes = bench.tree["bytes"]
+
+    def fresh(_=None):
+        return bench.ops()
+
+    def warm_index(_=None):
+        ops = bench.ops()
+        ops.find_dest_folders("dst")
+        ops.close()
+        return bench.ops(ops)
+
+    def copy_setup(_=None):
+        bench.reset(os.path.join("dst", "tree"))
+        return bench.ops()
+
+    def move_setup(_=None):
+        bench.reset("moved", os.path.join("dst", "moved"))
+        shutil.copytree(os.path.join(bench.root, "tree"), os.path.join(bench.root, "moved"))
+        return bench.ops()
+
+    def zip_setup(_=None):
+        bench.reset("tree.zip")
+        return bench.ops()
+
+    def unzip_setup(_=None):
+        bench.reset("unzipped")
+        ops = bench.ops()
+        if not os.path.exists(os.path.join(bench.root, "bench.zip")):
+            ops.zip_file_or_folder("tree", "bench.zip")
+        return ops
+
+    def unzip_warm_setup(_=None):
+        ops = unzip_setup()
+        ops.unzip_archive("bench.zip", "unzipped")
+        return ops
+
+    def delete_setup(_=None):
+        bench.reset("doomed")
+        shutil.copytree(os.path.join(bench.root, "tree"), os.path.join(bench.root, "doomed"))
+        return bench.ops()
+
+    def delete_run(ops):
+        ops.delete_folder("doomed")
+        ops.trash.wait()
+
+    return {
+        "list_files": (fresh, lambda ops: ops.list_files(depth=0), 0),
+        "list_files_sorted_page": (fresh, lambda ops: ops.list_files(depth=0, sort="size", limit=100), 0),
+        "find_dest_folders_cold": (fresh, lambda ops: ops.find_dest_folders("dst"), 0),
+        "find_dest_folders_warm": (warm_index, lambda ops: ops.find_dest_folders("dst"), 0),
+        "copy_file_tree": (copy_setup, lambda ops: ops.copy_file("tree", "dst"), tree_bytes),
+        "move_file_tree": (move_setup, lambda ops: ops.move_file("moved", "dst"), tree_bytes),
+        "zip_file_or_folder": (zip_setup, lambda ops: ops.zip_file_or_folder("tree", "tree.zip"), tree_bytes),
+        "unzip_archive_cold": (unzip_setup, lambda ops: ops.unzip_archive("bench.zip", "unzipped"), tree_bytes),
+        "unzip_archive_unchanged": (unzip_warm_setup, lambda ops: ops.unzip_archive("bench.zip", "unzipped"),
+                                    tree_bytes),
+        "read_file_full": (fresh, lambda ops: ops.read_file("log.txt"), bench.log_bytes),
+        "read_file_tail": (fresh, lambda ops: ops.read_file("log.txt", "tail", 100), 0),
+        "delete_folder_visible": (delete_setup, lambda ops: ops.delete_folder("doomed"), 0),
+        "delete_folder_total": (delete_setup, delete_run, 0),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scales: list[str], repeat: int = 3, only: list[str] = None) -> dict:
+    """
+    Прогоняет все сценарии на каждом масштабе и возвращает результаты в виде словаря.
+    """
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            bench = Bench(scale, tmp)
+            for name, (setup, run, volume) in cases(bench).items():
+                if only and name not in only:
+                    continue
+                timings = measure(run, setup, repeat)
+                best = min(timings)
+                results.append({
+                    "name": name, "scale": scale, "files": bench.tree["files"], "dirs": bench.tree["dirs"],
+                    "repeat": repeat, "min": best, "median": statistics.median(timings),
+                    "mean": statistics.fmean(timings),
+                    "mb_per_sec": volume / best / 1024 / 1024 if volume and best else None,
+                })
+                print(f"{scale:>6} {name:<28} {best * 1000:10.2f} мс", file=sys.stderr)
+            # Дожидаемся фонового удаления перед удалением временной папки
+            ops = bench.ops()
+            try:
+                ops.trash.wait()
+            finally:
+                ops.close()
+    return {
+        "meta": {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "specs": {scale: SCALES[scale].as_dict() for scale in scales}},
+        "results": results,
+    }
+
+
+def compare(old: dict, new: dict, threshold: float = 0.2) -> list[str]:
+    """
+    Сравнивает два файла результатов по минимальному времени.
+    Возвращает описания регрессий, где новое время больше старого более чем на threshold.
+    """
+    before = {(r["scale"], r["name"]): r["min"] for r in old["results"]}
+    regressions = []
+    for result in new["results"]:
+        key = (result["scale"], result["name"])
+        if key not in before or not before[key]:
+            continue
+        change = result["min"] / before[key] - 1
+        line = f"{key[0]:>6} {key[1]:<28} {before[key] * 1000:10.2f} -> {result['min'] * 1000:10.2f} мс ({change:+.0%})"
+        print(line)
+        if change > threshold:
+            regressions.append(line)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарки операций файлового менеджера")
+    parser.add_argument("--scale", action="append", choices=list(SCALES),
+                        help="масштаб дерева (можно указать несколько раз, по умолчанию tiny и small)")
+    parser.add_argument("--repeat", type=int, default=3, help="сколько раз повторять каждый замер")
+    parser.add_argument("--only", action="append", help="запустить только указанный сценарий")
+    parser.add_argument("--output", default="bench_results.json", help="куда сохранить результаты (JSON)")
+    parser.add_argument("--compare", nargs=2, metavar=("СТАРЫЙ", "НОВЫЙ"),
+                        help="сравнить два файла результатов вместо запуска")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="допустимое замедление при сравнении (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f_old, open(args.compare[1], encoding="utf-8") as f_new:
+            regressions = compare(json.load(f_old), json.load(f_new), args.threshold)
+        if regressions:
+            print(f"\nРегрессий: {len(regressions)}")
+        return 1 if regressions else 0
+
+    report = run_suite(args.scale or ["tiny", "small"], args.repeat, args.only)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
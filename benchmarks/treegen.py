@@ -0,0 +1,90 @@
+import math
+import os
+import random
+
+# Распределения размеров файлов
+SIZE_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+
+class TreeSpec:
+    """
+    Параметры синтетического дерева.
+
+    depth — число уровней вложенности, fanout — папок на каждом уровне,
+    files_per_dir — файлов в каждой папке, mean_size — средний размер файла,
+    size_distribution — fixed, uniform или lognormal,
+    compressibility — доля "сжимаемых" байт в файле (0 — случайные данные, 1 — нули),
+    seed — зерно генератора: одинаковые параметры дают одинаковое дерево.
+    """
+
+    def __init__(self, depth: int = 3, fanout: int = 4, files_per_dir: int = 10, mean_size: int = 4096,
+                 size_distribution: str = "lognormal", compressibility: float = 0.5, seed: int = 42):
+        if size_distribution not in SIZE_DISTRIBUTIONS:
+            raise ValueError(f"Неизвестное распределение: {size_distribution}")
+        self.depth = depth
+        self.fanout = fanout
+        self.files_per_dir = files_per_dir
+        self.mean_size = mean_size
+        self.size_distribution = size_distribution
+        self.compressibility = compressibility
+        self.seed = seed
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def _file_size(rng: random.Random, spec: TreeSpec) -> int:
+    if spec.size_distribution == "fixed":
+        return spec.mean_size
+    if spec.size_distribution == "uniform":
+        return rng.randint(0, 2 * spec.mean_size)
+    # Логнормальное распределение со средним mean_size: много мелких файлов и немного крупных
+    return int(rng.lognormvariate(0, 1.0) * spec.mean_size / math.exp(0.5))
+
+
+def _content(rng: random.Random, size: int, compressibility: float) -> bytes:
+    """
+    Смесь случайных байт и повторяющегося текста в пропорции compressibility.
+    """
+    compressible = int(size * compressibility)
+    text = b"benchmark line of repetitive text\n"
+    filler = (text * (compressible // len(text) + 1))[:compressible]
+    return rng.randbytes(size - compressible) + filler
+
+
+def generate_tree(root: str, spec: TreeSpec) -> dict:
+    """
+    Создает дерево в root по спецификации. Возвращает число папок, файлов и байт.
+    """
+    rng = random.Random(spec.seed)
+    stats = {"dirs": 0, "files": 0, "bytes": 0}
+    level = [root]
+    os.makedirs(root, exist_ok=True)
+    for depth in range(spec.depth + 1):
+        next_level = []
+        for directory in level:
+            stats["dirs"] += 1
+            for i in range(spec.files_per_dir):
+                size = _file_size(rng, spec)
+                with open(os.path.join(directory, f"file_{i:04d}.dat"), "wb") as f:
+                    f.write(_content(rng, size, spec.compressibility))
+                stats["files"] += 1
+                stats["bytes"] += size
+            if depth < spec.depth:
+                for i in range(spec.fanout):
+                    child = os.path.join(directory, f"dir_{depth}_{i:03d}")
+                    os.mkdir(child)
+                    next_level.append(child)
+        level = next_level
+    return stats
+
+
+def generate_log(path: str, lines: int, seed: int = 42) -> int:
+    """
+    Создает текстовый лог из lines строк для бенчмарков чтения. Возвращает размер в байтах.
+    """
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            f.write(f"{i:09d} level={rng.choice(('INFO', 'WARN', 'ERROR'))} value={rng.random():.6f}\n")
+    return os.path.getsize(path)
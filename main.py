@@ -1,5 +1,57 @@
-from src.interaction import FileManager
+import argparse
+import sys
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Файловый менеджер")
+    parser.add_argument("--batch", metavar="ФАЙЛ",
+                        help="выполнить команды из файла без диалога ('-' — читать из stdin)")
+    parser.add_argument("--output", metavar="ФАЙЛ",
+                        help="куда писать результаты пакета в формате JSONL (по умолчанию stdout)")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="сколько независимых команд пакета выполнять одновременно")
+    parser.add_argument("--dest-policy", choices=["nearest", "first", "error"], default="nearest",
+                        help="как выбирать папку для cp/mv, если найдено несколько с одним именем")
+    parser.add_argument("--trace", metavar="ФАЙЛ",
+                        help="дописывать замер каждой команды в файл: JSONL или Chrome trace (*.json)")
+    parser.add_argument("--profile", metavar="КОМАНДЫ",
+                        help="профилировать указанные команды, например cp,zip")
+    parser.add_argument("--profile-mode", choices=["cprofile", "sample"], default="cprofile",
+                        help="cprofile — точный профиль (*.prof), sample — выборки стека (*.folded)")
+    parser.add_argument("--profile-dir", metavar="ПАПКА", help="куда сохранять профили")
+    parser.add_argument("--daemon", action="store_true",
+                        help="работать демоном: принимать команды клиентов (python -m src.client) через сокет")
+    parser.add_argument("--socket", metavar="ПУТЬ", help="путь к сокету демона")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    manager = FileManager()
-    manager.run()
\ No newline at end of file
+    args = parse_args()
+    # Движок импортируется после разбора аргументов: --help не платит за его загрузку
+    from src.config.settings import DAEMON_SOCKET, PROJECT_DIRECTORY, WORKING_DIRECTORY
+    from src.interaction import FileManager
+    from src.metrics import Metrics
+
+    # Пишем в stderr, чтобы не смешивать с результатами пакетного режима в stdout
+    print(f"Корневая папка проекта: {PROJECT_DIRECTORY}", file=sys.stderr)
+    print(f"Рабочая папка: {WORKING_DIRECTORY}", file=sys.stderr)
+    manager = FileManager(metrics=Metrics(args.trace, set(args.profile.split(",")) if args.profile else None,
+                                          args.profile_mode, args.profile_dir))
+    if args.batch:
+        from src.batch import BatchRunner
+
+        source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            ok = BatchRunner(manager, out, args.workers, args.dest_policy).run(source)
+        finally:
+            for stream in (source, out):
+                if stream not in (sys.stdin, sys.stdout):
+                    stream.close()
+        sys.exit(0 if ok else 1)
+    if args.daemon:
+        from src.daemon import run_daemon
+
+        run_daemon(manager, args.socket or DAEMON_SOCKET, args.dest_policy)
+        sys.exit(0)
+    manager.run()
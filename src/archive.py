@@ -0,0 +1,427 @@
+import bz2
+import contextlib
+import fnmatch
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from src import metrics
+from src.errors import OperationCancelledError
+from src.paths import PathResolver, beneath
+
+# Методы сжатия, доступные из командной строки
+COMPRESSION_METHODS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+# Файлы, которые уже сжаты: повторное сжатие только тратит процессор
+PRECOMPRESSED_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".lzma", ".zst", ".7z", ".rar",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp3", ".mp4", ".mkv", ".avi",
+    ".mov", ".ogg", ".flac", ".pdf", ".docx", ".xlsx", ".pptx", ".jar", ".whl",
+}
+
+CHUNK_SIZE = 1024 * 1024
+# Версии CPython, на которых проверена дозапись уже сжатых записей
+# (_write_member меняет внутренние поля ZipFile). На остальных архив
+# пишется последовательно через zipf.write.
+RAW_WRITE_VERSIONS = {(3, 10), (3, 11), (3, 12), (3, 13)}
+# Сжатые данные держатся в памяти до этого размера, дальше уходят во временный файл
+SPOOL_SIZE = 8 * 1024 * 1024
+
+
+class ArchiveStats:
+    """
+    Итоги работы с архивом: число файлов, объем до и после обработки, время.
+    При распаковке (unpacking) bytes_in — сжатые данные, bytes_out — распакованные.
+    """
+
+    def __init__(self, unpacking: bool = False):
+        self.unpacking = unpacking
+        self.files = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """
+        Скорость обработки несжатых данных в байтах в секунду.
+        """
+        size = self.bytes_out if self.unpacking else self.bytes_in
+        return size / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        mb = 1024 * 1024
+        skipped = f", без изменений {self.skipped}" if self.skipped else ""
+        return (f"{self.files} файлов{skipped}, {self.bytes_in / mb:.1f} МБ -> {self.bytes_out / mb:.1f} МБ "
+                f"за {self.seconds:.2f} с ({self.throughput / mb:.1f} МБ/с)")
+
+
+def collect_members(source_path: str, skip: set[str] = frozenset(),
+                    ignore: set[str] = frozenset()) -> list[tuple[str, str]]:
+    """
+    Возвращает пары (путь к файлу, имя в архиве) для файла или папки.
+    skip — пути файлов, которые не берутся (сам архив), ignore — имена
+    служебных папок, которые не обходятся.
+    """
+    if not os.path.isdir(source_path):
+        return [(source_path, os.path.basename(source_path))]
+    members = []
+    for root, dirs, files in metrics.timed(os.walk(source_path), "walk"):
+        dirs[:] = [name for name in dirs if name not in ignore]
+        for file in files:
+            file_path = os.path.join(root, file)
+            if file_path in skip:
+                continue
+            members.append((file_path, os.path.relpath(file_path, start=source_path)))
+    return members
+
+
+def _compressor(method: int, level: int | None):
+    """
+    Компрессор для метода ZIP с теми же настройками, что у zipfile.
+    """
+    if method == zipfile.ZIP_DEFLATED:
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15)
+    if method == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Compressor(9 if level is None else level)
+    if method == zipfile.ZIP_LZMA:
+        return zipfile.LZMACompressor()
+    return None
+
+
+def _compress_member(file_path: str, arcname: str, method: int, level: int | None):
+    """
+    Сжимает один файл в буфер (память или временный файл).
+    Выполняется в рабочем потоке: zlib, bz2 и lzma отпускают GIL.
+    """
+    zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+    if os.path.splitext(file_path)[1].lower() in PRECOMPRESSED_EXTENSIONS:
+        method = zipfile.ZIP_STORED
+    zinfo.compress_type = method
+    if method == zipfile.ZIP_LZMA:
+        zinfo.flag_bits |= 0x02
+    compressor = _compressor(method, level)
+
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    crc = 0
+    size = 0
+    with open(file_path, "rb") as f:
+        while True:
+            with metrics.phase("read"):
+                chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            with metrics.phase("compress"):
+                buffer.write(compressor.compress(chunk) if compressor else chunk)
+    if compressor:
+        with metrics.phase("compress"):
+            buffer.write(compressor.flush())
+    zinfo.CRC = crc
+    zinfo.file_size = size
+    zinfo.compress_size = buffer.tell()
+    buffer.seek(0)
+    return zinfo, buffer
+
+
+def _raw_write_supported(zipf: zipfile.ZipFile) -> bool:
+    """
+    Можно ли дописывать в zipf уже сжатые записи (см. RAW_WRITE_VERSIONS).
+    """
+    return (sys.implementation.name == "cpython" and sys.version_info[:2] in RAW_WRITE_VERSIONS
+            and all(hasattr(zipf, name) for name in ("fp", "filelist", "NameToInfo", "start_dir", "_didModify")))
+
+
+def _write_member(zipf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, buffer) -> None:
+    """
+    Дописывает в архив уже сжатую запись, не пересжимая ее. У ZipFile
+    нет открытого способа это сделать, поэтому вызывается только там,
+    где _raw_write_supported.
+    """
+    zinfo.header_offset = zipf.fp.tell()
+    zipf.fp.write(zinfo.FileHeader())
+    shutil.copyfileobj(buffer, zipf.fp, CHUNK_SIZE)
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+    zipf.start_dir = zipf.fp.tell()
+    zipf._didModify = True
+
+
+def _check_stop(should_stop: callable) -> None:
+    if should_stop is not None and should_stop():
+        raise OperationCancelledError("Операция отменена")
+
+
+def _write_sequential(zipf: zipfile.ZipFile, members: list[tuple[str, str]], method: int,
+                      level: int | None, stats: ArchiveStats, should_stop: callable = None) -> None:
+    """
+    Записывает файлы по одному через открытый API zipfile (без параллельного сжатия).
+    """
+    for file_path, arcname in members:
+        _check_stop(should_stop)
+        member_method = method
+        if os.path.splitext(file_path)[1].lower() in PRECOMPRESSED_EXTENSIONS:
+            member_method = zipfile.ZIP_STORED
+        with metrics.phase("compress"):
+            zipf.write(file_path, arcname, member_method, level)
+        zinfo = zipf.infolist()[-1]
+        stats.files += 1
+        stats.bytes_in += zinfo.file_size
+        stats.bytes_out += zinfo.compress_size
+
+
+def create_zip(source_path: str, archive_path: str, method: int = zipfile.ZIP_DEFLATED,
+               level: int | None = None, workers: int | None = None,
+               should_stop: callable = None, ignore: set[str] = frozenset()) -> ArchiveStats:
+    """
+    Создает ZIP-архив из файла или папки.
+
+    Файлы сжимаются параллельно в пуле потоков, а единственный писатель
+    дописывает готовые записи в архив в исходном порядке. Число записей
+    "в полете" ограничено, поэтому память не растет с размером папки.
+    На версиях Python не из RAW_WRITE_VERSIONS файлы сжимаются по очереди.
+    should_stop() проверяется между записями; если он вернул True, работа прерывается.
+    Папки с именами из ignore (служебные) в архив не попадают.
+    При любой ошибке или отмене недописанный архив удаляется, а буферы
+    уже сжатых записей закрываются.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = ArchiveStats()
+    started = time.perf_counter()
+    members = collect_members(source_path, skip={os.path.abspath(archive_path)}, ignore=ignore)
+    compress_member = metrics.bind(_compress_member)
+    pending = deque()
+    opened = completed = False
+
+    try:
+        with zipfile.ZipFile(archive_path, "w") as zipf, ThreadPoolExecutor(workers) as pool:
+            opened = True
+            if not _raw_write_supported(zipf):
+                _write_sequential(zipf, members, method, level, stats, should_stop)
+                members = []
+            members_iter = iter(members)
+
+            def submit_next() -> bool:
+                member = next(members_iter, None)
+                if member is None:
+                    return False
+                pending.append(pool.submit(compress_member, *member, method, level))
+                return True
+
+            for _ in range(workers * 2):
+                if not submit_next():
+                    break
+            try:
+                while pending:
+                    zinfo, buffer = pending.popleft().result()
+                    with buffer:
+                        _check_stop(should_stop)
+                        submit_next()
+                        with metrics.phase("write"):
+                            _write_member(zipf, zinfo, buffer)
+                    stats.files += 1
+                    stats.bytes_in += zinfo.file_size
+                    stats.bytes_out += zinfo.compress_size
+            except BaseException:
+                # Еще не начатое сжатие отменяем, чтобы пул не ждал его при выходе
+                for future in pending:
+                    future.cancel()
+                raise
+        completed = True
+    finally:
+        if not completed:
+            # Сжатые, но не записанные записи держат память или временные файлы
+            for future in pending:
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    future.result()[1].close()
+            # Недописанный архив не оставляем (ошибка, отмена, таймаут)
+            if opened:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(archive_path)
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def select_members(infolist: list[zipfile.ZipInfo], patterns: list[str] | None) -> list[zipfile.ZipInfo]:
+    """
+    Отбирает записи архива по списку имен или glob-шаблонов.
+    Шаблон, совпадающий с папкой, выбирает все ее содержимое.
+    """
+    if not patterns:
+        return list(infolist)
+    selected = []
+    for info in infolist:
+        name = info.filename.rstrip("/")
+        if any(fnmatch.fnmatchcase(name, pattern.rstrip("/"))
+               or name.startswith(pattern.rstrip("/") + "/") for pattern in patterns):
+            selected.append(info)
+    return selected
+
+
+def member_target(extract_path: str, info: zipfile.ZipInfo) -> str:
+    """
+    Возвращает путь для записи архива так же, как ZipFile.extract:
+    абсолютные пути, буквы дисков и ".." отбрасываются.
+    """
+    arcname = info.filename.replace("/", os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [part for part in arcname.split(os.path.sep) if part not in ("", os.path.curdir, os.path.pardir)]
+    return os.path.join(extract_path, *parts)
+
+
+def _is_unchanged(resolver: PathResolver, target: str, info: zipfile.ZipInfo) -> bool:
+    """
+    Проверяет, что файл на диске совпадает с записью по размеру и CRC.
+    """
+    try:
+        with metrics.phase("read"), open(target, "rb", opener=resolver.opener) as f:
+            if os.fstat(f.fileno()).st_size != info.file_size:
+                return False
+            crc = 0
+            while chunk := f.read(CHUNK_SIZE):
+                crc = zlib.crc32(chunk, crc)
+    except OSError:
+        # Нет файла, папка вместо файла или ссылка: запись распаковывается заново
+        return False
+    return crc == info.CRC
+
+
+def _extract_share(archive_path: str, extract_path: str, share: list[zipfile.ZipInfo],
+                   resolver: PathResolver, created: list[str], should_stop: callable = None) -> ArchiveStats:
+    """
+    Распаковывает свою часть записей через отдельный дескриптор архива.
+    Файлы открываются через resolver: ссылка внутри папки распаковки
+    не выведет запись за пределы его корня. Пути новых файлов (которых
+    не было до распаковки) добавляются в created.
+    """
+    stats = ArchiveStats(unpacking=True)
+    with zipfile.ZipFile(archive_path, "r") as zipf:
+        for info in share:
+            _check_stop(should_stop)
+            target = member_target(extract_path, info)
+            if _is_unchanged(resolver, target, info):
+                stats.skipped += 1
+                continue
+            try:
+                dst = open(target, "xb", opener=resolver.opener)
+                created.append(target)
+            except FileExistsError:
+                dst = open(target, "wb", opener=resolver.opener)
+            with zipf.open(info) as src, dst:
+                while True:
+                    with metrics.phase("compress"):
+                        chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    with metrics.phase("write"):
+                        dst.write(chunk)
+            stats.files += 1
+            stats.bytes_in += info.compress_size
+            stats.bytes_out += info.file_size
+    return stats
+
+
+def _discard_extracted(resolver: PathResolver, files: list[str], dirs: list[str]) -> None:
+    """
+    Удаляет файлы и (пустые) папки, созданные прерванной распаковкой.
+    """
+    for path in files:
+        with contextlib.suppress(OSError), resolver.open_target(path, follow=False) as target:
+            os.unlink(target.name, dir_fd=target.dir_fd)
+    for path in reversed(dirs):
+        with contextlib.suppress(OSError), resolver.open_target(path, follow=False) as target:
+            os.rmdir(target.name, dir_fd=target.dir_fd)
+
+
+def extract_zip(archive_path: str, extract_path: str, patterns: list[str] | None = None,
+                workers: int | None = None, should_stop: callable = None,
+                resolver: PathResolver = None) -> ArchiveStats:
+    """
+    Распаковывает архив параллельно.
+
+    Дерево папок создается заранее одним проходом, затем записи делятся
+    между потоками (крупные первыми, по кругу), и каждый поток открывает
+    свой дескриптор архива. Файлы, совпадающие с записью по размеру и CRC,
+    пропускаются. patterns ограничивает распаковку нужными записями.
+    should_stop() проверяется перед каждой записью.
+    Папки и файлы создаются через resolver (по умолчанию с корнем
+    extract_path): символические ссылки не выводят записи за его пределы.
+    При ошибке или отмене созданные распаковкой файлы и папки удаляются;
+    уже перезаписанные существующие файлы остаются в новом виде.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    fresh = not os.path.isdir(extract_path)
+    new_dirs = []
+    os.makedirs(extract_path, exist_ok=True)
+    extract_path = os.path.realpath(extract_path)
+    with zipfile.ZipFile(archive_path, "r") as zipf:
+        members = select_members(zipf.infolist(), patterns)
+
+    files = []
+    dirs = {extract_path}
+    for info in members:
+        target = member_target(extract_path, info)
+        if info.is_dir():
+            dirs.add(target)
+        else:
+            dirs.add(os.path.dirname(target))
+            files.append(info)
+    files.sort(key=lambda info: info.file_size, reverse=True)
+    shares = [files[i::workers] for i in range(workers) if files[i::workers]]
+    stats = ArchiveStats(unpacking=True)
+    extract_share = metrics.bind(_extract_share)
+    created = []
+    # Ошибка в одном потоке останавливает остальные
+    failed = threading.Event()
+
+    def stop() -> bool:
+        return failed.is_set() or (should_stop is not None and should_stop())
+
+    with beneath(extract_path, resolver) as resolver:
+        try:
+            for directory in sorted(dirs):
+                missing = []
+                parent = directory
+                while parent != extract_path and not os.path.lexists(parent):
+                    missing.append(parent)
+                    parent = os.path.dirname(parent)
+                resolver.makedirs(directory)
+                new_dirs.extend(reversed(missing))
+            with ThreadPoolExecutor(max(len(shares), 1)) as pool:
+                try:
+                    for part in pool.map(lambda share: extract_share(archive_path, extract_path, share, resolver,
+                                                                     created, stop), shares):
+                        stats.files += part.files
+                        stats.skipped += part.skipped
+                        stats.bytes_in += part.bytes_in
+                        stats.bytes_out += part.bytes_out
+                except BaseException:
+                    failed.set()
+                    raise
+        except BaseException:
+            _discard_extracted(resolver, created, new_dirs)
+            # Папку распаковки, созданную этим вызовом, тоже убираем (если она пуста)
+            if fresh:
+                with contextlib.suppress(OSError):
+                    os.rmdir(extract_path)
+            raise
+    stats.seconds = time.perf_counter() - started
+    return stats
@@ -0,0 +1,192 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from src.archive import ArchiveStats
+from src.copy_engine import CopyProgress
+from src.config.settings import SERVICE_DIRECTORIES
+from src.errors import InvalidArgumentError, OperationCancelledError, OperationTimeoutError, typed_error
+from src.listing import Entry, list_entries
+from src.operations import Operations
+from src.search import Match
+from src.sync import SyncStats
+
+# Ограничения одновременных операций по умолчанию
+DEFAULT_LIMITS = {"copy": 4, "move": 4, "zip": 2, "unzip": 2, "delete": 4, "sync": 2}
+# Параметры list_files (как у Operations.list_files)
+LIST_OPTIONS = {"depth", "sort", "reverse", "pattern", "kind", "limit", "page", "long"}
+
+
+class AsyncOperations:
+    """
+    Асинхронный программный интерфейс файлового менеджера.
+
+    Методы возвращают результаты (пути, статистику, списки) и выбрасывают
+    исключения из src.errors вместо вывода на экран. Блокирующие вызовы
+    выполняются в ограниченном пуле потоков, число одновременных операций
+    каждого вида ограничивает limits. Для всех методов можно задать timeout;
+    при отмене или таймауте копирование и архивация прерываются между порциями.
+
+    Пути задаются относительно рабочей директории.
+    """
+
+    def __init__(self, working_dir: str = None, cache_dir: str = None, max_workers: int = 8,
+                 limits: dict[str, int] = None, timeout: float = None, dest_policy: str = "error"):
+        self.ops = Operations(working_dir, cache_dir)
+        # Выбор папки назначения не может спрашивать пользователя
+        self.ops.dest_policy = dest_policy
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._limits = {kind: asyncio.Semaphore(count)
+                        for kind, count in {**DEFAULT_LIMITS, **(limits or {})}.items()}
+
+    async def __aenter__(self) -> "AsyncOperations":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Дожидается запущенных операций, сохраняет кэши и останавливает пул.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.ops.close)
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, kind: str | None, func: callable, *args, timeout: float = None,
+                   cancellable: bool = False, **kwargs):
+        """
+        Выполняет func в пуле потоков с учетом лимита kind и таймаута.
+        Для прерываемых операций передает func флаг остановки should_stop.
+
+        Место в лимите занято, пока поток действительно работает: при
+        таймауте или отмене выставляется флаг остановки, и _run дожидается
+        завершения потока и только потом отпускает лимит. Прерываемые
+        операции останавливаются между порциями; остальные (mkdir, rm, move,
+        ...) прервать нельзя, они выполняются до конца, а их результат
+        отбрасывается. Системные OSError заменяются исключениями из src.errors.
+        """
+        stop = threading.Event()
+        if cancellable:
+            kwargs["should_stop"] = stop.is_set
+        limit = self._limits[kind] if kind in self._limits else nullcontext()
+        timeout = timeout or self.timeout
+        async with limit:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                stop.set()
+                if await self._settle(future):
+                    raise asyncio.CancelledError from None
+                raise OperationTimeoutError(f"Операция не завершилась за {timeout} с") from None
+            except asyncio.CancelledError:
+                stop.set()
+                await self._settle(future)
+                raise
+            except OSError as e:
+                typed = typed_error(e)
+                if typed is e:
+                    raise
+                raise typed from e
+
+    @staticmethod
+    async def _settle(future: asyncio.Future) -> bool:
+        """
+        Дожидается завершения потока операции, даже если задачу отменяют
+        повторно; его результат или исключение отбрасывается.
+        Возвращает True, если во время ожидания пришла отмена.
+        """
+        cancelled = False
+        while not future.done():
+            try:
+                await asyncio.wait([future])
+            except asyncio.CancelledError:
+                cancelled = True
+        if not future.cancelled():
+            future.exception()
+        return cancelled
+
+    async def mkdir(self, path: str, timeout: float = None) -> str:
+        return await self._run(None, self.ops.make_folder, path, timeout=timeout)
+
+    async def rmdir(self, path: str, timeout: float = None) -> str:
+        return await self._run("delete", self.ops.remove_folder, path, timeout=timeout)
+
+    async def touch(self, path: str, timeout: float = None) -> str:
+        return await self._run(None, self.ops.make_file, path, timeout=timeout)
+
+    async def rm(self, path: str, timeout: float = None) -> str:
+        return await self._run("delete", self.ops.remove_file, path, timeout=timeout)
+
+    async def write(self, path: str, content: str, timeout: float = None) -> str:
+        return await self._run(None, self.ops.append_to_file, path, content, timeout=timeout)
+
+    async def read(self, path: str, start: int = 0, end: int = None, timeout: float = None) -> bytes:
+        return await self._run(None, self.ops.read_bytes, path, start, end, timeout=timeout)
+
+    async def copy(self, source: str, dest: str, progress: callable = None,
+                   timeout: float = None) -> tuple[str, CopyProgress]:
+        """
+        Копирует файл или папку в папку с именем dest.
+        Возвращает путь копии и статистику.
+        """
+        def copy_to(should_stop: callable) -> tuple[str, CopyProgress]:
+            def check(stats: CopyProgress) -> None:
+                if should_stop():
+                    raise OperationCancelledError("Операция отменена")
+                if progress is not None:
+                    progress(stats)
+            return self.ops.copy_to(source, dest, check)
+
+        return await self._run("copy", copy_to, timeout=timeout, cancellable=True)
+
+    async def move(self, source: str, dest: str, timeout: float = None) -> str:
+        return await self._run("move", self.ops.move_to, source, dest, timeout=timeout)
+
+    async def rename(self, old: str, new: str, timeout: float = None) -> str:
+        return await self._run(None, self.ops.rename_path, old, new, timeout=timeout)
+
+    async def zip(self, source: str, archive: str, method: str = "deflate", level: int = None,
+                  workers: int = None, timeout: float = None) -> ArchiveStats:
+        return await self._run("zip", self.ops.make_archive, source, archive, method, level, workers,
+                               timeout=timeout, cancellable=True)
+
+    async def unzip(self, archive: str, extract_to: str, patterns: list[str] = None,
+                    workers: int = None, timeout: float = None) -> ArchiveStats:
+        return await self._run("unzip", self.ops.extract_archive, archive, extract_to, patterns, workers,
+                               timeout=timeout, cancellable=True)
+
+    async def sync(self, source: str, dest: str, delete: bool = False, workers: int = None,
+                   timeout: float = None) -> SyncStats:
+        return await self._run("sync", self.ops.synchronize, source, dest, delete, workers,
+                               timeout=timeout, cancellable=True)
+
+    async def list_files(self, path: str = ".", timeout: float = None, **options) -> list[Entry]:
+        """
+        Возвращает элементы папки; options те же, что у Operations.list_files.
+        Служебные папки (корзина, кэш) не показываются.
+        """
+        unknown = set(options) - LIST_OPTIONS
+        if unknown:
+            raise InvalidArgumentError(f"Неизвестные параметры листинга: {', '.join(sorted(unknown))}")
+
+        def collect() -> list[Entry]:
+            return list(list_entries(self.ops.resolve(path), **options, ignore=SERVICE_DIRECTORIES))
+
+        return await self._run(None, collect, timeout=timeout)
+
+    async def find_folders(self, pattern: str, timeout: float = None) -> list[str]:
+        return await self._run(None, self.ops.dir_index.match, pattern, timeout=timeout)
+
+    async def disk_usage(self, folder: str = ".", depth: int = 1, refresh: bool = False,
+                         timeout: float = None) -> list[tuple[str, int, int]]:
+        return await self._run(None, self.ops.folder_usage, folder, depth, refresh, timeout=timeout)
+
+    async def grep(self, text: str, folder: str = ".", ignore_case: bool = False, index: bool = None,
+                   limit: int = None, timeout: float = None) -> list[Match]:
+        return await self._run(None, self.ops.find_text, text, folder, ignore_case, index, limit, timeout=timeout)
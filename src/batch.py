@@ -0,0 +1,213 @@
+import contextvars
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Команды, которые меняют состояние сессии или не разбираются по путям:
+# они всегда выполняются отдельно, после завершения предыдущей группы
+BARRIER_ACTIONS = {"nav", "exit", "help"}
+# Буфер вывода команды, которую выполняет текущий поток
+_buffer = contextvars.ContextVar("batch_output", default=None)
+
+
+class ThreadLocalStdout(io.TextIOBase):
+    """
+    Подменяет sys.stdout: в потоке, который выполняет команду пакета,
+    вывод пишется в его собственный буфер, в остальных — в исходный поток.
+    Рабочие потоки движков (копирование, архивы, синхронизация, дубликаты)
+    получают буфер своей команды через metrics.bind и пишут в него же.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self._lock = threading.Lock()
+
+    def capture(self) -> None:
+        _buffer.set(io.StringIO())
+
+    def release(self) -> str:
+        buffer = _buffer.get()
+        _buffer.set(None)
+        return buffer.getvalue() if buffer is not None else ""
+
+    def write(self, text: str) -> int:
+        buffer = _buffer.get()
+        if buffer is None:
+            return self.target.write(text)
+        # В буфер команды могут писать и потоки ее пула
+        with self._lock:
+            return buffer.write(text)
+
+    def flush(self) -> None:
+        if _buffer.get() is None:
+            self.target.flush()
+
+
+# Команды, которые могут создать, удалить или переименовать папки
+STRUCTURAL_ACTIONS = {"mkdir", "rmdir", "rename", "unzip", "sync"}
+
+
+def _resolve(manager, path: str) -> str:
+    return os.path.normpath(os.path.join(manager.current_path, path))
+
+
+def command_paths(manager, command: list[str]) -> tuple[set, set, bool] | None:
+    """
+    Возвращает (читаемые пути, изменяемые пути, меняет ли команда структуру папок)
+    или None, если команду нельзя выполнять одновременно с другими.
+    Для cp/mv папка назначения ищется по имени, поэтому вместо пути
+    используется метка ("dest", имя папки, имя файла).
+    """
+    action, args = command[0].lower(), command[1:]
+    if action in BARRIER_ACTIONS or not args and action not in ("list", "du"):
+        return None
+    structural = action in STRUCTURAL_ACTIONS
+    if action in ("mkdir", "rmdir", "touch", "write", "rm"):
+        return set(), {_resolve(manager, args[0])}, structural
+    if action == "cat":
+        return {_resolve(manager, args[0])}, set(), False
+    if action in ("cp", "mv") and len(args) == 2:
+        source = _resolve(manager, args[0])
+        dest = ("dest", args[1], os.path.basename(source))
+        structural = os.path.isdir(source)
+        if action == "cp":
+            return {source}, {dest}, structural
+        return set(), {source, dest}, structural
+    if action == "rename" and len(args) == 2:
+        return set(), {_resolve(manager, args[0]), _resolve(manager, args[1])}, structural
+    if action in ("zip", "unzip", "sync") and len(args) >= 2:
+        return {_resolve(manager, args[0])}, {_resolve(manager, args[1])}, structural
+    if action == "list":
+        return {manager.current_path}, set(), False
+    if action in ("find", "grep", "du"):
+        return {manager.working_dir}, set(), False
+    return None
+
+
+def _overlap(a, b) -> bool:
+    """
+    Проверяет, могут ли два пути (или метки назначения) затрагивать одни и те же файлы.
+    """
+    if isinstance(a, tuple) and isinstance(b, tuple):
+        return a[1] == b[1] and a[2] == b[2]
+    if isinstance(a, tuple) or isinstance(b, tuple):
+        marker, path = (a, b) if isinstance(a, tuple) else (b, a)
+        return marker[1] in path.split(os.sep) or marker[2] == os.path.basename(path)
+    return a == b or a.startswith(b + os.sep) or b.startswith(a + os.sep)
+
+
+def conflicts(first: tuple[set, set, bool], second: tuple[set, set, bool]) -> bool:
+    """
+    Две команды конфликтуют, если одна изменяет то, что другая читает или изменяет,
+    или если одна ищет папку по имени, пока другая меняет структуру папок.
+    """
+    reads1, writes1, structural1 = first
+    reads2, writes2, structural2 = second
+    for write in writes1:
+        if any(_overlap(write, other) for other in reads2 | writes2):
+            return True
+    for write in writes2:
+        if any(_overlap(write, other) for other in reads1):
+            return True
+    searches1 = any(isinstance(write, tuple) for write in writes1)
+    searches2 = any(isinstance(write, tuple) for write in writes2)
+    return searches1 and structural2 or searches2 and structural1
+
+
+def parse_lines(lines):
+    """
+    Отдает (номер строки, исходная строка, слова), пропуская пустые строки и комментарии.
+    """
+    for number, line in enumerate(lines, 1):
+        text = line.strip()
+        if text and not text.startswith("#"):
+            yield number, text, text.split()
+
+
+def execute_captured(manager, command: list[str]) -> dict:
+    """
+    Выполняет команду и возвращает ok, ее вывод и время выполнения.
+    sys.stdout должен быть подменен на ThreadLocalStdout.
+    """
+    stdout = sys.stdout
+    stdout.capture()
+    errors = manager.error_count
+    started = time.perf_counter()
+    ok = True
+    try:
+        manager.execute(command)
+    except Exception as e:
+        ok = False
+        print(f"Ошибка выполнения: {str(e)}")
+    ok = ok and manager.error_count == errors
+    return {"ok": ok, "output": stdout.release().strip(), "seconds": round(time.perf_counter() - started, 6)}
+
+
+class BatchRunner:
+    """
+    Пакетное выполнение команд FileManager без подсказок и заголовков.
+
+    Подряд идущие независимые команды объединяются в группу и выполняются
+    параллельно; результат каждой команды записывается строкой JSON
+    в исходном порядке.
+    """
+
+    def __init__(self, manager, out=None, workers: int = 8, dest_policy: str = "nearest"):
+        self.manager = manager
+        self.out = out or sys.stdout
+        self.workers = workers
+        self.manager.dest_policy = dest_policy
+        # Постраничный вывод в пакете не ждет ввода
+        self.manager.next_page = lambda shown, total: True
+        self.ok = 0
+        self.failed = 0
+
+    def _execute(self, number: int, text: str, command: list[str]) -> dict:
+        return {"line": number, "command": text, **execute_captured(self.manager, command)}
+
+    def _flush(self, group: list, pool: ThreadPoolExecutor) -> None:
+        if len(group) == 1:
+            results = [self._execute(*group[0][:3])]
+        else:
+            results = list(pool.map(lambda item: self._execute(*item[:3]), group))
+        for result in results:
+            if result["ok"]:
+                self.ok += 1
+            else:
+                self.failed += 1
+            self.out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.out.flush()
+        group.clear()
+
+    def run(self, lines) -> bool:
+        """
+        Выполняет команды из lines (файл, stdin или список строк).
+        Возвращает True, если все команды завершились без ошибок.
+        """
+        original = sys.stdout
+        sys.stdout = ThreadLocalStdout(original)
+        try:
+            with ThreadPoolExecutor(self.workers) as pool:
+                group = []
+                for number, text, command in parse_lines(lines):
+                    if command[0].lower() == "exit":
+                        break
+                    paths = command_paths(self.manager, command)
+                    if group and (paths is None or len(group) >= self.workers * 16
+                                  or any(conflicts(paths, other[3]) for other in group)):
+                        self._flush(group, pool)
+                    if paths is None:
+                        group.append((number, text, command, None))
+                        self._flush(group, pool)
+                    else:
+                        group.append((number, text, command, paths))
+                if group:
+                    self._flush(group, pool)
+        finally:
+            sys.stdout = original
+            self.manager.close()
+        return self.failed == 0
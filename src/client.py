@@ -0,0 +1,103 @@
+import json
+import socket
+import sys
+
+
+class DaemonClient:
+    """
+    Подключение к демону. Текущая папка (nav) сохраняется, пока подключение открыто.
+    """
+
+    def __init__(self, socket_path: str):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.connect(socket_path)
+        except OSError:
+            self._sock.close()
+            raise
+        self._file = self._sock.makefile("rwb")
+
+    def request(self, payload: dict) -> dict:
+        self._file.write(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Демон закрыл подключение")
+        return json.loads(line)
+
+    def execute(self, command: str) -> dict:
+        """
+        Выполняет команду и возвращает ok, output, seconds и cwd.
+        """
+        return self.request({"command": command})
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _lines(interactive: bool):
+    while True:
+        try:
+            line = input(">>> ") if interactive else sys.stdin.readline()
+        except EOFError:
+            return
+        if not interactive and not line:
+            return
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def main(argv: list[str] = None) -> int:
+    """
+    Клиент демона (python main.py --daemon):
+
+        python -m src.client list depth=2      — выполнить одну команду
+        python -m src.client < commands.txt    — выполнить команды построчно
+        python -m src.client                   — диалог в терминале
+        python -m src.client --stop            — остановить демон
+
+    --socket ПУТЬ первым аргументом задает другой сокет. Клиент импортирует
+    только стандартные модули и не загружает движок, поэтому запускается
+    быстро; кэши остаются прогретыми в процессе демона.
+    Возвращает код выхода: 0 — все команды успешны, 1 — были ошибки, 2 — демон недоступен.
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    socket_path = None
+    if argv[:1] == ["--socket"] and len(argv) >= 2:
+        socket_path, argv = argv[1], argv[2:]
+    if socket_path is None:
+        from src.config.settings import DAEMON_SOCKET
+
+        socket_path = DAEMON_SOCKET
+    try:
+        client = DaemonClient(socket_path)
+    except OSError as e:
+        print(f"Демон не запущен ({e}). Запустите: python main.py --daemon", file=sys.stderr)
+        return 2
+    ok = True
+    with client:
+        if argv == ["--stop"]:
+            print(client.request({"control": "stop"})["output"])
+            return 0
+        interactive = not argv and sys.stdin.isatty()
+        commands = [" ".join(argv)] if argv else _lines(interactive)
+        for command in commands:
+            result = client.execute(command)
+            if result.get("output"):
+                print(result["output"])
+            ok = ok and result["ok"]
+            if command.split()[0].lower() == "exit":
+                break
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
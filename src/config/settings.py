@@ -8,8 +8,14 @@ PROJECT_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."
 # WORKING_DIRECTORY указывает на ..\File_manager_ССиП\data
 WORKING_DIRECTORY = os.path.join(PROJECT_DIRECTORY, "data")
 
-# Создаем папку data, если она не существует
-os.makedirs(WORKING_DIRECTORY, exist_ok=True)
+# CACHE_DIRECTORY указывает на ..\File_manager_ССиП\.cache
+# Здесь хранятся индексы и кэши; папка вынесена из data, чтобы запись кэша не меняла mtime рабочих папок
+CACHE_DIRECTORY = os.path.join(PROJECT_DIRECTORY, ".cache")
 
-print(f"Корневая папка проекта: {PROJECT_DIRECTORY}")
-print(f"Рабочая папка: {WORKING_DIRECTORY}")
\ No newline at end of file
+# Скрытая корзина внутри рабочей папки: удаляемые папки переименовываются сюда
+# и удаляются в фоне. Служебные папки не показываются в листинге и не индексируются
+TRASH_DIRECTORY_NAME = ".trash"
+SERVICE_DIRECTORIES = frozenset({TRASH_DIRECTORY_NAME})
+
+# Сокет демона (python main.py --daemon), к которому подключается клиент src.client
+DAEMON_SOCKET = os.path.join(CACHE_DIRECTORY, "daemon.sock")
@@ -0,0 +1,255 @@
+import errno
+import os
+import shutil
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src import metrics
+from src.paths import PathResolver, beneath
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl(FICLONE): копия-ссылка на те же блоки (btrfs, xfs, ...)
+FICLONE = 0x40049409
+CHUNK_SIZE = 8 * 1024 * 1024
+BUFFER_SIZE = 1024 * 1024
+
+# Ошибки, после которых способ копирования не поддерживается и нужно пробовать следующий
+_UNSUPPORTED = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY,
+                errno.EBADF, errno.EPERM, errno.ETXTBSY}
+_disabled: set[str] = set()
+
+
+class CopyProgress:
+    """
+    Счетчики копирования, общие для всех потоков.
+    callback(progress) вызывается после каждой скопированной порции.
+    """
+
+    def __init__(self, callback: callable = None):
+        self.callback = callback
+        self.files = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self.methods: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def bytes_per_sec(self) -> float:
+        seconds = self.seconds
+        return self.bytes / seconds if seconds else 0.0
+
+    def add_bytes(self, count: int) -> None:
+        with self._lock:
+            self.bytes += count
+        if self.callback:
+            self.callback(self)
+
+    def file_done(self, method: str) -> None:
+        with self._lock:
+            self.files += 1
+            self.methods[method] = self.methods.get(method, 0) + 1
+
+    def __str__(self) -> str:
+        mb = 1024 * 1024
+        return (f"{self.files} файлов, {self.bytes / mb:.1f} МБ за {self.seconds:.2f} с "
+                f"({self.bytes_per_sec / mb:.1f} МБ/с)")
+
+
+def _reflink(src_fd: int, dst_fd: int, size: int, report: callable) -> None:
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, "FICLONE недоступен")
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    report(size)
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, size: int, report: callable) -> None:
+    copied = 0
+    while copied < size:
+        sent = os.copy_file_range(src_fd, dst_fd, min(CHUNK_SIZE, size - copied))
+        if sent == 0:
+            break
+        copied += sent
+        report(sent)
+
+
+def _sendfile(src_fd: int, dst_fd: int, size: int, report: callable) -> None:
+    copied = 0
+    while copied < size:
+        sent = os.sendfile(dst_fd, src_fd, copied, min(CHUNK_SIZE, size - copied))
+        if sent == 0:
+            break
+        copied += sent
+        report(sent)
+
+
+def _userspace(src_fd: int, dst_fd: int, size: int, report: callable) -> None:
+    buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(src_fd, "rb", buffering=0, closefd=False) as src, \
+            open(dst_fd, "wb", buffering=0, closefd=False) as dst:
+        while read := src.readinto(buffer):
+            dst.write(view[:read])
+            report(read)
+
+
+# Способы копирования от самого быстрого к самому медленному
+_METHODS = [
+    ("reflink", _reflink),
+    ("copy_file_range", _copy_file_range if hasattr(os, "copy_file_range") else None),
+    ("sendfile", _sendfile if hasattr(os, "sendfile") else None),
+    ("userspace", _userspace),
+]
+
+
+def copy_file(src: str, dst: str, progress: CopyProgress = None, opener: callable = None) -> str:
+    """
+    Копирует файл самым быстрым доступным способом и переносит метаданные,
+    как shutil.copy2. Возвращает имя использованного способа.
+    opener открывает dst (например, PathResolver.opener, чтобы не идти по ссылкам).
+    """
+    progress = progress or CopyProgress()
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError(f"{src} и {dst} — один и тот же файл")
+    created = False
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb", opener=opener) as fdst:
+            created = True
+            src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+            size = os.fstat(src_fd).st_size
+            copied = 0
+
+            def report(count: int) -> None:
+                nonlocal copied
+                copied += count
+                progress.add_bytes(count)
+
+            for name, method in _METHODS:
+                if method is None or name in _disabled:
+                    continue
+                if name == "userspace":
+                    with metrics.phase("write"):
+                        method(src_fd, dst_fd, size, report)
+                    break
+                try:
+                    with metrics.phase("write"):
+                        method(src_fd, dst_fd, size, report)
+                    break
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED:
+                        raise
+                    if e.errno == errno.ENOSYS:
+                        _disabled.add(name)
+                    # Начинаем файл заново следующим способом
+                    if copied:
+                        progress.add_bytes(-copied)
+                        copied = 0
+                    os.lseek(src_fd, 0, os.SEEK_SET)
+                    os.lseek(dst_fd, 0, os.SEEK_SET)
+                    os.ftruncate(dst_fd, 0)
+    except BaseException:
+        # Не оставляем недокопированный файл (ошибка, отмена, таймаут)
+        if created and os.path.exists(dst):
+            os.remove(dst)
+        raise
+    with metrics.phase("stat"):
+        shutil.copystat(src, dst)
+    progress.file_done(name)
+    return name
+
+
+def clone_file(src: str, dst: str) -> None:
+    """
+    Создает reflink-копию src (общие блоки на диске). Если файловая система
+    не поддерживает FICLONE, выбрасывает OSError.
+    """
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, "FICLONE недоступен")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except BaseException:
+            fdst.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def copy_tree(src: str, dst: str, progress: CopyProgress = None, workers: int = 8,
+              resolver: PathResolver = None) -> CopyProgress:
+    """
+    Рекурсивно копирует папку. Папки создаются при обходе, файлы копируются
+    в пуле из workers потоков; число ожидающих задач ограничено.
+    Все создается через resolver (по умолчанию с корнем dst): ссылка,
+    уже лежащая в копии, не уводит запись за его пределы.
+    """
+    progress = progress or CopyProgress()
+    slots = threading.BoundedSemaphore(workers * 4)
+    errors = []
+    dirs = []
+    os.makedirs(dst, exist_ok=True)
+    dst = os.path.realpath(dst)
+
+    def task(src_path: str, dst_path: str) -> None:
+        try:
+            copy_file(src_path, dst_path, progress, resolver.opener)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            slots.release()
+
+    task = metrics.bind(task)
+    with beneath(dst, resolver) as resolver, ThreadPoolExecutor(workers) as pool:
+        stack = [(src, dst)]
+        while stack and not errors:
+            src_dir, dst_dir = stack.pop()
+            dst_dir = resolver.makedirs(dst_dir)
+            dirs.append((src_dir, dst_dir))
+            with os.scandir(src_dir) as it:
+                for entry in metrics.timed(it, "walk"):
+                    target = os.path.join(dst_dir, entry.name)
+                    if entry.is_symlink():
+                        with resolver.open_target(target, follow=False) as link:
+                            try:
+                                os.symlink(os.readlink(entry.path), link.name, dir_fd=link.dir_fd)
+                            except FileExistsError:
+                                # Существующая ссылка или файл заменяются, как и файлы при копировании
+                                os.unlink(link.name, dir_fd=link.dir_fd)
+                                os.symlink(os.readlink(entry.path), link.name, dir_fd=link.dir_fd)
+                    elif entry.is_dir():
+                        stack.append((entry.path, target))
+                    elif stat.S_ISREG(entry.stat().st_mode):
+                        if os.path.islink(target):
+                            # Файл заменяет ссылку, а не пишется туда, куда она указывает
+                            with resolver.open_target(target, follow=False) as link:
+                                os.unlink(link.name, dir_fd=link.dir_fd)
+                        slots.acquire()
+                        pool.submit(task, entry.path, target)
+    if errors:
+        raise errors[0]
+    # Время изменения папок выставляем последним: копирование файлов его меняет
+    for src_dir, dst_dir in reversed(dirs):
+        shutil.copystat(src_dir, dst_dir)
+    return progress
+
+
+def copy_path(src: str, dst: str, progress: CopyProgress = None, workers: int = 8,
+              resolver: PathResolver = None) -> CopyProgress:
+    """
+    Копирует файл или папку целиком. resolver проверяет пути создаваемых
+    файлов (по умолчанию копия папки не выходит за пределы dst).
+    """
+    progress = progress or CopyProgress()
+    if os.path.isdir(src):
+        return copy_tree(src, dst, progress, workers, resolver)
+    copy_file(src, dst, progress, resolver.opener if resolver is not None else None)
+    return progress
@@ -0,0 +1,163 @@
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+
+from src.batch import ThreadLocalStdout, execute_captured
+
+# Как часто демон сохраняет кэши на диск (секунды)
+SAVE_INTERVAL = 60
+
+
+class _Session(socketserver.StreamRequestHandler):
+    """
+    Одно подключение клиента: строки JSON с командами, на каждую — строка
+    JSON с результатом. У подключения свой сеанс (текущая папка), движок
+    и кэши общие.
+    """
+
+    def handle(self) -> None:
+        session = self.server.manager.session()
+        # Клиент не может ответить на вопросы: выбираем папку и листаем без ожидания ввода
+        session.dest_policy = self.server.dest_policy
+        session.next_page = lambda shown, total: True
+        try:
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    self._reply({"ok": False, "output": "Неверный запрос"})
+                    continue
+                if not self._process(session, request):
+                    break
+        finally:
+            session.close_session()
+
+    def _reply(self, response: dict) -> None:
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def _process(self, session, request: dict) -> bool:
+        """
+        Выполняет запрос. Возвращает False, если подключение нужно закрыть.
+        """
+        control = request.get("control")
+        if control == "ping":
+            self._reply({"ok": True, "pid": os.getpid()})
+            return True
+        if control == "stop":
+            self._reply({"ok": True, "output": "Демон остановлен"})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return False
+        command = str(request.get("command", "")).split()
+        if not command:
+            self._reply({"ok": False, "output": "Пустая команда"})
+            return True
+        if command[0].lower() == "exit":
+            self._reply({"ok": True, "output": ""})
+            return False
+        result = execute_captured(session, command)
+        self._reply({**result, "cwd": session.get_relative_path(session.current_path)})
+        return True
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Демон файлового менеджера: один движок Operations (с прогретыми
+    индексами и кэшами) обслуживает клиентов через Unix-сокет. Каждое
+    подключение выполняется в своем потоке, команды разных клиентов идут
+    параллельно. Кэши сохраняются раз в SAVE_INTERVAL секунд и при остановке.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, manager, socket_path: str, dest_policy: str = "nearest"):
+        self.manager = manager
+        self.socket_path = socket_path
+        self.dest_policy = dest_policy
+        self._stopped = threading.Event()
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        _remove_stale_socket(socket_path)
+        # Сокет доступен только владельцу
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _Session)
+        finally:
+            os.umask(old_umask)
+
+    def _warm_up(self) -> None:
+        """
+        Загружает индексы заранее, чтобы первые команды клиентов их не ждали.
+        """
+        try:
+            self.manager.dir_index.load()
+            self.manager.disk_usage.load()
+        except OSError as e:
+            print(f"Не удалось загрузить индексы: {e}", file=sys.stderr)
+
+    def _autosave(self) -> None:
+        while not self._stopped.wait(SAVE_INTERVAL):
+            try:
+                self.manager.save()
+            except OSError as e:
+                print(f"Не удалось сохранить кэши: {e}", file=sys.stderr)
+
+    def serve(self) -> None:
+        """
+        Обслуживает клиентов до shutdown (команда stop, SIGTERM или Ctrl+C),
+        затем сохраняет кэши и удаляет сокет.
+        """
+        original = sys.stdout
+        # Вывод команд каждого клиента собирается в его поток отдельно
+        sys.stdout = ThreadLocalStdout(original)
+        threading.Thread(target=self._autosave, name="autosave", daemon=True).start()
+        threading.Thread(target=self._warm_up, name="warm-up", daemon=True).start()
+        try:
+            self.serve_forever()
+        finally:
+            self._stopped.set()
+            sys.stdout = original
+            self.server_close()
+            try:
+                os.remove(self.socket_path)
+            except FileNotFoundError:
+                pass
+            self.manager.close()
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    """
+    Удаляет сокет, оставшийся от завершившегося демона.
+    Если по сокету отвечает работающий демон, выбрасывает RuntimeError.
+    """
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(socket_path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"Демон уже запущен: {socket_path}")
+
+
+def run_daemon(manager, socket_path: str, dest_policy: str = "nearest") -> None:
+    """
+    Запускает демон в текущем процессе; SIGTERM останавливает его так же, как Ctrl+C.
+    """
+    server = DaemonServer(manager, socket_path, dest_policy)
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    print(f"Демон слушает {socket_path} (рабочая папка: {manager.working_dir})", file=sys.stderr)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
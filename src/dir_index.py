@@ -0,0 +1,312 @@
+import fnmatch
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterable
+
+from src import metrics
+
+# Раз в столько секунд поиск сверяет с диском весь индекс (mtime папок),
+# чтобы заметить папки, созданные в обход менеджера
+REFRESH_INTERVAL = 2.0
+
+
+class DirIndex:
+    """
+    Персистентный индекс "имя папки -> пути" для рабочей директории.
+
+    Для каждой папки хранится mtime и список вложенных папок. Индекс строится
+    один раз, сохраняется на диск и обновляется инкрементально: операции
+    менеджера сообщают об изменениях через add_tree/remove_tree/move_tree,
+    а изменения, сделанные в обход менеджера, обнаруживаются по mtime папок.
+    """
+
+    VERSION = 1
+
+    def __init__(self, root: str, index_path: str, ignore: Iterable[str] = frozenset()):
+        self.root = os.path.abspath(root)
+        self.index_path = index_path
+        self.ignore = set(ignore)
+        # rel -> [mtime_ns, [имена вложенных папок]]; корень хранится под ключом ""
+        self._dirs: dict[str, list] = {}
+        self._names: dict[str, set[str]] = defaultdict(set)
+        self._loaded = False
+        self._dirty = False
+        # Время последней полной сверки с диском (time.monotonic)
+        self._refreshed_at = float("-inf")
+        self._lock = threading.RLock()
+
+    def _abs(self, rel: str) -> str:
+        return os.path.join(self.root, rel) if rel else self.root
+
+    def _rel(self, path: str) -> str:
+        rel = os.path.relpath(os.path.abspath(path), self.root)
+        return "" if rel == "." else rel
+
+    @staticmethod
+    def _join(parent: str, name: str) -> str:
+        return os.path.join(parent, name) if parent else name
+
+    def _scan_children(self, rel: str) -> tuple[int, list[str]] | None:
+        """
+        Читает mtime папки и имена вложенных папок. Возвращает None, если папки нет.
+        """
+        path = self._abs(rel)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with metrics.phase("walk"), os.scandir(path) as it:
+                children = [
+                    entry.name for entry in it
+                    if entry.name not in self.ignore and entry.is_dir(follow_symlinks=False)
+                ]
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return mtime, children
+
+    def _put(self, rel: str, mtime: int, children: list[str]) -> None:
+        if rel not in self._dirs and rel:
+            self._names[os.path.basename(rel)].add(rel)
+        self._dirs[rel] = [mtime, children]
+        self._dirty = True
+
+    def _build(self, rel: str) -> None:
+        """
+        Полностью индексирует поддерево rel.
+        """
+        stack = [rel]
+        while stack:
+            current = stack.pop()
+            scanned = self._scan_children(current)
+            if scanned is None:
+                continue
+            mtime, children = scanned
+            self._put(current, mtime, children)
+            stack.extend(self._join(current, name) for name in children)
+
+    def _drop(self, rel: str) -> None:
+        """
+        Удаляет поддерево rel из индекса.
+        """
+        stack = [rel]
+        while stack:
+            current = stack.pop()
+            entry = self._dirs.pop(current, None)
+            if entry is None:
+                continue
+            names = self._names.get(os.path.basename(current))
+            if names is not None:
+                names.discard(current)
+                if not names:
+                    del self._names[os.path.basename(current)]
+            stack.extend(self._join(current, name) for name in entry[1])
+        self._dirty = True
+
+    def _refresh_dir(self, rel: str) -> list[str]:
+        """
+        Пересканирует одну папку, если ее mtime изменился.
+        Возвращает список вложенных папок, которые нужно проверить дальше.
+        """
+        entry = self._dirs.get(rel)
+        try:
+            with metrics.phase("stat"):
+                mtime = os.stat(self._abs(rel)).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            self._drop(rel)
+            return []
+        if entry is not None and entry[0] == mtime:
+            return [self._join(rel, name) for name in entry[1]]
+
+        scanned = self._scan_children(rel)
+        if scanned is None:
+            self._drop(rel)
+            return []
+        mtime, children = scanned
+        old = set(entry[1]) if entry is not None else set()
+        for name in old - set(children):
+            self._drop(self._join(rel, name))
+        self._put(rel, mtime, children)
+        pending = []
+        for name in children:
+            child = self._join(rel, name)
+            if name in old:
+                pending.append(child)
+            else:
+                self._build(child)
+        return pending
+
+    def refresh(self) -> None:
+        """
+        Сверяет индекс с диском: проверяет mtime каждой известной папки
+        и пересканирует только изменившиеся.
+        """
+        with self._lock:
+            stack = [""]
+            while stack:
+                stack.extend(self._refresh_dir(stack.pop()))
+            self._refreshed_at = time.monotonic()
+            self._loaded = True
+
+    def load(self) -> None:
+        """
+        Загружает индекс с диска и сверяет его с файловой системой.
+        Если сохраненного индекса нет, строит его с нуля.
+        """
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == self.VERSION and data.get("root") == self.root:
+                    self._dirs = data["dirs"]
+                    self._names = defaultdict(set)
+                    for rel in self._dirs:
+                        if rel:
+                            self._names[os.path.basename(rel)].add(rel)
+            except (FileNotFoundError, ValueError, KeyError):
+                self._dirs = {}
+            if self._dirs:
+                self.refresh()
+            else:
+                self._build("")
+                self._refreshed_at = time.monotonic()
+            self._loaded = True
+
+    def save(self) -> None:
+        """
+        Атомарно сохраняет индекс на диск, если он изменялся.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "root": self.root, "dirs": self._dirs}, f)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+
+    def _touch_parent(self, rel: str) -> str | None:
+        parent = os.path.dirname(rel)
+        entry = self._dirs.get(parent)
+        if entry is None:
+            return None
+        try:
+            entry[0] = os.stat(self._abs(parent)).st_mtime_ns
+        except FileNotFoundError:
+            pass
+        return parent
+
+    def add_tree(self, path: str) -> None:
+        """
+        Добавляет в индекс созданную папку (вместе с содержимым и промежуточными папками).
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            rel = self._rel(path)
+            # Поднимаемся до ближайшего уже известного предка
+            top = rel
+            while os.path.dirname(top) and os.path.dirname(top) not in self._dirs:
+                top = os.path.dirname(top)
+            if top.split(os.sep)[0] in self.ignore:
+                return
+            if not os.path.isdir(self._abs(top)):
+                return
+            self._build(top)
+            parent = self._touch_parent(top)
+            if parent is not None:
+                children = self._dirs[parent][1]
+                name = os.path.basename(top)
+                if name not in children:
+                    children.append(name)
+
+    def remove_tree(self, path: str) -> None:
+        """
+        Удаляет из индекса папку и все ее вложенные папки.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            rel = self._rel(path)
+            if rel not in self._dirs:
+                return
+            self._drop(rel)
+            parent = self._touch_parent(rel)
+            if parent is not None:
+                children = self._dirs[parent][1]
+                name = os.path.basename(rel)
+                if name in children:
+                    children.remove(name)
+
+    def move_tree(self, old_path: str, new_path: str) -> None:
+        """
+        Переносит поддерево в индексе без повторного обхода диска.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            old_rel, new_rel = self._rel(old_path), self._rel(new_path)
+            if old_rel not in self._dirs or os.path.dirname(new_rel) not in self._dirs:
+                self.remove_tree(old_path)
+                self.add_tree(new_path)
+                return
+            moved = {}
+            stack = [old_rel]
+            while stack:
+                current = stack.pop()
+                entry = self._dirs.get(current)
+                if entry is None:
+                    continue
+                moved[new_rel + current[len(old_rel):]] = entry
+                stack.extend(self._join(current, name) for name in entry[1])
+            self.remove_tree(old_path)
+            for rel, (mtime, children) in moved.items():
+                self._put(rel, mtime, children)
+            parent = self._touch_parent(new_rel)
+            children = self._dirs[parent][1]
+            if os.path.basename(new_rel) not in children:
+                children.append(os.path.basename(new_rel))
+
+    def _refresh_if_stale(self) -> None:
+        if time.monotonic() - self._refreshed_at >= REFRESH_INTERVAL:
+            self.refresh()
+
+    def find(self, name: str) -> list[str]:
+        """
+        Возвращает абсолютные пути всех папок с именем name.
+        Если индекс не сверялся с диском дольше REFRESH_INTERVAL секунд,
+        сначала сверяет его (и при попадании: рядом могла появиться
+        одноименная папка). Несуществующие пути отбрасываются, а их
+        родительские папки пересканируются.
+        """
+        with self._lock:
+            self.load()
+            self._refresh_if_stale()
+            for attempt in range(2):
+                found = []
+                stale = False
+                for rel in sorted(self._names.get(name, ())):
+                    path = self._abs(rel)
+                    if os.path.isdir(path):
+                        found.append(path)
+                    else:
+                        stale = True
+                        self._refresh_dir(os.path.dirname(rel))
+                if not stale:
+                    break
+            return found
+
+    def match(self, pattern: str) -> list[str]:
+        """
+        Возвращает абсолютные пути папок, имя которых подходит под шаблон (fnmatch).
+        """
+        with self._lock:
+            self.load()
+            self._refresh_if_stale()
+            result = []
+            for name in fnmatch.filter(self._names.keys(), pattern):
+                result.extend(self._abs(rel) for rel in self._names[name])
+            return sorted(path for path in result if os.path.isdir(path))
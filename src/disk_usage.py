@@ -0,0 +1,400 @@
+import json
+import os
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src import metrics
+
+_UNITS = ("Б", "КБ", "МБ", "ГБ", "ТБ")
+
+
+def format_size(size: int) -> str:
+    """
+    Размер в байтах в читаемом виде: 512 Б, 4.0 КБ, 1.5 ГБ.
+    """
+    value = float(size)
+    for unit in _UNITS[:-1]:
+        if abs(value) < 1024:
+            return f"{size} {unit}" if unit == "Б" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} {_UNITS[-1]}"
+
+
+class DiskUsage:
+    """
+    Персистентные итоги занятого места по папкам рабочей директории.
+
+    Для каждой папки хранятся mtime, размер и число файлов непосредственно
+    в ней и список вложенных папок; итоги по поддереву считаются из них и
+    кэшируются. Первый обход идет параллельно (scandir в пуле потоков),
+    затем индекс сохраняется на диск, а refresh пересканирует только папки
+    с изменившимся mtime. mtime папки меняется, когда в ней создают, удаляют
+    или переименовывают элементы, но не когда дописывают в файл, поэтому
+    операции менеджера сообщают об изменениях сами (changed, move_tree).
+    Файлы с несколькими жесткими ссылками учитываются по inode один раз
+    на поддерево, как в du.
+    """
+
+    VERSION = 2
+
+    def __init__(self, root: str, index_path: str, ignore: set[str] = frozenset(), workers: int = 8):
+        self.root = os.path.abspath(root)
+        self.index_path = index_path
+        self.ignore = set(ignore)
+        self.workers = workers
+        # rel -> [mtime_ns, размер файлов, число файлов, [имена вложенных папок],
+        #         {"устройство:inode": размер} файлов с жесткими ссылками]; корень — ""
+        self._dirs: dict[str, list] = {}
+        # rel -> (размер, число файлов, inode с жесткими ссылками) всего поддерева
+        self._totals: dict[str, tuple[int, int, dict[str, int]]] = {}
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def _abs(self, rel: str) -> str:
+        return os.path.join(self.root, rel) if rel else self.root
+
+    def _rel(self, path: str) -> str:
+        rel = os.path.relpath(os.path.abspath(path), self.root)
+        return "" if rel == "." else rel
+
+    @staticmethod
+    def _join(parent: str, name: str) -> str:
+        return os.path.join(parent, name) if parent else name
+
+    def _scan(self, rel: str) -> list | None:
+        """
+        Читает одну папку: mtime, размер и число ее файлов, вложенные папки.
+        Файлы с жесткими ссылками в размер не входят, а собираются по inode.
+        Выполняется в рабочих потоках. Возвращает None, если папки нет.
+        """
+        path = self._abs(rel)
+        size = files = 0
+        children = []
+        links = {}
+        try:
+            mtime = os.stat(path, follow_symlinks=False).st_mtime_ns
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.name in self.ignore:
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        children.append(entry.name)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        if st.st_nlink > 1:
+                            links[f"{st.st_dev}:{st.st_ino}"] = st.st_size
+                        else:
+                            size += st.st_size
+                            files += 1
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return None
+        return [mtime, size, files, children, links]
+
+    def _check(self, rel: str) -> list | None:
+        """
+        Возвращает запись папки: сохраненную, если mtime не изменился, иначе новую.
+        """
+        entry = self._dirs.get(rel)
+        if entry is not None:
+            try:
+                if os.stat(self._abs(rel), follow_symlinks=False).st_mtime_ns == entry[0]:
+                    return entry
+            except (FileNotFoundError, NotADirectoryError):
+                return None
+        return self._scan(rel)
+
+    def _walk(self, top: str) -> None:
+        """
+        Сверяет поддерево top с диском по уровням: папки одного уровня
+        проверяются параллельно, неизвестные и изменившиеся сканируются.
+        """
+        check = metrics.bind(self._check)
+        with ThreadPoolExecutor(self.workers) as pool:
+            frontier = [top]
+            while frontier:
+                next_frontier = []
+                with metrics.phase("walk"):
+                    results = list(pool.map(check, frontier))
+                for rel, entry in zip(frontier, results):
+                    old = self._dirs.get(rel)
+                    if entry is None:
+                        self._drop(rel)
+                        continue
+                    if entry is not old:
+                        if old is not None:
+                            for name in set(old[3]) - set(entry[3]):
+                                self._drop(self._join(rel, name))
+                        self._dirs[rel] = entry
+                        self._invalidate(rel)
+                    next_frontier.extend(self._join(rel, name) for name in entry[3])
+                frontier = next_frontier
+
+    def _drop(self, rel: str) -> None:
+        """
+        Удаляет поддерево rel из индекса.
+        """
+        stack = [rel]
+        while stack:
+            current = stack.pop()
+            entry = self._dirs.pop(current, None)
+            self._totals.pop(current, None)
+            if entry is not None:
+                stack.extend(self._join(current, name) for name in entry[3])
+        self._invalidate(os.path.dirname(rel) if rel else None)
+
+    def _invalidate(self, rel: str | None) -> None:
+        """
+        Сбрасывает итоги папки rel и всех ее предков.
+        """
+        self._dirty = True
+        while rel is not None:
+            self._totals.pop(rel, None)
+            rel = os.path.dirname(rel) if rel else None
+
+    def _touch(self, rel: str) -> None:
+        """
+        Запоминает новый mtime папки, изменение которой уже учтено.
+        """
+        entry = self._dirs.get(rel)
+        if entry is None:
+            return
+        try:
+            entry[0] = os.stat(self._abs(rel), follow_symlinks=False).st_mtime_ns
+        except FileNotFoundError:
+            pass
+        self._invalidate(rel)
+
+    def _link(self, rel: str, present: bool) -> None:
+        """
+        Добавляет или убирает папку rel из списка вложенных папок родителя.
+        """
+        entry = self._dirs.get(os.path.dirname(rel))
+        if entry is None or not rel:
+            return
+        name = os.path.basename(rel)
+        if present and name not in entry[3]:
+            entry[3].append(name)
+        elif not present and name in entry[3]:
+            entry[3].remove(name)
+
+    def _total(self, rel: str) -> tuple[int, int]:
+        """
+        Возвращает (размер, число файлов) поддерева rel.
+        """
+        if rel not in self._totals:
+            self._sum(rel)
+        size, files, links = self._totals.get(rel, (0, 0, {}))
+        return size + sum(links.values()), files + len(links)
+
+    def _sum(self, rel: str) -> None:
+        """
+        Считает итоги поддерева rel и его вложенных папок, которых еще нет в _totals.
+        """
+        stack = [(rel, False)]
+        while stack:
+            current, expanded = stack.pop()
+            entry = self._dirs.get(current)
+            if entry is None or current in self._totals:
+                continue
+            children = [self._join(current, name) for name in entry[3]]
+            if not expanded:
+                stack.append((current, True))
+                stack.extend((child, False) for child in children if child not in self._totals)
+                continue
+            size, files, links = entry[1], entry[2], entry[4]
+            for child in children:
+                child_size, child_files, child_links = self._totals.get(child, (0, 0, {}))
+                size += child_size
+                files += child_files
+                if child_links:
+                    # Одинаковые inode из разных папок остаются одним ключом
+                    links = {**links, **child_links} if links else child_links
+            self._totals[current] = (size, files, links)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self) -> None:
+        """
+        Загружает индекс с диска и сверяет его с файловой системой.
+        Если сохраненного индекса нет, обходит всю рабочую директорию.
+        """
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == self.VERSION and data.get("root") == self.root:
+                    self._dirs = data["dirs"]
+            except (FileNotFoundError, ValueError, KeyError):
+                self._dirs = {}
+            self._totals = {}
+            self._walk("")
+            self._loaded = True
+
+    def refresh(self, path: str = None) -> None:
+        """
+        Пересканирует папки поддерева path (по умолчанию всего индекса), mtime которых изменился.
+        """
+        with self._lock:
+            if not self._loaded:
+                self.load()
+                return
+            self._walk(self._rel(path) if path is not None else "")
+
+    def rescan(self, path: str = None) -> None:
+        """
+        Заново обходит поддерево path целиком (например, после изменения
+        файлов в обход менеджера: размер файла не меняет mtime папки).
+        """
+        with self._lock:
+            self.load()
+            self._rescan(self._rel(path) if path is not None else "")
+
+    def _rescan(self, rel: str) -> None:
+        """
+        Помечает папки поддерева rel устаревшими и сверяет его с диском.
+        Обходит только само поддерево (по спискам вложенных папок), итоги
+        предков сбрасывает _walk.
+        """
+        stack = [rel]
+        while stack:
+            current = stack.pop()
+            entry = self._dirs.get(current)
+            if entry is None:
+                continue
+            # Сброшенный mtime заставляет _walk прочитать папку заново
+            self._dirs[current] = [None, *entry[1:]]
+            stack.extend(self._join(current, name) for name in entry[3])
+        self._walk(rel)
+
+    def usage(self, path: str, depth: int = 1, refresh: bool = False) -> list[tuple[str, int, int]]:
+        """
+        Возвращает (путь, размер, число файлов) папки path и ее вложенных
+        папок до глубины depth (0 — все), крупные первыми; первой идет сама path.
+        Индекс сверяется с диском при загрузке; в течение сессии его обновляют
+        операции менеджера, а refresh заново проверяет mtime папок поддерева.
+        """
+        with self._lock:
+            if refresh or not self._loaded:
+                self.refresh(path)
+            top = self._rel(path)
+            if top not in self._dirs:
+                return []
+            result = []
+            stack = [(top, 0)]
+            while stack:
+                rel, level = stack.pop()
+                if level:
+                    result.append((self._abs(rel), *self._total(rel)))
+                if depth and level >= depth:
+                    continue
+                stack.extend((self._join(rel, name), level + 1) for name in self._dirs[rel][3])
+            result.sort(key=lambda item: (-item[1], item[0]))
+            return [(self._abs(top), *self._total(top)), *result]
+
+    def stat(self, path: str) -> os.stat_result | None:
+        """
+        Возвращает lstat пути до изменения, чтобы передать его в changed.
+        Пока индекс не загружен, ничего не читает с диска.
+        """
+        if not self._loaded:
+            return None
+        try:
+            return os.stat(path, follow_symlinks=False)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    def changed(self, path: str, before: os.stat_result = None) -> None:
+        """
+        Учитывает изменение по пути path: before — его stat до изменения
+        (None, если пути не было). Файл меняет итоги своей папки на разницу
+        размеров, папка пересканируется вместе с поддеревом. Файл с жесткими
+        ссылками (сейчас или при последнем обходе) пересканирует свою папку.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            rel = self._rel(path)
+            if rel == os.pardir or rel.startswith(os.pardir + os.sep) or rel.split(os.sep)[0] in self.ignore:
+                return
+            # Промежуточные папки могли появиться вместе с path
+            while rel and os.path.dirname(rel) not in self._dirs:
+                rel = os.path.dirname(rel)
+                before = None
+            try:
+                now = os.stat(self._abs(rel), follow_symlinks=False)
+            except (FileNotFoundError, NotADirectoryError):
+                now = None
+            if now is not None and stat.S_ISDIR(now.st_mode):
+                self._rescan(rel)
+                self._link(rel, True)
+                self._touch(os.path.dirname(rel))
+                return
+            parent = os.path.dirname(rel)
+            if rel in self._dirs:
+                self._drop(rel)
+                self._link(rel, False)
+            elif any(st is not None and stat.S_ISREG(st.st_mode)
+                     and (st.st_nlink > 1 or f"{st.st_dev}:{st.st_ino}" in self._dirs[parent][4])
+                     for st in (before, now)):
+                entry = self._scan(parent)
+                if entry is not None:
+                    self._dirs[parent] = entry
+                    self._invalidate(parent)
+                return
+            elif before is not None and stat.S_ISREG(before.st_mode):
+                self._dirs[parent][1] -= before.st_size
+                self._dirs[parent][2] -= 1
+            if now is not None and stat.S_ISREG(now.st_mode):
+                self._dirs[parent][1] += now.st_size
+                self._dirs[parent][2] += 1
+            self._touch(parent)
+
+    def move_tree(self, old_path: str, new_path: str) -> None:
+        """
+        Переносит поддерево папки в индексе без повторного обхода диска.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            old_rel, new_rel = self._rel(old_path), self._rel(new_path)
+            if old_rel not in self._dirs or os.path.dirname(new_rel) not in self._dirs:
+                self.changed(old_path)
+                self.changed(new_path)
+                return
+            moved = {}
+            stack = [old_rel]
+            while stack:
+                current = stack.pop()
+                entry = self._dirs.get(current)
+                if entry is None:
+                    continue
+                moved[new_rel + current[len(old_rel):]] = entry
+                stack.extend(self._join(current, name) for name in entry[3])
+            self._drop(old_rel)
+            self._link(old_rel, False)
+            self._touch(os.path.dirname(old_rel))
+            if new_rel in self._dirs:
+                self._drop(new_rel)
+            self._dirs.update(moved)
+            self._link(new_rel, True)
+            self._touch(os.path.dirname(new_rel))
+
+    def save(self) -> None:
+        """
+        Атомарно сохраняет индекс на диск, если он изменялся.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "root": self.root, "dirs": self._dirs}, f)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import stat
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from src import metrics
+from src.pools import process_pool
+from src.copy_engine import clone_file
+
+# Сколько байт с начала и с конца файла берется для быстрого хэша
+EDGE_SIZE = 4 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+class FileInfo:
+    """
+    Файл-кандидат: путь и ключ кэша (устройство, inode, размер, mtime).
+    """
+
+    __slots__ = ("path", "dev", "ino", "size", "mtime")
+
+    def __init__(self, path: str, st: os.stat_result):
+        self.path = path
+        self.dev = st.st_dev
+        self.ino = st.st_ino
+        self.size = st.st_size
+        self.mtime = st.st_mtime_ns
+
+    @property
+    def key(self) -> str:
+        return f"{self.dev}:{self.ino}"
+
+    @property
+    def stamp(self) -> list[int]:
+        return [self.size, self.mtime]
+
+
+def edge_hash(path: str) -> str:
+    """
+    Хэш первых и последних EDGE_SIZE байт файла.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        digest.update(f.read(EDGE_SIZE))
+        size = os.fstat(f.fileno()).st_size
+        if size > EDGE_SIZE:
+            f.seek(max(size - EDGE_SIZE, EDGE_SIZE))
+            digest.update(f.read(EDGE_SIZE))
+    return digest.hexdigest()
+
+
+def full_hash(path: str) -> str:
+    """
+    Хэш всего содержимого файла. Выполняется в отдельном процессе.
+    """
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashCache:
+    """
+    Кэш хэшей по ключу (inode, размер, mtime): при повторном запуске
+    пересчитываются только изменившиеся файлы. В записи хранится и путь
+    файла, чтобы поиск в одной папке не вычищал записи других папок.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def get(self, info: FileInfo, kind: str) -> str | None:
+        entry = self._entries.get(info.key)
+        if entry is None or entry["stamp"] != info.stamp:
+            return None
+        return entry.get(kind)
+
+    def put(self, info: FileInfo, kind: str, value: str) -> None:
+        with self._lock:
+            entry = self._entries.get(info.key)
+            if entry is None or entry["stamp"] != info.stamp:
+                entry = self._entries[info.key] = {"stamp": info.stamp}
+            entry["path"] = info.path
+            entry[kind] = value
+            self._dirty = True
+
+    def save(self, alive: set[str] = None, root: str = None) -> None:
+        """
+        Сохраняет кэш. Если передан alive, удаляются записи файлов под root
+        (по умолчанию всех), которых больше нет (ключа нет в alive).
+        """
+        with self._lock:
+            if alive is not None:
+                prefix = os.path.join(root, "") if root is not None else ""
+                for key in set(self._entries) - alive:
+                    # У записей старого формата пути нет: считаем их устаревшими
+                    path = self._entries[key].get("path", "")
+                    if path.startswith(prefix) or not path:
+                        del self._entries[key]
+                        self._dirty = True
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+
+def scan_files(root: str, ignore: set[str] = frozenset()) -> list[FileInfo]:
+    """
+    Собирает обычные файлы под root (ссылки не учитываются).
+    """
+    files = []
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in metrics.timed(it, "walk"):
+                if entry.name in ignore:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    with metrics.phase("stat"):
+                        st = entry.stat(follow_symlinks=False)
+                    if stat.S_ISREG(st.st_mode) and st.st_size > 0:
+                        files.append(FileInfo(entry.path, st))
+    return files
+
+
+def _refine(groups: list[list[FileInfo]], kind: str, hasher: callable, cache: HashCache,
+            pool) -> list[list[FileInfo]]:
+    """
+    Разбивает группы по значению хэша kind; одиночки отбрасываются.
+    """
+    todo = [info for group in groups for info in group if cache.get(info, kind) is None]
+    with metrics.phase("read"):
+        for info, value in zip(todo, pool.map(hasher, [info.path for info in todo], chunksize=16)):
+            cache.put(info, kind, value)
+    metrics.count(bytes=sum(min(info.size, 2 * EDGE_SIZE) if kind == "edge" else info.size for info in todo))
+    refined = []
+    for group in groups:
+        by_hash = defaultdict(list)
+        for info in group:
+            by_hash[cache.get(info, kind)].append(info)
+        refined.extend(same for same in by_hash.values() if len(same) > 1)
+    return refined
+
+
+def find_duplicates(root: str, cache: HashCache, workers: int = None,
+                    ignore: set[str] = frozenset()) -> list[list[FileInfo]]:
+    """
+    Ищет одинаковые файлы в три этапа: группировка по размеру, хэш краев
+    файла (потоки) и полный хэш (процессы). Жесткие ссылки на один inode
+    считаются одним файлом. Возвращает группы дубликатов, крупные первыми.
+    """
+    files = scan_files(root, ignore)
+    metrics.count(files=len(files))
+    by_size = defaultdict(dict)
+    for info in files:
+        by_size[info.size].setdefault(info.key, info)
+    groups = [list(same.values()) for same in by_size.values() if len(same) > 1]
+
+    with ThreadPoolExecutor(workers) as threads:
+        groups = _refine(groups, "edge", metrics.bind(edge_hash), cache, threads)
+    # Полный хэш нужен только если файл длиннее того, что уже покрыл хэш краев
+    small = [group for group in groups if group[0].size <= 2 * EDGE_SIZE]
+    large = [group for group in groups if group[0].size > 2 * EDGE_SIZE]
+    if large:
+        with process_pool(workers) as processes:
+            large = _refine(large, "full", full_hash, cache, processes)
+    cache.save(alive={info.key for info in files}, root=root)
+
+    result = [sorted(group, key=lambda info: info.path) for group in small + large]
+    result.sort(key=lambda group: (-group[0].size, group[0].path))
+    return result
+
+
+def link_duplicate(keeper: str, duplicate: str, mode: str) -> None:
+    """
+    Заменяет duplicate жесткой ссылкой (hardlink) или reflink-копией keeper.
+    Замена атомарная: ссылка создается рядом и переименовывается поверх файла.
+    """
+    tmp_path = os.path.join(os.path.dirname(duplicate), f".{os.path.basename(duplicate)}.dedupe")
+    if mode == "hardlink":
+        os.link(keeper, tmp_path)
+    elif mode == "reflink":
+        clone_file(keeper, tmp_path)
+    else:
+        raise ValueError(f"Неизвестный способ замены: {mode}")
+    try:
+        os.replace(tmp_path, duplicate)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
@@ -0,0 +1,80 @@
+class FileManagerError(Exception):
+    """
+    Базовое исключение файлового менеджера.
+    """
+
+
+class PathEscapeError(FileManagerError, PermissionError):
+    """
+    Путь выходит за пределы рабочей директории.
+    """
+
+
+class NotFoundError(FileManagerError, FileNotFoundError):
+    """
+    Файл, папка или архив не найдены.
+    """
+
+
+class AlreadyExistsError(FileManagerError, FileExistsError):
+    """
+    Объект с таким именем уже существует.
+    """
+
+
+class AmbiguousDestinationError(FileManagerError, ValueError):
+    """
+    Найдено несколько папок назначения, и выбрать одну без пользователя нельзя.
+    """
+
+
+class InvalidArgumentError(FileManagerError, ValueError):
+    """
+    Неверный аргумент команды.
+    """
+
+
+class OperationCancelledError(FileManagerError):
+    """
+    Операция прервана по запросу (отмена или таймаут).
+    """
+
+
+class OperationTimeoutError(FileManagerError, TimeoutError):
+    """
+    Операция не уложилась в отведенное время.
+    """
+
+
+class AccessDeniedError(FileManagerError, PermissionError):
+    """
+    Нет прав на операцию с файлом или папкой.
+    """
+
+
+class FileSystemError(FileManagerError, OSError):
+    """
+    Прочая ошибка файловой системы.
+    """
+
+
+# Системные ошибки и соответствующие им исключения файлового менеджера
+_OS_ERRORS = (
+    (FileNotFoundError, NotFoundError),
+    (FileExistsError, AlreadyExistsError),
+    (PermissionError, AccessDeniedError),
+    (TimeoutError, OperationTimeoutError),
+)
+
+
+def typed_error(error: OSError) -> FileManagerError:
+    """
+    Возвращает исключение файлового менеджера для системной ошибки:
+    errno, текст и путь сохраняются. Исключения этого модуля возвращаются как есть.
+    """
+    if isinstance(error, FileManagerError):
+        return error
+    cls = next((typed for raw, typed in _OS_ERRORS if isinstance(error, raw)), FileSystemError)
+    if error.errno is None:
+        return cls(*error.args)
+    return cls(error.errno, error.strerror, error.filename, None, error.filename2)
@@ -1,27 +1,38 @@
+from src.metrics import Metrics
 from src.operations import Operations
 from colorama import Fore, Style
 
 class FileManager(Operations):
-    def __init__(self):
+    def __init__(self, working_dir: str = None, cache_dir: str = None, metrics: Metrics = None):
         """
         Инициализация файлового менеджера.
         """
-        super().__init__()
+        super().__init__(working_dir, cache_dir, metrics)
         self.commands = [
             ("mkdir <папка>", "Создать папку"),
             ("rmdir <папка>", "Удалить папку"),
+            ("trash", "Показать папки, которые удаляются в фоне"),
             ("nav in <папка>", "Войти в папку"),
             ("nav up", "Выйти из папки"),
             ("touch <файл>", "Создать файл"),
             ("write <файл> <текст>", "Записать в файл"),
-            ("cat <файл>", "Просмотреть файл"),
+            ("cat <файл> [режим]", "Просмотреть файл (head N, tail N, lines A B, bytes A B, page N)"),
             ("rm <файл>", "Удалить файл"),
             ("cp <файл> <папка>", "Копировать файл"),
             ("mv <файл> <папка>", "Переместить файл"),
             ("rename <старое> <новое>", "Переименовать файл"),
-            ("zip <файл/папка> <архив>", "Создать ZIP-архив"),
-            ("unzip <архив> <папка>", "Разархивировать ZIP-архив"),
-            ("list", "Вывести текущие элементы директории"),
+            ("zip <файл/папка> <архив> [метод] [уровень]", "Создать ZIP-архив (deflate, stored, bzip2, lzma)"),
+            ("unzip <архив> <папка> [шаблоны]", "Разархивировать ZIP-архив (целиком или выборочно)"),
+            ("find <шаблон>", "Найти папки по шаблону имени"),
+            ("grep <строка> [ключ=значение ...]", "Найти строку в файлах "
+                                                 "(path, icase, index=on|off, limit)"),
+            ("sync <папка> <копия> [delete]", "Синхронизировать копию папки (только изменения; delete — удалить лишнее)"),
+            ("du [ключ=значение ...]", "Занятое место по папкам (path, depth, limit, refresh, rescan)"),
+            ("dupes [hardlink|reflink]", "Найти одинаковые файлы (и заменить их ссылками)"),
+            ("list [ключ=значение ...]", "Вывести элементы директории "
+                                         "(depth, sort=name|size|mtime, reverse, filter, type=f|d, limit, page, long)"),
+            ("stats [last N|reset]", "Замеры команд: время, фазы, объем, скорость"),
+            ("profile <команды|off> [режим]", "Профилировать команды (например cp,zip; cprofile или sample)"),
             ("exit", "Выход")
         ]
 
@@ -33,12 +44,87 @@ class FileManager(Operations):
         for cmd, desc in self.commands:
             print(f"  {Fore.CYAN}{cmd.ljust(25)}{Style.RESET_ALL} {desc}")
 
+    @staticmethod
+    def parse_list_options(args: list[str]) -> dict:
+        """
+        Разбирает параметры list вида depth=2 sort=size filter=*.log.
+        Флаги reverse и long можно писать без значения.
+        """
+        names = {"depth": "depth", "sort": "sort", "reverse": "reverse", "filter": "pattern",
+                 "type": "kind", "limit": "limit", "page": "page", "long": "long"}
+        options = {}
+        for arg in args:
+            key, _, value = arg.partition("=")
+            if key not in names:
+                raise ValueError(f"Неизвестный параметр list: {key}")
+            if key in ("depth", "limit", "page"):
+                options[names[key]] = int(value)
+            elif key in ("reverse", "long"):
+                options[names[key]] = value.lower() not in ("0", "false", "no")
+            else:
+                options[names[key]] = value
+        return options
+
+    @staticmethod
+    def parse_grep_options(args: list[str]) -> dict:
+        """
+        Разбирает параметры grep вида path=logs icase index=on limit=20.
+        """
+        options = {}
+        for arg in args:
+            key, _, value = arg.partition("=")
+            if key == "path":
+                options["folder"] = value
+            elif key == "icase":
+                options["ignore_case"] = value.lower() not in ("0", "false", "no")
+            elif key == "index":
+                options["index"] = value.lower() not in ("off", "0", "false", "no")
+            elif key == "limit":
+                options["limit"] = int(value)
+            else:
+                raise ValueError(f"Неизвестный параметр grep: {key}")
+        return options
+
+    @staticmethod
+    def parse_du_options(args: list[str]) -> dict:
+        """
+        Разбирает параметры du вида path=logs depth=2 limit=10 refresh rescan.
+        """
+        options = {}
+        for arg in args:
+            key, _, value = arg.partition("=")
+            if key == "path":
+                options["folder"] = value
+            elif key in ("depth", "limit"):
+                options[key] = int(value)
+            elif key in ("refresh", "rescan"):
+                options[key] = value.lower() not in ("0", "false", "no")
+            else:
+                raise ValueError(f"Неизвестный параметр du: {key}")
+        return options
+
+    def next_page(self, shown: int, total: int) -> bool:
+        """
+        Между страницами cat ... page ждет Enter; q прекращает вывод.
+        """
+        answer = input(f"{Fore.YELLOW}-- строки 1-{shown} из {total}, Enter — дальше, q — выход --{Style.RESET_ALL} ")
+        return answer.strip().lower() != "q"
+
     def run(self) -> None:
         """
         Основной цикл взаимодействия с пользователем.
         """
         print(f"\nФайловый менеджер рабочая директория: {self.get_relative_path(self.working_dir)}")
         self.show_help()
+        try:
+            self._loop()
+        finally:
+            self.close()
+
+    def _loop(self) -> None:
+        """
+        Читает и выполняет команды до ввода exit.
+        """
         while True:
             try:
                 print(f"\nТекущий путь: {Fore.BLUE}{self.current_path}{Style.RESET_ALL}")
@@ -46,42 +132,77 @@ class FileManager(Operations):
 
                 if not command:
                     continue
-
-                action = command[0].lower()
-                args = command[1:]
-
-                if action == "exit":
+                if not self.execute(command):
                     break
-                elif action == "help":
-                    self.show_help()
-                elif action == "mkdir" and len(args) == 1:
-                    self.create_folder(args[0])
-                elif action == "rmdir" and len(args) == 1:
-                    self.delete_folder(args[0])
-                elif action == "nav" and len(args) >= 1:
-                    self.navigate(args[0], args[1] if len(args) > 1 else None)
-                elif action == "touch" and len(args) == 1:
-                    self.create_file(args[0])
-                elif action == "write" and len(args) >= 2:
-                    self.write_to_file(args[0], ' '.join(args[1:]))
-                elif action == "cat" and len(args) == 1:
-                    self.read_file(args[0])
-                elif action == "rm" and len(args) == 1:
-                    self.delete_file(args[0])
-                elif action == "cp" and len(args) == 2:
-                    self.copy_file(args[0], args[1])
-                elif action == "mv" and len(args) == 2:
-                    self.move_file(args[0], args[1])
-                elif action == "rename" and len(args) == 2:
-                    self.rename_file(args[0], args[1])
-                elif action == "zip" and len(args) == 2:
-                    self.zip_file_or_folder(args[0], args[1])
-                elif action == "unzip" and len(args) == 2:
-                    self.unzip_archive(args[0], args[1])
-                elif action == "list":
-                    self.list_files()
-                else:
-                    print("Неверная команда. Введите 'help' для списка команд")
 
             except Exception as e:
-                print(f"Ошибка выполнения: {str(e)}")
\ No newline at end of file
+                print(f"Ошибка выполнения: {str(e)}")
+
+    def execute(self, command: list[str]) -> bool:
+        """
+        Выполняет одну команду, разбитую на слова, и замеряет ее.
+        Возвращает False, если введена команда exit.
+        """
+        action = command[0].lower()
+        args = command[1:]
+
+        if action == "exit":
+            return False
+        with self.metrics.command(action, args) as record:
+            errors = self.error_count
+            self.dispatch(action, args)
+            if self.error_count > errors:
+                record.ok = False
+        return True
+
+    def dispatch(self, action: str, args: list[str]) -> None:
+        """
+        Вызывает метод, соответствующий команде.
+        """
+        if action == "help":
+            self.show_help()
+        elif action == "mkdir" and len(args) == 1:
+            self.create_folder(args[0])
+        elif action == "rmdir" and len(args) == 1:
+            self.delete_folder(args[0])
+        elif action == "trash" and not args:
+            self.show_trash()
+        elif action == "nav" and len(args) >= 1:
+            self.navigate(args[0], args[1] if len(args) > 1 else None)
+        elif action == "touch" and len(args) == 1:
+            self.create_file(args[0])
+        elif action == "write" and len(args) >= 2:
+            self.write_to_file(args[0], ' '.join(args[1:]))
+        elif action == "cat" and 1 <= len(args) <= 4:
+            self.read_file(args[0], *args[1:2], *(int(arg) for arg in args[2:]))
+        elif action == "rm" and len(args) == 1:
+            self.delete_file(args[0])
+        elif action == "cp" and len(args) == 2:
+            self.copy_file(args[0], args[1])
+        elif action == "mv" and len(args) == 2:
+            self.move_file(args[0], args[1])
+        elif action == "rename" and len(args) == 2:
+            self.rename_file(args[0], args[1])
+        elif action == "zip" and 2 <= len(args) <= 4:
+            self.zip_file_or_folder(args[0], args[1], *args[2:3],
+                                    *(int(level) for level in args[3:4]))
+        elif action == "unzip" and len(args) >= 2:
+            self.unzip_archive(args[0], args[1], args[2:] or None)
+        elif action == "find" and len(args) == 1:
+            self.find_folders(args[0])
+        elif action == "grep" and args:
+            self.grep(args[0], **self.parse_grep_options(args[1:]))
+        elif action == "sync" and 2 <= len(args) <= 3:
+            self.sync_folders(*args)
+        elif action == "du":
+            self.show_usage(**self.parse_du_options(args))
+        elif action == "dupes" and len(args) <= 1:
+            self.find_duplicates(*args)
+        elif action == "list":
+            self.list_files(**self.parse_list_options(args))
+        elif action == "stats" and len(args) <= 2:
+            self.show_stats(*args[:1], *(int(arg) for arg in args[1:]))
+        elif action == "profile" and 1 <= len(args) <= 2:
+            self.set_profile(*args)
+        else:
+            self.error("Неверная команда. Введите 'help' для списка команд")
@@ -0,0 +1,84 @@
+import fnmatch
+import heapq
+import itertools
+import os
+from typing import Iterator, NamedTuple
+
+from src import metrics
+from src.errors import InvalidArgumentError
+
+SORT_KEYS = ("name", "size", "mtime")
+
+
+class Entry(NamedTuple):
+    """
+    Элемент листинга. size и mtime заполняются только когда нужны (иначе None).
+    """
+    path: str
+    rel: str
+    is_dir: bool
+    size: int | None
+    mtime: float | None
+
+
+def iter_entries(root: str, depth: int = 1, pattern: str = None, kind: str = None,
+                 with_stat: bool = False, ignore: set[str] = frozenset()) -> Iterator[Entry]:
+    """
+    Лениво обходит root через os.scandir и отдает элементы по мере чтения.
+
+    depth — сколько уровней показывать (1 — только сама папка, 0 — без ограничения).
+    pattern — glob-шаблон для имени, kind — "f" (файлы) или "d" (папки).
+    Данные stat берутся из DirEntry, который кэширует их после первого вызова.
+    """
+    stack = [(root, "", 1)]
+    while stack:
+        path, rel, level = stack.pop()
+        try:
+            it = os.scandir(path)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        with it:
+            for entry in metrics.timed(it, "walk"):
+                if entry.name in ignore:
+                    continue
+                is_dir = entry.is_dir(follow_symlinks=False)
+                entry_rel = os.path.join(rel, entry.name) if rel else entry.name
+                if is_dir and (depth == 0 or level < depth):
+                    stack.append((entry.path, entry_rel, level + 1))
+                if kind == "f" and is_dir or kind == "d" and not is_dir:
+                    continue
+                if pattern and not fnmatch.fnmatch(entry.name, pattern):
+                    continue
+                size = mtime = None
+                if with_stat:
+                    with metrics.phase("stat"):
+                        st = entry.stat(follow_symlinks=False)
+                    size, mtime = st.st_size, st.st_mtime
+                yield Entry(entry.path, entry_rel, is_dir, size, mtime)
+
+
+def list_entries(root: str, depth: int = 1, sort: str = None, reverse: bool = False,
+                 pattern: str = None, kind: str = None, limit: int = None, page: int = 1,
+                 long: bool = False, ignore: set[str] = frozenset()) -> Iterator[Entry]:
+    """
+    Листинг с сортировкой и постраничным выводом.
+
+    Без сортировки элементы идут потоком и память не зависит от размера папки.
+    Сортировка с limit держит в памяти только offset + limit элементов (heapq);
+    сортировка без limit требует собрать весь листинг.
+    """
+    if sort is not None and sort not in SORT_KEYS:
+        raise InvalidArgumentError(f"Неизвестный ключ сортировки: {sort}. Доступны: {', '.join(SORT_KEYS)}")
+    entries = iter_entries(root, depth, pattern, kind, long or sort in ("size", "mtime"), ignore)
+    offset = (max(page, 1) - 1) * limit if limit else 0
+
+    if sort is not None:
+        key = {"name": lambda e: e.rel, "size": lambda e: e.size, "mtime": lambda e: e.mtime}[sort]
+        if limit:
+            select = heapq.nlargest if reverse else heapq.nsmallest
+            entries = iter(select(offset + limit, entries, key=key))
+        else:
+            entries = iter(sorted(entries, key=key, reverse=reverse))
+
+    stop = offset + limit if limit else None
+    return itertools.islice(entries, offset, stop)
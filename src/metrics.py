@@ -0,0 +1,395 @@
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Фазы, на которые делится время команды: walk, stat, read, write, compress
+PROFILE_MODES = ("cprofile", "sample")
+# Интервал опроса стека в режиме sample, секунды
+SAMPLE_INTERVAL = 0.005
+
+_local = threading.local()
+# cProfile нельзя запускать в нескольких потоках одновременно
+_cprofile_lock = threading.Lock()
+
+
+class CommandRecord:
+    """
+    Замер одной команды: время, фазы, объем данных и число файлов.
+
+    Фазы могут пополняться из рабочих потоков команды (bind), поэтому
+    их сумма бывает больше общего времени: это суммарное время потоков.
+    """
+
+    def __init__(self, name: str, args: list[str]):
+        self.name = name
+        self.args = args
+        self.started = time.time()
+        self.seconds = 0.0
+        self.phases: dict[str, float] = {}
+        self.bytes = 0
+        self.files = 0
+        self.ok = True
+        self.thread = threading.get_ident()
+        self._lock = threading.Lock()
+
+    @property
+    def throughput(self) -> float:
+        """
+        Обработано байт в секунду.
+        """
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add(self, files: int = 0, bytes: int = 0) -> None:
+        with self._lock:
+            self.files += files
+            self.bytes += bytes
+
+    def as_dict(self) -> dict:
+        return {"command": self.name, "args": self.args, "started": self.started, "seconds": self.seconds,
+                "phases": self.phases, "bytes": self.bytes, "files": self.files,
+                "throughput": self.throughput, "ok": self.ok}
+
+
+class _Phase:
+    """
+    Контекст, добавляющий свое время к фазе замера.
+    """
+
+    __slots__ = ("record", "name", "started")
+
+    def __init__(self, record: CommandRecord, name: str):
+        self.record = record
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.record.add_phase(self.name, time.perf_counter() - self.started)
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+def current() -> CommandRecord | None:
+    """
+    Возвращает замер команды, которая выполняется в этом потоке.
+    """
+    return getattr(_local, "record", None)
+
+
+def phase(name: str):
+    """
+    with phase("read"): ... — учитывает время блока в фазе текущей команды.
+    Вне команды ничего не делает.
+    """
+    record = getattr(_local, "record", None)
+    return _NO_PHASE if record is None else _Phase(record, name)
+
+
+def timed(iterable, name: str):
+    """
+    Учитывает в фазе name время получения каждого элемента iterable
+    (например, чтение папки через scandir), но не время обработки элементов.
+    """
+    record = getattr(_local, "record", None)
+    if record is None:
+        return iterable
+    return _timed(iter(iterable), name, record)
+
+
+def _timed(iterator, name: str, record: CommandRecord):
+    spent = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                spent += time.perf_counter() - started
+            yield item
+    finally:
+        record.add_phase(name, spent)
+
+
+def count(files: int = 0, bytes: int = 0) -> None:
+    """
+    Добавляет обработанные файлы и байты к текущей команде.
+    """
+    record = getattr(_local, "record", None)
+    if record is not None:
+        record.add(files, bytes)
+
+
+def bind(func: callable) -> callable:
+    """
+    Привязывает func к текущей команде, чтобы фазы и счетчики
+    из рабочих потоков пула попадали в ее замер, а вывод — туда же,
+    куда вывод самой команды (см. batch.ThreadLocalStdout).
+    """
+    record = getattr(_local, "record", None)
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def bound(*args, **kwargs):
+        previous = getattr(_local, "record", None)
+        _local.record = record
+        try:
+            # Один контекст нельзя войти из нескольких потоков сразу: каждому вызову своя копия
+            return context.copy().run(func, *args, **kwargs)
+        finally:
+            _local.record = previous
+    return bound
+
+
+def instrumented(name: str) -> callable:
+    """
+    Декоратор метода Operations: выполняет метод как команду name
+    (если команда в этом потоке еще не начата). Команда считается
+    неудачной, если метод выбросил исключение или сообщил об ошибке.
+    """
+    def decorate(method: callable) -> callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.command(name, args) as record:
+                errors = self.error_count
+                result = method(self, *args, **kwargs)
+                # Методы с выводом не выбрасывают исключения, а сообщают об ошибке через error
+                if self.error_count > errors:
+                    record.ok = False
+                return result
+        return wrapper
+    return decorate
+
+
+class Sampler:
+    """
+    Профилировщик по выборкам: фоновый поток каждые interval секунд
+    снимает стек потока команды. Результат — свернутые стеки
+    ("a;b;c число") для flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def dump(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, samples in sorted(self.stacks.items()):
+                f.write(f"{stack} {samples}\n")
+
+
+class Metrics:
+    """
+    Сбор замеров команд сессии.
+
+    Хранит последние history замеров и сводку по каждой команде.
+    trace_path — файл, куда дописывается каждый замер: JSONL или, если
+    имя оканчивается на .json, Chrome trace (chrome://tracing, Perfetto).
+    profile — команды, которые нужно профилировать (cProfile или выборками);
+    профили сохраняются в profile_dir.
+    """
+
+    def __init__(self, trace_path: str = None, profile: set[str] = None, profile_mode: str = "cprofile",
+                 profile_dir: str = None, history: int = 1000):
+        self.history: deque[CommandRecord] = deque(maxlen=history)
+        self.summary: dict[str, dict] = {}
+        self.trace_path = trace_path
+        self.profile = set(profile or ())
+        self.profile_mode = profile_mode
+        self.profile_dir = profile_dir
+        self._trace = None
+        self._lock = threading.Lock()
+
+    def set_profile(self, commands: set[str], mode: str = "cprofile") -> None:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Неизвестный режим профилирования: {mode}. Доступны: {', '.join(PROFILE_MODES)}")
+        self.profile = set(commands)
+        self.profile_mode = mode
+
+    def command(self, name: str, args=()) -> "_Command":
+        """
+        with metrics.command("cp", args) as record: ... — замер команды.
+        Вложенные вызовы в том же потоке относятся к уже начатой команде.
+        """
+        return _Command(self, name, args)
+
+    def _profile_path(self, record: CommandRecord, suffix: str) -> str:
+        profile_dir = self.profile_dir or os.getcwd()
+        os.makedirs(profile_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(record.started))
+        return os.path.join(profile_dir, f"{record.name}-{stamp}-{threading.get_ident()}.{suffix}")
+
+    def _finish(self, record: CommandRecord, profiler) -> None:
+        if isinstance(profiler, cProfile.Profile):
+            path = self._profile_path(record, "prof")
+            profiler.dump_stats(path)
+            print(f"Профиль {record.name} сохранен: {path} (python -m pstats {path})")
+        elif isinstance(profiler, Sampler):
+            path = self._profile_path(record, "folded")
+            profiler.dump(path)
+            print(f"Профиль {record.name} сохранен: {path} ({sum(profiler.stacks.values())} выборок)")
+
+        with self._lock:
+            self.history.append(record)
+            total = self.summary.setdefault(record.name, {"count": 0, "errors": 0, "seconds": 0.0, "max": 0.0,
+                                                          "bytes": 0, "files": 0, "phases": {}})
+            total["count"] += 1
+            total["errors"] += not record.ok
+            total["seconds"] += record.seconds
+            total["max"] = max(total["max"], record.seconds)
+            total["bytes"] += record.bytes
+            total["files"] += record.files
+            for name, seconds in record.phases.items():
+                total["phases"][name] = total["phases"].get(name, 0.0) + seconds
+            if self.trace_path:
+                self._write_trace(record)
+
+    def _write_trace(self, record: CommandRecord) -> None:
+        chrome = self.trace_path.endswith(".json")
+        if self._trace is None:
+            self._trace = open(self.trace_path, "a", encoding="utf-8")
+            # Закрывающая скобка в Chrome trace необязательна, поэтому файл можно дописывать
+            if chrome and self._trace.tell() == 0:
+                self._trace.write("[\n")
+        if chrome:
+            event = {"name": record.name, "cat": "command", "ph": "X", "pid": os.getpid(), "tid": record.thread,
+                     "ts": int(record.started * 1e6),
+                     "dur": int(record.seconds * 1e6),
+                     "args": {key: value for key, value in record.as_dict().items()
+                              if key not in ("command", "started", "seconds")}}
+            self._trace.write(json.dumps(event, ensure_ascii=False) + ",\n")
+        else:
+            self._trace.write(json.dumps(record.as_dict(), ensure_ascii=False) + "\n")
+        self._trace.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self.history.clear()
+            self.summary.clear()
+
+    def report(self) -> str:
+        """
+        Таблица по командам: число вызовов, ошибки, время, объем, скорость и фазы.
+        """
+        with self._lock:
+            summary = {name: dict(total, phases=dict(total["phases"])) for name, total in self.summary.items()}
+        if not summary:
+            return "Команды еще не выполнялись"
+        mb = 1024 * 1024
+        lines = [f"{'команда':<10} {'вызовов':>7} {'ошибок':>6} {'всего, с':>9} {'средн., мс':>10} "
+                 f"{'макс., мс':>9} {'файлов':>8} {'МБ':>9} {'МБ/с':>8}  фазы, с"]
+        for name, total in sorted(summary.items(), key=lambda item: -item[1]["seconds"]):
+            speed = total["bytes"] / total["seconds"] / mb if total["seconds"] else 0.0
+            phases = ", ".join(f"{phase_name} {seconds:.3f}"
+                               for phase_name, seconds in sorted(total["phases"].items(), key=lambda p: -p[1]))
+            lines.append(f"{name:<10} {total['count']:>7} {total['errors']:>6} {total['seconds']:>9.3f} "
+                         f"{total['seconds'] / total['count'] * 1000:>10.2f} {total['max'] * 1000:>9.2f} "
+                         f"{total['files']:>8} {total['bytes'] / mb:>9.1f} {speed:>8.1f}  {phases}")
+        return "\n".join(lines)
+
+
+class _Command:
+    """
+    Контекст замера команды; см. Metrics.command.
+    """
+
+    def __init__(self, metrics: Metrics, name: str, args):
+        self.metrics = metrics
+        self.name = name
+        self.args = args
+        self.record = None
+        self.profiler = None
+        self._started = 0.0
+
+    def __enter__(self) -> CommandRecord:
+        outer = getattr(_local, "record", None)
+        if outer is not None:
+            return outer
+        self.record = CommandRecord(self.name, [str(arg) for arg in self.args if isinstance(arg, (str, int))])
+        _local.record = self.record
+        if self.name in self.metrics.profile:
+            self.profiler = self._start_profiler()
+        self._started = time.perf_counter()
+        return self.record
+
+    def _start_profiler(self):
+        if self.metrics.profile_mode == "sample":
+            sampler = Sampler(threading.get_ident())
+            sampler.start()
+            return sampler
+        if not _cprofile_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Профилировщик уже запущен кем-то другим
+            _cprofile_lock.release()
+            return None
+        return profiler
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.record is None:
+            return
+        self.record.seconds = time.perf_counter() - self._started
+        if exc_type is not None:
+            self.record.ok = False
+        if isinstance(self.profiler, cProfile.Profile):
+            self.profiler.disable()
+            _cprofile_lock.release()
+        elif isinstance(self.profiler, Sampler):
+            self.profiler.stop()
+        _local.record = None
+        self.metrics._finish(self.record, self.profiler)
+
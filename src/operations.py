@@ -1,28 +1,152 @@
+import codecs
+import copy
+import hashlib
 import os
 import shutil
-import zipfile
-
-from src.config.settings import WORKING_DIRECTORY
+import sys
+import threading
+import time
+
+from src import metrics
+from src.archive import COMPRESSION_METHODS, ArchiveStats, create_zip, extract_zip
+from src.config.settings import CACHE_DIRECTORY, SERVICE_DIRECTORIES, TRASH_DIRECTORY_NAME, WORKING_DIRECTORY
+from src.copy_engine import CopyProgress, copy_path
+from src.dir_index import DirIndex
+from src.disk_usage import DiskUsage, format_size
+from src.dupes import FileInfo, HashCache, find_duplicates, link_duplicate
+from src.errors import (AlreadyExistsError, AmbiguousDestinationError, InvalidArgumentError,
+                        NotFoundError)
+from src.listing import list_entries
+from src.metrics import Metrics, instrumented
+from src.paths import O_NOFOLLOW, PathResolver
+from src.reader import LineIndex, head_end, iter_bytes, tail_start
+from src.search import Match, TrigramIndex, iter_files, search_files
+from src.sync import SyncManifest, SyncStats, sync_trees
+from src.trash import Trash
 
 class Operations:
-    def __init__(self):
+    def __init__(self, working_dir: str = None, cache_dir: str = None, metrics: Metrics = None):
         """
         Инициализация рабочей директории.
         Если директория не существует, она будет создана.
+        Кэши хранятся в cache_dir; по умолчанию это отдельная подпапка
+        CACHE_DIRECTORY для каждой рабочей директории.
+        metrics собирает замеры команд (см. src.metrics).
+        """
+        os.makedirs(working_dir or WORKING_DIRECTORY, exist_ok=True)
+        # Пути разрешаются от открытого дескриптора рабочей директории (см. src.paths)
+        self.paths = PathResolver(working_dir or WORKING_DIRECTORY)
+        self.working_dir = self.paths.root
+        if cache_dir is None:
+            key = hashlib.md5(self.working_dir.encode("utf-8")).hexdigest()[:12]
+            cache_dir = os.path.join(CACHE_DIRECTORY, key)
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.dir_index = DirIndex(self.working_dir, os.path.join(self.cache_dir, "dir_index.json"),
+                                  ignore=SERVICE_DIRECTORIES)
+        self.disk_usage = DiskUsage(self.working_dir, os.path.join(self.cache_dir, "disk_usage.json"),
+                                    ignore=SERVICE_DIRECTORIES)
+        # Корзина общая для всех Operations этой рабочей директории;
+        # acquire дочищает то, что не успели удалить в прошлый раз
+        self.trash = Trash.acquire(os.path.join(self.working_dir, TRASH_DIRECTORY_NAME))
+        self._holds_trash = True
+        self.line_index = LineIndex(os.path.join(self.cache_dir, "lines"))
+        # Кэши, которые создаются при первом использовании; общие для всех сеансов (см. session)
+        self._lazy: dict = {}
+        self._lazy_lock = threading.Lock()
+        # Счетчик ошибок свой у каждого потока: команды пакета выполняются параллельно
+        self._errors = threading.local()
+        # Как выбирать папку, если найдено несколько с одним именем:
+        # ask — спросить пользователя, nearest — ближайшая к текущему пути,
+        # first — первая по алфавиту, error — считать ошибкой
+        self.dest_policy = "ask"
+        self.metrics = metrics or Metrics()
+        if self.metrics.profile_dir is None:
+            self.metrics.profile_dir = os.path.join(self.cache_dir, "profiles")
+
+    def error(self, message: str) -> None:
+        """
+        Сообщает об ошибке команды и увеличивает счетчик ошибок.
+        По счетчику пакетный режим определяет, успешно ли выполнена команда.
+        """
+        self._errors.count = self.error_count + 1
+        print(message)
+
+    @property
+    def error_count(self) -> int:
+        """
+        Число ошибок, о которых сообщили команды текущего потока.
+        """
+        return getattr(self._errors, "count", 0)
+
+    @property
+    def _hash_cache(self) -> HashCache | None:
+        return self._lazy.get("hash_cache")
+
+    @property
+    def _search_index(self) -> TrigramIndex | None:
+        return self._lazy.get("search_index")
+
+    def save(self) -> None:
         """
-        self.working_dir = os.path.abspath(WORKING_DIRECTORY)
-        os.makedirs(self.working_dir, exist_ok=True)
-        self.current_path = self.working_dir
+        Сохраняет кэши на диск (изменившиеся с прошлого сохранения).
+        """
+        self.dir_index.save()
+        self.disk_usage.save()
+        if self._search_index is not None:
+            self._search_index.save()
+        # Индексы строк удаленных и изменившихся файлов больше не нужны
+        self.line_index.prune()
+
+    def close(self) -> None:
+        """
+        Сохраняет кэши на диск, закрывает файл трассировки и дескрипторы папок.
+        Вызывается при завершении работы.
+        """
+        self.save()
+        self.metrics.close()
+        self.paths.close()
+        if self._holds_trash:
+            self._holds_trash = False
+            self.trash.release()
+
+    def session(self) -> "Operations":
+        """
+        Возвращает сеанс для еще одного клиента: тот же движок (индексы, кэши,
+        корзина, замеры) со своей текущей папкой. Сеансы работают параллельно;
+        закрывается сеанс через close_session, общие кэши сохраняет close.
+        """
+        session = copy.copy(self)
+        session.paths = PathResolver(self.working_dir)
+        return session
+
+    def close_session(self) -> None:
+        self.paths.close()
+
+    @property
+    def current_path(self) -> str:
+        """
+        Текущая директория; ее дескриптор держит открытым self.paths.
+        """
+        return self.paths.cwd_path
+
+    @current_path.setter
+    def current_path(self, path: str) -> None:
+        self.paths.chdir(path)
 
-    def validate_path(self, path: str) -> str:
+    def validate_path(self, path: str, follow: bool = True) -> str:
         """
-        Проверяет, что путь находится внутри рабочей директории.
-        Если путь выходит за пределы рабочей директории, выбрасывает исключение.
+        Проверяет, что путь находится внутри рабочей директории, и возвращает абсолютный путь.
+        Символические ссылки раскрываются по компонентам: выйти за пределы
+        рабочей директории через ".." или ссылку нельзя (PathEscapeError).
+        follow=False не раскрывает ссылку в последнем компоненте.
         """
-        abs_path = os.path.abspath(path)
-        if not abs_path.startswith(self.working_dir):
-            raise PermissionError("Выход за пределы рабочей директории запрещен")
-        return abs_path
+        return self.paths.resolve(path, follow)
+
+    def resolve(self, name: str, follow: bool = True) -> str:
+        """
+        Возвращает проверенный абсолютный путь для имени относительно текущей директории.
+        """
+        return self.paths.resolve(name, follow)
 
     def get_relative_path(self, path: str) -> str:
         """
@@ -30,98 +154,265 @@ class Operations:
         """
         return os.path.relpath(path, self.working_dir)
 
+    @instrumented("mkdir")
+    def make_folder(self, folder_name: str) -> str:
+        """
+        Создает папку (вместе с промежуточными) и возвращает ее путь.
+        """
+        with self.paths.open_target(folder_name, follow=False) as target:
+            try:
+                os.mkdir(target.name, dir_fd=target.dir_fd)
+            except FileNotFoundError:
+                # Нет промежуточных папок: создаем их по проверенному пути
+                os.makedirs(target.path, exist_ok=True)
+            except FileExistsError:
+                if not os.path.isdir(target.path):
+                    raise
+        full_path = target.path
+        self.dir_index.add_tree(full_path)
+        self.disk_usage.changed(full_path)
+        metrics.count(files=1)
+        return full_path
+
+    @instrumented("mkdir")
     def create_folder(self, folder_name: str) -> None:
         """
         Создает папку в текущей директории
         """
         try:
-            full_path = self.validate_path(os.path.join(self.current_path, folder_name))
-            os.makedirs(full_path, exist_ok=True)
+            self.make_folder(folder_name)
             print(f"Создана папка: {folder_name}")
         except Exception as e:
-            print("Ошибка при создании папки: " + str(e))
+            self.error("Ошибка при создании папки: " + str(e))
+
+    @instrumented("rmdir")
+    def remove_folder(self, folder_name: str) -> str:
+        """
+        Удаляет папку со всем содержимым и возвращает ее путь.
+        Папка сразу переносится в корзину, а удаляется в фоне.
+        """
+        full_path = self.resolve(folder_name, follow=False)
+        if not os.path.isdir(full_path) or os.path.islink(full_path):
+            raise NotFoundError(f"Папка не найдена: {folder_name}")
+        if full_path == self.working_dir or full_path == self.trash.trash_dir:
+            raise InvalidArgumentError(f"Эту папку удалить нельзя: {folder_name}")
+        try:
+            self.trash.discard(full_path, self.get_relative_path(full_path))
+        except OSError:
+            # Например, папка — точка монтирования: переименовать ее в корзину нельзя
+            shutil.rmtree(full_path)
+        self.paths.forget(full_path)
+        self.dir_index.remove_tree(full_path)
+        self.disk_usage.changed(full_path)
+        metrics.count(files=1)
+        return full_path
 
+    @instrumented("rmdir")
     def delete_folder(self, folder_name: str) -> None:
         """
         Удаляет папку в текущей директории 
         """
         try:
-            full_path = self.validate_path(os.path.join(self.current_path, folder_name))
-            shutil.rmtree(full_path)
+            self.remove_folder(folder_name)
             print(f"Удалена папка: {folder_name}")
         except FileNotFoundError:
-            print(f"Папка не найдена: {folder_name}")
+            self.error(f"Папка не найдена: {folder_name}")
         except Exception as e:
-            print(str(e))
+            self.error(str(e))
             
+    @instrumented("nav")
+    def change_directory(self, target: str) -> str:
+        """
+        Делает папку target текущей и возвращает ее путь.
+        Выход за пределы рабочей директории выбрасывает PathEscapeError.
+        """
+        new_path = self.validate_path(target)
+        if not os.path.isdir(new_path):
+            raise NotFoundError(f"Папка не существует: {target}")
+        self.current_path = new_path
+        return new_path
+
+    @instrumented("nav")
     def navigate(self, direction: str, target: str = None) -> None:
         try:
             if direction == "in" and target:
-                new_path = self.validate_path(os.path.join(self.current_path, target))
-                if os.path.isdir(new_path):
-                    self.current_path = new_path
-                    print(f"Переход в: {self.get_relative_path(new_path)}")
-                else:
-                    print(f"Папка не существует: {target}")
+                new_path = self.change_directory(target)
+                print(f"Переход в: {self.get_relative_path(new_path)}")
             elif direction == "up":
-                parent = os.path.dirname(self.current_path)
-                if parent.startswith(self.working_dir):
-                    self.current_path = parent
+                if self.current_path != self.working_dir:
+                    self.current_path = ".."
                     print(f"Переход на уровень выше")
                 else:
-                    print("Достигнут корень рабочей директории")
+                    self.error("Достигнут корень рабочей директории")
         except Exception as e:
-            print(str(e)) 
+            self.error(str(e))
 
+    @instrumented("touch")
+    def make_file(self, file_name: str) -> str:
+        """
+        Создает пустой файл и возвращает его путь.
+        """
+        with self.paths.open_target(file_name, follow=False) as target:
+            try:
+                fd = os.open(target.name, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666, dir_fd=target.dir_fd)
+            except FileExistsError:
+                raise AlreadyExistsError("Файл уже существует") from None
+            os.close(fd)
+        self._reindex(target.path)
+        self.disk_usage.changed(target.path)
+        metrics.count(files=1)
+        return target.path
+
+    @instrumented("touch")
     def create_file(self, file_name: str) -> None:
         try:
-            full_path = self.validate_path(os.path.join(self.current_path, file_name))
-            if os.path.exists(full_path):
-                raise FileExistsError("Файл уже существует")
-            open(full_path, 'a').close()
+            self.make_file(file_name)
             print(f"Создан файл: {file_name}")
         except Exception as e:
-            print(str(e))
+            self.error(str(e))
 
+    @instrumented("rm")
+    def remove_file(self, file_name: str) -> str:
+        """
+        Удаляет файл и возвращает его путь.
+        """
+        # Ссылка удаляется сама, а не файл, на который она указывает
+        with self.paths.open_target(file_name, follow=False) as target:
+            before = self.disk_usage.stat(target.path)
+            try:
+                os.unlink(target.name, dir_fd=target.dir_fd)
+            except FileNotFoundError:
+                raise NotFoundError(f"Файл не найден: {file_name}") from None
+        if self._search_index is not None:
+            self._search_index.remove(target.path)
+        self.disk_usage.changed(target.path, before)
+        metrics.count(files=1)
+        return target.path
+
+    @instrumented("rm")
     def delete_file(self, file_name: str) -> None:
         """
         Удаляет файл в текущей директории или по указанному пути
         """
         try:
-            full_path = self.validate_path(os.path.join(self.current_path, file_name))
-            if not os.path.exists(full_path):
-                raise FileNotFoundError(f"Файл не найден: {file_name}")
-            
-            os.remove(full_path)
+            self.remove_file(file_name)
             print(f"Удален файл: {file_name}")
         except FileNotFoundError as e:
-            print(f"Ошибка: {e}")
+            self.error(f"Ошибка: {e}")
         except PermissionError as e:
-            print(f"Ошибка доступа: {e}")
+            self.error(f"Ошибка доступа: {e}")
         except Exception as e:
-            print(f"Произошла ошибка: {e}")
+            self.error(f"Произошла ошибка: {e}")
+
+    @instrumented("write")
+    def append_to_file(self, file_name: str, content: str) -> str:
+        """
+        Дописывает строку в конец файла и возвращает его путь.
+        """
+        with self.paths.open_target(file_name) as target, metrics.phase("write"):
+            before = self.disk_usage.stat(target.path)
+            # O_NOFOLLOW: ссылку, подмененную после проверки пути, не открываем
+            fd = os.open(target.name, os.O_WRONLY | os.O_APPEND | os.O_CREAT | O_NOFOLLOW, 0o666,
+                         dir_fd=target.dir_fd)
+            with open(fd, 'a') as f:
+                f.write(content + "\n")
+        self._reindex(target.path)
+        self.disk_usage.changed(target.path, before)
+        metrics.count(files=1, bytes=len(content.encode()) + 1)
+        return target.path
 
+    @instrumented("write")
     def write_to_file(self, file_name: str, content: str) -> None:
         try:
-            full_path = self.validate_path(os.path.join(self.current_path, file_name))
-            with open(full_path, 'a') as f:
-                f.write(content + "\n")
+            self.append_to_file(file_name, content)
             print(f"Записано в файл: {file_name}")
         except Exception as e:
-            print(str(e))
+            self.error(str(e))
 
-    def read_file(self, file_name: str) -> None:
+    def _print_range(self, path: str, start: int = 0, end: int = None) -> None:
+        """
+        Потоково выводит байты [start, end) файла, не загружая его в память.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for chunk in metrics.timed(iter_bytes(path, start, end), "read"):
+            with metrics.phase("write"):
+                sys.stdout.write(decoder.decode(chunk))
+            metrics.count(bytes=len(chunk))
+        sys.stdout.write(decoder.decode(b"", final=True))
+        sys.stdout.flush()
+
+    @instrumented("cat")
+    def read_file(self, file_name: str, mode: str = None, first: int = None, second: int = None) -> None:
+        """
+        Выводит содержимое файла. Файл читается через mmap порциями,
+        поэтому память не зависит от размера файла.
+        mode: head N, tail N, lines A B (строки A..B), bytes A B (байты [A, B)),
+        page N (постранично по N строк). Без mode выводится весь файл.
+        """
         try:
-            full_path = self.validate_path(os.path.join(self.current_path, file_name))
-            with open(full_path, 'r') as f:
-                print(f"\nСодержимое файла {file_name}:\n{f.read()}")
+            full_path = self.resolve(file_name)
+            if not os.path.isfile(full_path):
+                raise NotFoundError(f"Файл не найден: {file_name}")
+            if mode not in (None, "head", "tail", "lines", "bytes", "page"):
+                raise InvalidArgumentError(f"Неизвестный режим просмотра: {mode}")
+            if any(arg is not None and arg < 0 for arg in (first, second)):
+                raise InvalidArgumentError("Номера строк и байтов не могут быть отрицательными")
+            if mode == "lines":
+                if first is None or first < 1:
+                    raise InvalidArgumentError("Укажите номера строк: lines A B (A >= 1)")
+                second = first if second is None else second
+            if mode == "page" and first == 0:
+                raise InvalidArgumentError("Размер страницы должен быть больше нуля")
+            if mode in ("lines", "bytes") and first is not None and second is not None and second < first:
+                raise InvalidArgumentError(f"Конец диапазона меньше начала: {first} {second}")
+            metrics.count(files=1)
+            print(f"\nСодержимое файла {file_name}:")
+            if mode is None:
+                self._print_range(full_path)
+            elif mode == "head":
+                self._print_range(full_path, 0, head_end(full_path, 10 if first is None else first))
+            elif mode == "tail":
+                self._print_range(full_path, tail_start(full_path, 10 if first is None else first))
+            elif mode == "lines":
+                start, end = self.line_index.line_range(full_path, first, second - first + 1)
+                self._print_range(full_path, start, end)
+            elif mode == "bytes":
+                self._print_range(full_path, 0 if first is None else first, second)
+            elif mode == "page":
+                page_size = 50 if first is None else first
+                total = self.line_index.line_count(full_path)
+                for line in range(1, total + 1, page_size):
+                    self._print_range(full_path, *self.line_index.line_range(full_path, line, page_size))
+                    shown = min(line + page_size - 1, total)
+                    if shown < total and not self.next_page(shown, total):
+                        break
         except Exception as e:
-            print(str(e))
+            self.error(str(e))
 
-    def file_operation(self, source: str, dest: str, operation: callable) -> None:
+    @instrumented("cat")
+    def read_bytes(self, file_name: str, start: int = 0, end: int = None) -> bytes:
+        """
+        Возвращает байты [start, end) файла.
+        """
+        full_path = self.resolve(file_name)
+        if not os.path.isfile(full_path):
+            raise NotFoundError(f"Файл не найден: {file_name}")
+        with metrics.phase("read"):
+            data = b"".join(iter_bytes(full_path, start, end))
+        metrics.count(files=1, bytes=len(data))
+        return data
+
+    def next_page(self, shown: int, total: int) -> bool:
+        """
+        Вызывается между страницами в режиме page. Возвращает False, чтобы прекратить вывод.
+        """
+        return True
+
+    def file_operation(self, source: str, dest: str, operation: callable = None) -> None:
         """
         Общая функция для операций с файлами (копирование, перемещение).
         dest должна существовать, иначе будет вызвано исключение.
+        Без operation выполняется копирование через copy_path.
         """
         try:
             # Проверяем и нормализуем пути
@@ -130,152 +421,547 @@ class Operations:
 
             # Проверяем, существует ли исходный файл/директория
             if not os.path.exists(src_path):
-                raise FileNotFoundError(f"Файл или директория не найдены: {source}")
+                raise NotFoundError(f"Файл или директория не найдены: {source}")
 
             # Проверяем, существует ли целевая директория
             dest_dir = os.path.dirname(dest_path) if os.path.basename(dest_path) else dest_path
             if not os.path.isdir(dest_dir):
-                raise FileNotFoundError(f"Целевая директория не существует: {dest}")
+                raise NotFoundError(f"Целевая директория не существует: {dest}")
 
             # Выполняем операцию (копирование или перемещение)
-            operation(src_path, dest_path)
-            print(f"Файл {source} -> {dest}")
+            if operation is None:
+                stats = self.copy_path(src_path, dest_path)
+                print(f"Файл {source} -> {dest} ({stats})")
+            else:
+                operation(src_path, dest_path)
+                print(f"Файл {source} -> {dest}")
         except Exception as e:
-            print(f"Ошибка: {e}")
+            self.error(f"Ошибка: {e}")
 
     def find_dest_folders(self, dest: str) -> list[str]:
         """
-        Рекурсивно ищет все папки с именем dest, начиная с корневого пути.
+        Ищет все папки с именем dest в рабочей директории.
         Возвращает список полных путей к найденным папкам.
+        Поиск идет по индексу папок, а не полным обходом дерева.
         """
-        dest_folders = []
-        for root, dirs, files in os.walk(self.working_dir):
-            if dest in dirs:
-                dest_folders.append(os.path.join(root, dest))
-        return dest_folders
+        return self.dir_index.find(dest)
 
-    def copy_file(self, source: str, dest: str) -> None:
+    @instrumented("find")
+    def find_folders(self, pattern: str) -> None:
         """
-        Копирует файл в папку dest. Если найдено несколько папок с именем dest,
-        предлагает пользователю выбрать одну из них.
+        Выводит папки, имя которых подходит под шаблон (например, "log*").
         """
         try:
-            # Проверяем и нормализуем путь к исходному файлу
-            src_path = self.validate_path(os.path.join(self.current_path, source))
-            if not os.path.exists(src_path):
-                raise FileNotFoundError(f"Файл или директория не найдены: {source}")
-
-            # Ищем все папки с именем dest
-            dest_folders = self.find_dest_folders(dest)
-            if not dest_folders:
-                raise FileNotFoundError(f"Папка с именем {dest} не найдена")
-
-            # Если найдено несколько папок, предлагаем выбрать одну
-            if len(dest_folders) > 1:
-                print(f"Найдено несколько папок с именем {dest}:")
-                for i, folder in enumerate(dest_folders, 1):
-                    print(f"{i}. {folder}")
-                choice = int(input("Выберите номер папки: ")) - 1
-                if choice < 0 or choice >= len(dest_folders):
-                    raise ValueError("Неверный выбор")
-                dest_folder = dest_folders[choice]
-            else:
-                dest_folder = dest_folders[0]
+            found = self.dir_index.match(pattern)
+            metrics.count(files=len(found))
+            if not found:
+                print(f"Папки по шаблону {pattern} не найдены")
+            for path in found:
+                print(self.get_relative_path(path))
+        except Exception as e:
+            self.error(str(e))
+
+    def choose_dest_folder(self, dest: str, dest_folders: list[str]) -> str:
+        """
+        Выбирает одну папку из нескольких с именем dest согласно dest_policy.
+        """
+        if len(dest_folders) == 1:
+            return dest_folders[0]
+        if self.dest_policy == "first":
+            return dest_folders[0]
+        if self.dest_policy == "nearest":
+            return min(dest_folders, key=lambda folder: (
+                os.path.relpath(folder, self.current_path).count(os.sep), folder))
+        if self.dest_policy == "error":
+            raise AmbiguousDestinationError(f"Найдено несколько папок с именем {dest}: "
+                             + ", ".join(self.get_relative_path(folder) for folder in dest_folders))
+
+        # Если найдено несколько папок, предлагаем выбрать одну
+        print(f"Найдено несколько папок с именем {dest}:")
+        for i, folder in enumerate(dest_folders, 1):
+            print(f"{i}. {folder}")
+        choice = int(input("Выберите номер папки: ")) - 1
+        if choice < 0 or choice >= len(dest_folders):
+            raise ValueError("Неверный выбор")
+        return dest_folders[choice]
+
+    def copy_path(self, src_path: str, dest_path: str, progress: callable = None) -> CopyProgress:
+        """
+        Копирует файл или папку по абсолютным путям через copy_engine:
+        reflink, copy_file_range, sendfile и только потом буфер в памяти.
+        Папки копируются рекурсивно в пуле потоков.
+        progress(CopyProgress) вызывается по мере копирования.
+        """
+        if os.path.isdir(src_path):
+            inner = os.path.join(os.path.abspath(src_path), "")
+            if os.path.abspath(dest_path).startswith(inner):
+                raise InvalidArgumentError("Нельзя скопировать папку внутрь самой себя")
+        before = self.disk_usage.stat(dest_path)
+        try:
+            stats = copy_path(src_path, dest_path, CopyProgress(progress), resolver=self.paths)
+        finally:
+            # Прерванное копирование тоже могло оставить файлы
+            self.disk_usage.changed(dest_path, before)
+        if os.path.isdir(dest_path):
+            self.dir_index.add_tree(dest_path)
+        metrics.count(files=stats.files, bytes=stats.bytes)
+        return stats
+
+    def _dest_path(self, source: str, dest: str) -> tuple[str, str]:
+        """
+        Проверяет источник и находит путь назначения в папке с именем dest.
+        Возвращает (путь источника, путь назначения).
+        """
+        # Проверяем и нормализуем путь к исходному файлу
+        src_path = self.resolve(source)
+        if not os.path.exists(src_path):
+            raise NotFoundError(f"Файл или директория не найдены: {source}")
+
+        # Ищем все папки с именем dest
+        dest_folders = self.find_dest_folders(dest)
+        if not dest_folders:
+            raise NotFoundError(f"Папка с именем {dest} не найдена")
 
-            # Формируем полный путь к целевому файлу
-            dest_path = os.path.join(dest_folder, os.path.basename(source))
+        dest_folder = self.choose_dest_folder(dest, dest_folders)
 
-            # Копируем файл
-            shutil.copy2(src_path, dest_path)
-            print(f"Файл {source} скопирован в {dest_folder}")
+        # Формируем полный путь к целевому файлу
+        return src_path, os.path.join(dest_folder, os.path.basename(src_path))
+
+    @instrumented("cp")
+    def copy_to(self, source: str, dest: str, progress: callable = None) -> tuple[str, CopyProgress]:
+        """
+        Копирует файл или папку в папку с именем dest.
+        Возвращает путь копии и статистику копирования.
+        """
+        src_path, dest_path = self._dest_path(source, dest)
+        return dest_path, self.copy_path(src_path, dest_path, progress)
+
+    @instrumented("cp")
+    def copy_file(self, source: str, dest: str, progress: callable = None) -> None:
+        """
+        Копирует файл или папку в папку dest. Если найдено несколько папок с именем dest,
+        предлагает пользователю выбрать одну из них.
+        """
+        try:
+            dest_path, stats = self.copy_to(source, dest, progress)
+            print(f"Файл {source} скопирован в {os.path.dirname(dest_path)} ({stats})")
         except Exception as e:
-            print(f"Ошибка: {e}")
+            self.error(f"Ошибка: {e}")
 
+    @instrumented("mv")
+    def move_to(self, source: str, dest: str) -> str:
+        """
+        Перемещает файл или папку в папку с именем dest и возвращает новый путь.
+        """
+        src_path, dest_path = self._dest_path(source, dest)
+        src_before, dest_before = self.disk_usage.stat(src_path), self.disk_usage.stat(dest_path)
+        with metrics.phase("write"):
+            shutil.move(src_path, dest_path)
+        self.paths.forget(src_path)
+        if os.path.isdir(dest_path):
+            self.dir_index.move_tree(src_path, dest_path)
+        self._moved(src_path, dest_path, src_before, dest_before)
+        metrics.count(files=1)
+        return dest_path
+
+    @instrumented("mv")
     def move_file(self, source: str, dest: str) -> None:
         """
         Перемещает файл в папку dest. Если найдено несколько папок с именем dest,
         предлагает пользователю выбрать одну из них
         """
         try:
-            # Проверяем и нормализуем путь к исходному файлу
-            src_path = self.validate_path(os.path.join(self.current_path, source))
-            if not os.path.exists(src_path):
-                raise FileNotFoundError(f"Файл или директория не найдены: {source}")
-
-            # Ищем все папки с именем dest
-            dest_folders = self.find_dest_folders(dest)
-            if not dest_folders:
-                raise FileNotFoundError(f"Папка с именем {dest} не найдена")
-
-            # Если найдено несколько папок, предлагаем выбрать одну
-            if len(dest_folders) > 1:
-                print(f"Найдено несколько папок с именем {dest}:")
-                for i, folder in enumerate(dest_folders, 1):
-                    print(f"{i}. {folder}")
-                choice = int(input("Выберите номер папки: ")) - 1
-                if choice < 0 or choice >= len(dest_folders):
-                    raise ValueError("Неверный выбор")
-                dest_folder = dest_folders[choice]
-            else:
-                dest_folder = dest_folders[0]
-
-            # Формируем полный путь к целевому файлу
-            dest_path = os.path.join(dest_folder, os.path.basename(source))
-
-            shutil.move(src_path, dest_path)
-            print(f"Файл {source} перемещен в {dest_folder}")
+            dest_path = self.move_to(source, dest)
+            print(f"Файл {source} перемещен в {os.path.dirname(dest_path)}")
         except Exception as e:
-            print(f"Ошибка: {e}")
+            self.error(f"Ошибка: {e}")
+
+    @instrumented("rename")
+    def rename_path(self, old_name: str, new_name: str) -> str:
+        """
+        Переименовывает файл или папку и возвращает новый путь.
+        """
+        with self.paths.open_target(old_name, follow=False) as old, \
+                self.paths.open_target(new_name, follow=False) as new:
+            old_before, new_before = self.disk_usage.stat(old.path), self.disk_usage.stat(new.path)
+            os.rename(old.name, new.name, src_dir_fd=old.dir_fd, dst_dir_fd=new.dir_fd)
+        old_path, new_path = old.path, new.path
+        self.paths.forget(old_path)
+        if os.path.isdir(new_path):
+            self.dir_index.move_tree(old_path, new_path)
+        self._moved(old_path, new_path, old_before, new_before)
+        metrics.count(files=1)
+        return new_path
+
+    def _moved(self, old_path: str, new_path: str, old_before: os.stat_result, new_before: os.stat_result) -> None:
+        """
+        Переносит итоги занятого места после перемещения или переименования.
+        """
+        if old_before is not None and os.path.isdir(new_path) and not os.path.islink(new_path):
+            self.disk_usage.move_tree(old_path, new_path)
+        else:
+            self.disk_usage.changed(old_path, old_before)
+            self.disk_usage.changed(new_path, new_before)
 
+    @instrumented("rename")
     def rename_file(self, old_name: str, new_name: str) -> None:
         try:
-            old_path = self.validate_path(os.path.join(self.current_path, old_name))
-            new_path = self.validate_path(os.path.join(self.current_path, new_name))
-            os.rename(old_path, new_path)
+            self.rename_path(old_name, new_name)
             print(f"Переименован: {old_name} -> {new_name}")
         except Exception as e:
-            print(str(e))
+            self.error(str(e))
     
-    def zip_file_or_folder(self, source: str, archive_name: str) -> None:
+    @instrumented("zip")
+    def make_archive(self, source: str, archive_name: str, method: str = "deflate", level: int = None,
+                     workers: int = None, should_stop: callable = None) -> ArchiveStats:
+        """
+        Создает ZIP-архив и возвращает статистику сжатия.
+        """
+        source_path = self.resolve(source)
+        archive_path = self.resolve(archive_name)
+
+        if not os.path.exists(source_path):
+            raise NotFoundError(f"Файл или папка не найдены: {source}")
+        if method not in COMPRESSION_METHODS:
+            raise InvalidArgumentError(f"Неизвестный метод сжатия: {method}. "
+                                       f"Доступны: {', '.join(COMPRESSION_METHODS)}")
+
+        before = self.disk_usage.stat(archive_path)
         try:
-            source_path = self.validate_path(os.path.join(self.current_path, source))
-            archive_path = self.validate_path(os.path.join(self.current_path, archive_name))
-
-            if not os.path.exists(source_path):
-                raise FileNotFoundError(f"Файл или папка не найдены: {source}")
-
-            with zipfile.ZipFile(archive_path, 'w') as zipf:
-                if os.path.isdir(source_path):
-                    for root, dirs, files in os.walk(source_path):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, start=source_path)
-                            zipf.write(file_path, arcname)
-                else:
-                    zipf.write(source_path, os.path.basename(source_path))
+            stats = create_zip(source_path, archive_path, COMPRESSION_METHODS[method], level, workers, should_stop,
+                               SERVICE_DIRECTORIES)
+        finally:
+            self.disk_usage.changed(archive_path, before)
+        metrics.count(files=stats.files, bytes=stats.bytes_in)
+        return stats
+
+    @instrumented("zip")
+    def zip_file_or_folder(self, source: str, archive_name: str, method: str = "deflate",
+                           level: int = None, workers: int = None) -> None:
+        """
+        Создает ZIP-архив. Файлы сжимаются параллельно (workers потоков),
+        уже сжатые форматы (.zip, .jpg, .gz, ...) сохраняются без сжатия.
+        """
+        try:
+            stats = self.make_archive(source, archive_name, method, level, workers)
+            print(f"Создан архив: {archive_name} ({stats})")
+        except Exception as e:
+            self.error(str(e))
+
+    @instrumented("unzip")
+    def extract_archive(self, archive_name: str, extract_to: str, patterns: list[str] = None,
+                        workers: int = None, should_stop: callable = None) -> ArchiveStats:
+        """
+        Разархивирует архив и возвращает статистику распаковки.
+        """
+        archive_path = self.resolve(archive_name)
+        extract_path = self.resolve(extract_to)
 
-            print(f"Создан архив: {archive_name}")
+        if not os.path.exists(archive_path):
+            raise NotFoundError(f"Архив не найден: {archive_name}")
+
+        try:
+            stats = extract_zip(archive_path, extract_path, patterns, workers, should_stop, self.paths)
+        finally:
+            self.disk_usage.changed(extract_path)
+        self.dir_index.add_tree(extract_path)
+        metrics.count(files=stats.files, bytes=stats.bytes_out)
+        return stats
+
+    @instrumented("unzip")
+    def unzip_archive(self, archive_name: str, extract_to: str, patterns: list[str] = None,
+                      workers: int = None) -> None:
+        """
+        Разархивирует архив параллельно. patterns — имена или glob-шаблоны
+        нужных записей; файлы, совпадающие с архивом по размеру и CRC, пропускаются.
+        """
+        try:
+            stats = self.extract_archive(archive_name, extract_to, patterns, workers)
+            print(f"Архив {archive_name} разархивирован в {extract_to} ({stats})")
         except Exception as e:
-            print(str(e))
+            self.error(str(e))
 
-    def unzip_archive(self, archive_name: str, extract_to: str) -> None:
+    @instrumented("list")
+    def list_files(self, depth: int = 1, sort: str = None, reverse: bool = False, pattern: str = None,
+                   kind: str = None, limit: int = None, page: int = 1, long: bool = False) -> None:
+        """
+        Выводит элементы текущей директории потоком (os.scandir).
+        depth — глубина обхода (1 — только текущая папка, 0 — все дерево);
+        sort — name, size или mtime; pattern — glob для имени; kind — f или d;
+        limit и page — постраничный вывод; long — показывать размер и время изменения.
+        """
+        try:
+            shown = 0
+            for entry in list_entries(self.current_path, depth, sort, reverse, pattern, kind, limit, page, long,
+                                      SERVICE_DIRECTORIES):
+                shown += 1
+                name = entry.rel + os.sep if entry.is_dir else entry.rel
+                if long:
+                    mtime = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.mtime))
+                    print(f"{entry.size:>12}  {mtime}  {name}")
+                else:
+                    print(name)
+            metrics.count(files=shown)
+        except Exception as e:
+            self.error(str(e))
+
+    @instrumented("dupes")
+    def collect_duplicates(self, folder: str = ".", workers: int = None) -> list[list[FileInfo]]:
+        """
+        Возвращает группы одинаковых файлов в папке (по умолчанию — текущей).
+        Хэши кэшируются по (inode, размер, mtime) между запусками.
+        """
+        root = self.resolve(folder)
+        if not os.path.isdir(root):
+            raise NotFoundError(f"Папка не найдена: {folder}")
+        with self._lazy_lock:
+            if self._hash_cache is None:
+                self._lazy["hash_cache"] = HashCache(os.path.join(self.cache_dir, "hashes.json"))
+        return find_duplicates(root, self._hash_cache, workers, SERVICE_DIRECTORIES)
+
+    @instrumented("dupes")
+    def link_duplicates(self, groups: list[list[FileInfo]], mode: str) -> tuple[int, int]:
+        """
+        Заменяет дубликаты ссылками на первый файл группы (hardlink или reflink).
+        Каждый путь проходит validate_path; файлы, изменившиеся после
+        хэширования, пропускаются, а если изменился первый файл — вся группа.
+        Возвращает (число замен, освобождено байт).
+        """
+        if mode not in ("hardlink", "reflink"):
+            raise InvalidArgumentError(f"Неизвестный способ замены: {mode}. Доступны: hardlink, reflink")
+        linked = freed = 0
+        for keeper, *duplicates in groups:
+            keeper_path = self.validate_path(keeper.path)
+            if not self._unchanged(keeper_path, keeper):
+                continue
+            keeper_before = self.disk_usage.stat(keeper_path)
+            for info in duplicates:
+                path = self.validate_path(info.path)
+                before = os.stat(path, follow_symlinks=False)
+                if not self._unchanged(path, info, before):
+                    continue
+                link_duplicate(keeper_path, path, mode)
+                self.disk_usage.changed(path, before)
+                linked += 1
+                freed += info.size
+            # У первого файла появились жесткие ссылки: du считает его один раз
+            self.disk_usage.changed(keeper_path, keeper_before)
+        return linked, freed
+
+    @staticmethod
+    def _unchanged(path: str, info: FileInfo, st: os.stat_result = None) -> bool:
+        """
+        Проверяет, что файл не менялся после хэширования (размер и mtime те же).
+        """
         try:
-            archive_path = self.validate_path(os.path.join(self.current_path, archive_name))
-            extract_path = self.validate_path(os.path.join(self.current_path, extract_to))
+            st = st or os.stat(path, follow_symlinks=False)
+        except FileNotFoundError:
+            return False
+        return (st.st_size, st.st_mtime_ns) == (info.size, info.mtime)
 
-            if not os.path.exists(archive_path):
-                raise FileNotFoundError(f"Архив не найден: {archive_name}")
+    @instrumented("dupes")
+    def find_duplicates(self, mode: str = None) -> None:
+        """
+        Выводит группы одинаковых файлов в текущей директории.
+        mode (hardlink или reflink) заменяет дубликаты ссылками на первый файл группы.
+        """
+        try:
+            groups = self.collect_duplicates()
+            if not groups:
+                print("Дубликаты не найдены")
+                return
+            wasted = 0
+            for group in groups:
+                wasted += group[0].size * (len(group) - 1)
+                print(f"\n{group[0].size} байт x {len(group)}:")
+                for info in group:
+                    print(f"  {self.get_relative_path(info.path)}")
+            print(f"\nГрупп: {len(groups)}, можно освободить: {wasted / 1024 / 1024:.1f} МБ")
+            if mode is not None:
+                linked, freed = self.link_duplicates(groups, mode)
+                print(f"Заменено ссылками: {linked}, освобождено: {freed / 1024 / 1024:.1f} МБ")
+        except Exception as e:
+            self.error(str(e))
 
-            os.makedirs(extract_path, exist_ok=True)
+    @instrumented("sync")
+    def synchronize(self, source: str, dest: str, delete: bool = False, workers: int = None,
+                    should_stop: callable = None) -> SyncStats:
+        """
+        Делает папку dest копией папки source и возвращает статистику.
+        Манифест прошлого запуска хранится в cache_dir: копируются только
+        новые и изменившиеся файлы, delete удаляет из dest то, чего нет в source.
+        """
+        src_path = self.resolve(source)
+        dest_path = self.resolve(dest)
+        if not os.path.isdir(src_path):
+            raise NotFoundError(f"Папка не найдена: {source}")
+        if os.path.commonpath([src_path, dest_path]) in (src_path, dest_path):
+            raise InvalidArgumentError("Папки синхронизации не должны совпадать или быть вложены друг в друга")
+        key = hashlib.md5(f"{src_path}\0{dest_path}".encode("utf-8")).hexdigest()[:12]
+        manifest = SyncManifest(os.path.join(self.cache_dir, "sync", f"{key}.json"), src_path, dest_path)
+        try:
+            stats = sync_trees(src_path, dest_path, manifest, delete, workers, SERVICE_DIRECTORIES, should_stop,
+                               self.paths)
+        finally:
+            # Папки копии могли появиться или исчезнуть
+            self.paths.forget(dest_path)
+            self.dir_index.add_tree(dest_path)
+            self.disk_usage.changed(dest_path)
+        return stats
+
+    @instrumented("sync")
+    def sync_folders(self, source: str, dest: str, mode: str = None) -> None:
+        """
+        Синхронизирует папку dest с папкой source; mode delete удаляет лишнее из dest.
+        """
+        try:
+            if mode not in (None, "delete"):
+                raise InvalidArgumentError(f"Неизвестный режим sync: {mode}")
+            stats = self.synchronize(source, dest, delete=mode == "delete")
+            print(f"Папка {dest} синхронизирована с {source}: {stats}")
+        except Exception as e:
+            self.error(str(e))
 
-            with zipfile.ZipFile(archive_path, 'r') as zipf:
-                zipf.extractall(extract_path)
+    @instrumented("du")
+    def folder_usage(self, folder: str = ".", depth: int = 1, refresh: bool = False,
+                     rescan: bool = False) -> list[tuple[str, int, int]]:
+        """
+        Возвращает (путь, размер, число файлов) папки и ее вложенных папок
+        до глубины depth (0 — все), крупные первыми; первой идет сама папка.
+        Итоги хранятся в cache_dir и обновляются операциями менеджера;
+        refresh сверяет mtime папок, rescan обходит поддерево заново.
+        """
+        root = self.resolve(folder)
+        if not os.path.isdir(root):
+            raise NotFoundError(f"Папка не найдена: {folder}")
+        if rescan:
+            self.disk_usage.rescan(root)
+        usage = self.disk_usage.usage(root, depth, refresh)
+        if usage:
+            metrics.count(files=usage[0][2])
+        return usage
+
+    @instrumented("du")
+    def show_usage(self, folder: str = ".", depth: int = 1, limit: int = 20, refresh: bool = False,
+                   rescan: bool = False) -> None:
+        """
+        Выводит занятое место по папкам: сначала итог, затем limit самых крупных вложенных папок.
+        """
+        try:
+            total, *children = self.folder_usage(folder, depth, refresh, rescan)
+            for path, size, files in [total, *children[:limit]]:
+                print(f"{format_size(size):>10}  {files:>8} файлов  {self.get_relative_path(path)}")
+            if len(children) > limit:
+                print(f"... еще папок: {len(children) - limit}")
+        except Exception as e:
+            self.error(str(e))
 
-            print(f"Архив {archive_name} разархивирован в {extract_to}")
+    @instrumented("trash")
+    def show_trash(self) -> None:
+        """
+        Выводит папки, которые еще удаляются в фоне.
+        """
+        pending = self.trash.status()
+        if not pending:
+            print("Корзина пуста")
+        for item in pending:
+            since = time.strftime("%H:%M:%S", time.localtime(item["since"]))
+            print(f"  {item['label']} — {item['state']} (с {since})")
+
+    def show_stats(self, mode: str = None, count: int = None) -> None:
+        """
+        Выводит замеры команд: сводку по командам (по умолчанию),
+        последние count команд (last) или сбрасывает замеры (reset).
+        """
+        if mode is None:
+            print(self.metrics.report())
+        elif mode == "last":
+            records = list(self.metrics.history)[-(count or 10):]
+            for record in records:
+                phases = ", ".join(f"{name} {seconds:.3f}" for name, seconds in record.phases.items())
+                status = "" if record.ok else " [ошибка]"
+                print(f"{' '.join([record.name, *record.args])}{status}: {record.seconds * 1000:.2f} мс, "
+                      f"файлов {record.files}, {record.bytes / 1024 / 1024:.1f} МБ "
+                      f"({record.throughput / 1024 / 1024:.1f} МБ/с){'; ' + phases if phases else ''}")
+        elif mode == "reset":
+            self.metrics.reset()
+            print("Замеры сброшены")
+        else:
+            self.error(f"Неизвестный режим stats: {mode}")
+
+    def set_profile(self, commands: str, mode: str = "cprofile") -> None:
+        """
+        Включает профилирование команд (через запятую, например cp,zip)
+        в режиме cprofile или sample; off выключает его.
+        """
+        try:
+            if commands == "off":
+                self.metrics.set_profile(set())
+                print("Профилирование выключено")
+                return
+            self.metrics.set_profile(set(commands.split(",")), mode)
+            print(f"Профилирование ({mode}) включено для: {commands}; профили сохраняются в "
+                  f"{self.metrics.profile_dir}")
         except Exception as e:
-            print(str(e))
+            self.error(str(e))
 
-    def list_files(self):
-        for root, dirs, files in os.walk(self.current_path):
-            for file in files:
-                print(os.path.join(root, file))
\ No newline at end of file
+    def _reindex(self, path: str) -> None:
+        """
+        Обновляет файл в триграммном индексе, если индекс используется.
+        """
+        if self._search_index is not None:
+            self._search_index.update(path)
+
+    def trigram_index(self, create: bool = False) -> TrigramIndex | None:
+        """
+        Возвращает триграммный индекс поиска. Если индекс еще не создавался
+        (нет файла в cache_dir) и create не задан, возвращает None.
+        """
+        with self._lazy_lock:
+            if self._search_index is None:
+                index_path = os.path.join(self.cache_dir, "trigrams.json")
+                if not create and not os.path.exists(index_path):
+                    return None
+                self._lazy["search_index"] = TrigramIndex(self.working_dir, index_path, SERVICE_DIRECTORIES)
+            return self._search_index
+
+    @instrumented("grep")
+    def find_text(self, text: str, folder: str = ".", ignore_case: bool = False, index: bool = None,
+                  limit: int = None, workers: int = None) -> list[Match]:
+        """
+        Возвращает строки файлов папки folder, содержащие text. Двоичные файлы пропускаются.
+        index: True — использовать (и при необходимости построить) триграммный индекс,
+        False — просмотреть все файлы, None — использовать индекс, если он уже есть.
+        """
+        if not text:
+            raise InvalidArgumentError("Пустая строка поиска")
+        root = self.resolve(folder)
+        if not os.path.isdir(root):
+            raise NotFoundError(f"Папка не найдена: {folder}")
+        needle = text.encode("utf-8")
+        if index is None:
+            trigrams = self.trigram_index()
+        else:
+            trigrams = self.trigram_index(create=True) if index else None
+        if trigrams is not None:
+            trigrams.refresh(workers, root)
+            candidates = trigrams.candidates(needle, root)
+        else:
+            candidates = [(path, st.st_size) for path, st in iter_files(root, SERVICE_DIRECTORIES)]
+        return search_files(candidates, needle, ignore_case, limit, workers)
+
+    @instrumented("grep")
+    def grep(self, text: str, folder: str = ".", ignore_case: bool = False, index: bool = None,
+             limit: int = 100) -> None:
+        """
+        Выводит строки с text в виде путь:строка: текст (не больше limit).
+        """
+        try:
+            matches = self.find_text(text, folder, ignore_case, index, limit)
+            for match in matches:
+                print(f"{self.get_relative_path(match.path)}:{match.line}: {match.text}")
+            files = len({match.path for match in matches})
+            more = " (показаны первые)" if limit is not None and len(matches) >= limit else ""
+            print(f"Совпадений: {len(matches)}{more} в файлах: {files}")
+        except Exception as e:
+            self.error(str(e))
@@ -0,0 +1,325 @@
+import errno
+import os
+import stat
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import NamedTuple
+
+from src.errors import NotFoundError, PathEscapeError
+
+# Раскрывать не больше стольких ссылок подряд, как ядро (ELOOP)
+MAX_SYMLINKS = 40
+# Сколько дескрипторов папок держать открытыми
+MAX_OPEN_DIRS = 256
+
+_DIR_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_CLOEXEC", 0)
+O_NOFOLLOW = getattr(os, "O_NOFOLLOW", 0)
+# Без openat (Windows) пути проверяются через realpath
+SUPPORTS_DIR_FD = os.open in os.supports_dir_fd and hasattr(os, "O_DIRECTORY") and O_NOFOLLOW != 0
+
+
+class Target(NamedTuple):
+    """
+    Проверенный путь внутри рабочей директории.
+
+    path — абсолютный путь; dir_fd и name передаются в функции os вместе
+    (os.unlink(target.name, dir_fd=target.dir_fd)). Если родительской папки нет
+    или openat недоступен, dir_fd равен None, а name — абсолютный путь.
+    """
+    path: str
+    dir_fd: int | None
+    name: str
+
+
+class PathResolver:
+    """
+    Разрешение путей относительно открытого дескриптора рабочей директории.
+
+    Путь разбирается по компонентам от дескриптора корня (openat с O_NOFOLLOW),
+    символические ссылки раскрываются вручную, и каждый шаг проверяется:
+    ни "..", ни ссылка не могут вывести за пределы корня. Дескрипторы
+    пройденных папок кэшируются (LRU), повторное разрешение проверяет
+    кэш одним fstatat. Дескрипторы корня и текущей папки держатся открытыми.
+    """
+
+    def __init__(self, root: str, max_open: int = MAX_OPEN_DIRS):
+        self.root = os.path.realpath(root)
+        self.max_open = max_open
+        self.cwd: tuple[str, ...] = ()
+        self._cache: OrderedDict[tuple[str, ...], tuple[int, int, int]] = OrderedDict()
+        self._lock = threading.RLock()
+        self.root_fd = os.open(self.root, _DIR_FLAGS) if SUPPORTS_DIR_FD else None
+        self.cwd_fd = self.root_fd
+        self._cwd_id = None
+
+    def close(self) -> None:
+        with self._lock:
+            for fd, _, _ in self._cache.values():
+                os.close(fd)
+            self._cache.clear()
+            if self.cwd_fd is not None and self.cwd_fd != self.root_fd:
+                os.close(self.cwd_fd)
+            if self.root_fd is not None:
+                os.close(self.root_fd)
+            self.root_fd = self.cwd_fd = None
+
+    def _abs(self, parts: tuple[str, ...]) -> str:
+        return os.path.join(self.root, os.sep.join(parts)) if parts else self.root
+
+    def _split(self, path: str, base: tuple[str, ...]) -> tuple[str, ...]:
+        """
+        Лексически нормализует path относительно base (или корня, если путь абсолютный).
+        Подъем выше корня через ".." запрещен.
+        """
+        if os.path.isabs(path):
+            path = os.path.normpath(path)
+            if os.path.commonpath([path, self.root]) != self.root:
+                raise PathEscapeError("Выход за пределы рабочей директории запрещен")
+            path = os.path.relpath(path, self.root)
+            base = ()
+        parts = list(base)
+        for part in path.replace(os.altsep or os.sep, os.sep).split(os.sep):
+            if part in ("", "."):
+                continue
+            if part == "..":
+                if not parts:
+                    raise PathEscapeError("Выход за пределы рабочей директории запрещен")
+                parts.pop()
+            else:
+                parts.append(part)
+        return tuple(parts)
+
+    def _cached(self, parts: tuple[str, ...]) -> int | None:
+        """
+        Возвращает дескриптор папки из кэша, если он все еще соответствует пути.
+        """
+        if not parts:
+            return self.root_fd
+        if parts == self.cwd and self._valid(parts, self._cwd_id):
+            return self.cwd_fd
+        entry = self._cache.get(parts)
+        if entry is None:
+            return None
+        fd, dev, ino = entry
+        if self._valid(parts, (dev, ino)):
+            self._cache.move_to_end(parts)
+            return fd
+        self._drop(parts)
+        return None
+
+    def _valid(self, parts: tuple[str, ...], identity: tuple[int, int]) -> bool:
+        """
+        Проверяет, что по пути parts все еще та же папка (устройство и inode).
+        """
+        try:
+            st = os.stat(os.sep.join(parts), dir_fd=self.root_fd, follow_symlinks=False)
+        except OSError:
+            return False
+        return stat.S_ISDIR(st.st_mode) and (st.st_dev, st.st_ino) == identity
+
+    def _remember(self, parts: tuple[str, ...], fd: int) -> None:
+        st = os.fstat(fd)
+        self._cache[parts] = (fd, st.st_dev, st.st_ino)
+        while len(self._cache) > self.max_open:
+            _, (old_fd, _, _) = self._cache.popitem(last=False)
+            os.close(old_fd)
+
+    def _drop(self, parts: tuple[str, ...]) -> None:
+        for key in [key for key in self._cache if key[:len(parts)] == parts]:
+            os.close(self._cache.pop(key)[0])
+
+    def _link_target(self, parts: tuple[str, ...], dir_fd: int, name: str) -> tuple[str, ...]:
+        """
+        Читает ссылку name в папке parts и возвращает компоненты ее цели.
+        """
+        target = os.readlink(name, dir_fd=dir_fd)
+        if os.path.isabs(target):
+            # Абсолютная цель может идти через ссылки вне корня, но должна оказаться внутри него
+            target = os.path.realpath(target)
+        return self._split(target, parts)
+
+    def _directory(self, parts: tuple[str, ...], links: int = 0) -> tuple[tuple[str, ...], int | None]:
+        """
+        Проходит папки parts от корня, раскрывая ссылки.
+        Возвращает канонические компоненты и дескриптор папки
+        (None, если какой-то папки нет: остаток пути берется как есть).
+        """
+        known = len(parts)
+        fd = self._cached(parts)
+        while fd is None:
+            known -= 1
+            fd = self._cached(parts[:known])
+        canon = parts[:known]
+        for i in range(known, len(parts)):
+            name = parts[i]
+            try:
+                child = os.open(name, _DIR_FLAGS | O_NOFOLLOW, dir_fd=fd)
+            except FileNotFoundError:
+                return canon + parts[i:], None
+            except OSError as e:
+                if e.errno not in (errno.ELOOP, errno.ENOTDIR):
+                    raise
+                if not stat.S_ISLNK(os.stat(name, dir_fd=fd, follow_symlinks=False).st_mode):
+                    raise NotADirectoryError(errno.ENOTDIR, "Не папка", self._abs(canon + (name,)))
+                if links >= MAX_SYMLINKS:
+                    raise OSError(errno.ELOOP, "Слишком много символических ссылок", self._abs(parts))
+                target = self._link_target(canon, fd, name)
+                return self._directory(target + parts[i + 1:], links + 1)
+            canon = canon + (name,)
+            self._remember(canon, child)
+            fd = child
+        return canon, fd
+
+    def _resolve(self, parts: tuple[str, ...], follow: bool, links: int = 0) -> tuple[tuple[str, ...], int | None]:
+        """
+        Возвращает канонические компоненты пути и дескриптор его родительской папки.
+        follow — раскрывать ли ссылку в последнем компоненте.
+        """
+        if not parts:
+            return parts, None
+        parent, fd = self._directory(parts[:-1], links)
+        name = parts[-1]
+        if fd is not None and follow:
+            try:
+                is_link = stat.S_ISLNK(os.stat(name, dir_fd=fd, follow_symlinks=False).st_mode)
+            except FileNotFoundError:
+                is_link = False
+            if is_link:
+                if links >= MAX_SYMLINKS:
+                    raise OSError(errno.ELOOP, "Слишком много символических ссылок", self._abs(parts))
+                return self._resolve(self._link_target(parent, fd, name), follow, links + 1)
+        return parent + (name,), fd
+
+    def _resolve_realpath(self, parts: tuple[str, ...], follow: bool) -> tuple[str, ...]:
+        """
+        Проверка без openat: путь раскрывается через realpath и сверяется с корнем.
+        """
+        path = self._abs(parts)
+        real = os.path.realpath(path) if follow else os.path.join(os.path.realpath(os.path.dirname(path)),
+                                                                  os.path.basename(path))
+        return self._split(real, ())
+
+    def resolve(self, path: str, follow: bool = True) -> str:
+        """
+        Возвращает абсолютный путь внутри рабочей директории для path
+        (относительного текущей папки или абсолютного).
+        Если путь или цель ссылки выходит за пределы, выбрасывает PathEscapeError.
+        """
+        return self._target(path, follow).path
+
+    def _target(self, path: str, follow: bool = True) -> Target:
+        """
+        Разрешает path и возвращает Target с дескриптором родительской папки
+        из кэша. Снаружи используется через open_target.
+        """
+        with self._lock:
+            parts = self._split(path, self.cwd)
+            if not SUPPORTS_DIR_FD:
+                parts = self._resolve_realpath(parts, follow)
+                return Target(self._abs(parts), None, self._abs(parts))
+            parts, fd = self._resolve(parts, follow)
+            if not parts:
+                return Target(self.root, None, self.root)
+            if fd is None:
+                return Target(self._abs(parts), None, self._abs(parts))
+            return Target(self._abs(parts), fd, parts[-1])
+
+    @contextmanager
+    def open_target(self, path: str, follow: bool = True):
+        """
+        with resolver.open_target(path) as target: ... — разрешает path и отдает
+        Target. Дескриптор родительской папки дублируется и закрывается после
+        блока, поэтому его не закроет вытеснение из кэша в другом потоке.
+        """
+        with self._lock:
+            target = self._target(path, follow)
+            if target.dir_fd is not None:
+                target = target._replace(dir_fd=os.dup(target.dir_fd))
+        try:
+            yield target
+        finally:
+            if target.dir_fd is not None:
+                os.close(target.dir_fd)
+
+    def opener(self, path: str, flags: int) -> int:
+        """
+        opener для open(): открывает файл относительно дескриптора проверенной
+        родительской папки с O_NOFOLLOW, поэтому ни ссылка в пути, ни ссылка
+        на месте самого файла не уводят запись за пределы корня.
+        """
+        with self.open_target(path, follow=False) as target:
+            return os.open(target.name, flags | O_NOFOLLOW, 0o666, dir_fd=target.dir_fd)
+
+    def makedirs(self, path: str) -> str:
+        """
+        Создает папку path вместе с недостающими родителями, как os.makedirs
+        с exist_ok. Каждая папка создается относительно дескриптора уже
+        проверенной родительской. Возвращает абсолютный путь.
+        """
+        with self._lock:
+            parts = self._split(path, self.cwd)
+            for i in range(1, len(parts) + 1):
+                with self.open_target(self._abs(parts[:i]), follow=False) as target:
+                    try:
+                        os.mkdir(target.name, dir_fd=target.dir_fd)
+                    except FileExistsError:
+                        pass
+            return self.resolve(self._abs(parts))
+
+    @property
+    def cwd_path(self) -> str:
+        """
+        Абсолютный путь текущей папки.
+        """
+        return self._abs(self.cwd)
+
+    def chdir(self, path: str) -> str:
+        """
+        Делает path текущей папкой и держит ее дескриптор открытым.
+        Возвращает абсолютный путь новой текущей папки.
+        """
+        with self._lock:
+            parts = self._split(path, self.cwd)
+            if SUPPORTS_DIR_FD:
+                parts, fd = self._directory(parts)
+                if fd is None:
+                    raise NotFoundError(f"Папка не существует: {path}")
+                fd = os.dup(fd) if parts else self.root_fd
+            else:
+                parts = self._resolve_realpath(parts, True)
+                if not os.path.isdir(self._abs(parts)):
+                    raise NotFoundError(f"Папка не существует: {path}")
+                fd = None
+            if self.cwd_fd is not None and self.cwd_fd != self.root_fd:
+                os.close(self.cwd_fd)
+            self.cwd, self.cwd_fd = parts, fd
+            if fd is not None:
+                st = os.fstat(fd)
+                self._cwd_id = (st.st_dev, st.st_ino)
+            return self._abs(parts)
+
+    def forget(self, path: str) -> None:
+        """
+        Сбрасывает кэш для папки path и всего, что в ней (после удаления, переноса, переименования).
+        """
+        with self._lock:
+            path = os.path.normpath(os.path.abspath(path))
+            if os.path.commonpath([path, self.root]) == self.root:
+                self._drop(self._split(path, ()))
+
+
+@contextmanager
+def beneath(root: str, resolver: PathResolver = None):
+    """
+    with beneath(root, resolver) as resolver: ... — отдает переданный resolver,
+    а если его нет, временный PathResolver с корнем root (папка должна существовать).
+    """
+    if resolver is not None:
+        yield resolver
+        return
+    resolver = PathResolver(root)
+    try:
+        yield resolver
+    finally:
+        resolver.close()
@@ -0,0 +1,14 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# fork из многопоточного процесса (пакетный режим, демон) может унаследовать
+# захваченные другими потоками блокировки; forkserver запускает рабочие
+# процессы из отдельного чистого процесса
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def process_pool(workers: int = None) -> ProcessPoolExecutor:
+    """
+    Пул процессов, безопасный для запуска из потоков.
+    """
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(_START_METHOD))
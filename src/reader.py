@@ -0,0 +1,291 @@
+import hashlib
+import mmap
+import operator
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+from contextlib import contextmanager, suppress
+from itertools import accumulate, islice
+
+from src import metrics
+
+CHUNK_SIZE = 1024 * 1024
+# Индекс строк хранит начало каждой STRIDE-й строки
+STRIDE = 256
+# Заголовок .idx: метка, размер и mtime файла, число строк, STRIDE, длина пути
+INDEX_MAGIC = 0x5844494C_0003
+HEADER_SIZE = 6 * 8
+
+
+@contextmanager
+def open_map(path: str):
+    """
+    Открывает файл через mmap только для чтения. Для пустого файла отдает None.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield None
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+
+def iter_bytes(path: str, start: int = 0, end: int = None, chunk_size: int = CHUNK_SIZE):
+    """
+    Отдает байты [start, end) порциями по chunk_size, не читая файл целиком.
+    """
+    with open_map(path) as mm:
+        if mm is None:
+            return
+        end = len(mm) if end is None else min(end, len(mm))
+        for offset in range(max(start, 0), end, chunk_size):
+            yield mm[offset:min(offset + chunk_size, end)]
+
+
+def head_end(path: str, count: int) -> int:
+    """
+    Возвращает смещение конца первых count строк.
+    """
+    with open_map(path) as mm:
+        if mm is None:
+            return 0
+        offset = 0
+        for _ in range(count):
+            found = mm.find(b"\n", offset)
+            if found < 0:
+                return len(mm)
+            offset = found + 1
+        return offset
+
+
+def tail_start(path: str, count: int) -> int:
+    """
+    Возвращает смещение начала последних count строк.
+    Поиск идет назад от конца файла, начало файла не читается.
+    """
+    with open_map(path) as mm:
+        if mm is None or count <= 0:
+            return len(mm) if mm is not None else 0
+        end = len(mm)
+        # Завершающий перевод строки не начинает новую строку
+        if mm[end - 1:end] == b"\n":
+            end -= 1
+        for _ in range(count):
+            found = mm.rfind(b"\n", 0, end)
+            if found < 0:
+                return 0
+            end = found
+        return end + 1
+
+
+class LineIndex:
+    """
+    Разреженный кэш смещений строк для каждого файла.
+
+    Индекс хранит начало каждой STRIDE-й строки: для файла из миллионов
+    коротких строк он в STRIDE раз меньше полного. Переход к строке N —
+    ближайшая сохраненная строка и не больше STRIDE - 1 переводов строк
+    вперед по mmap, то есть за время, не зависящее от размера файла.
+    Индекс строится за один проход, хранится в памяти (LRU, не больше
+    max_bytes на все файлы) и на диске в cache_dir; он сбрасывается при
+    изменении размера или mtime файла. Сохраненный индекс не читается
+    целиком: файл .idx отображается через mmap. prune удаляет индексы
+    удаленных и изменившихся файлов.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = 16 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # path -> (stamp, число строк, смещения каждой STRIDE-й строки)
+        self._memory: OrderedDict[str, tuple[tuple[int, int], int, Sequence[int]]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _cache_path(self, path: str) -> str | None:
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, hashlib.md5(path.encode("utf-8")).hexdigest() + ".idx")
+
+    @staticmethod
+    def _build(path: str) -> tuple[int, array]:
+        """
+        Считает строки и находит начала каждой STRIDE-й, просматривая файл
+        порциями по CHUNK_SIZE: переводы строк ищут split и count на уровне C,
+        без цикла по строкам. Возвращает (число строк, смещения).
+        """
+        offsets = array("q", [0])
+        # Найдено начал строк (строка 0 начинается со смещения 0)
+        lines = 1
+        with metrics.phase("read"), open_map(path) as mm:
+            if mm is None:
+                return 0, array("q")
+            size = len(mm)
+            for base in range(0, size, CHUNK_SIZE):
+                chunk = mm[base:base + CHUNK_SIZE]
+                count = chunk.count(b"\n")
+                # Номер первой строки порции, которую нужно сохранить
+                skip = -lines % STRIDE
+                if skip < count:
+                    parts = chunk.split(b"\n")
+                    # Последняя часть продолжается в следующей порции
+                    parts.pop()
+                    # Строка начинается после всех предыдущих частей и их переводов строк
+                    starts = map(operator.add, accumulate(map(len, parts)), range(base + 1, base + count + 1))
+                    offsets.extend(islice(starts, skip, None, STRIDE))
+                lines += count
+            # После завершающего перевода строки новой строки нет
+            if mm[size - 1:size] == b"\n":
+                lines -= 1
+                if offsets[-1] == size:
+                    offsets.pop()
+        return lines, offsets
+
+    @staticmethod
+    def _read_header(data: bytes) -> tuple[int, int, int, int] | None:
+        """
+        Разбирает заголовок .idx: (размер, mtime, число строк, длина пути) или None.
+        """
+        if len(data) < HEADER_SIZE:
+            return None
+        magic, size, mtime, lines, stride, path_length = array("q", data[:HEADER_SIZE])
+        if magic != INDEX_MAGIC or stride != STRIDE:
+            return None
+        return size, mtime, lines, path_length
+
+    def _load(self, path: str, stamp: tuple[int, int]) -> tuple[int, Sequence[int]] | None:
+        """
+        Отображает сохраненный индекс через mmap и возвращает (число строк,
+        смещения как memoryview без копирования); mmap живет, пока жив memoryview.
+        """
+        cache_path = self._cache_path(path)
+        if cache_path is None:
+            return None
+        try:
+            with open(cache_path, "rb") as f:
+                header = self._read_header(f.read(HEADER_SIZE))
+                if header is None or header[:2] != stamp:
+                    return None
+                # Путь исходного файла выровнен до 8 байт, дальше смещения (int64)
+                start = HEADER_SIZE + -(-header[3] // 8) * 8
+                if (os.fstat(f.fileno()).st_size - start) % 8:
+                    return None
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        return header[2], memoryview(mm)[start:].cast("q")
+
+    def _store(self, path: str, stamp: tuple[int, int], lines: int, offsets: array) -> None:
+        cache_path = self._cache_path(path)
+        if cache_path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        encoded = path.encode("utf-8", errors="surrogateescape")
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            array("q", [INDEX_MAGIC, *stamp, lines, STRIDE, len(encoded)]).tofile(f)
+            f.write(encoded.ljust(-(-len(encoded) // 8) * 8, b"\0"))
+            offsets.tofile(f)
+        os.replace(tmp_path, cache_path)
+
+    def prune(self) -> int:
+        """
+        Удаляет сохраненные индексы файлов, которые удалены или изменились
+        (их индекс все равно будет построен заново). Возвращает число удаленных.
+        """
+        if self.cache_dir is None:
+            return 0
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return 0
+        removed = 0
+        for name in names:
+            if not name.endswith(".idx"):
+                continue
+            cache_path = os.path.join(self.cache_dir, name)
+            try:
+                with open(cache_path, "rb") as f:
+                    header = self._read_header(f.read(HEADER_SIZE))
+                    path = f.read(header[3]).decode("utf-8", errors="surrogateescape") if header else None
+                st = os.stat(path) if path else None
+            except FileNotFoundError:
+                st = None
+            if st is None or (st.st_size, st.st_mtime_ns) != header[:2]:
+                with suppress(FileNotFoundError):
+                    os.remove(cache_path)
+                removed += 1
+        return removed
+
+    def _entry(self, path: str) -> tuple[int, Sequence[int]]:
+        """
+        Возвращает (число строк, смещения каждой STRIDE-й строки) файла.
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            cached = self._memory.get(path)
+            if cached is not None and cached[0] == stamp:
+                self._memory.move_to_end(path)
+                return cached[1:]
+        loaded = self._load(path, stamp)
+        if loaded is None:
+            loaded = self._build(path)
+            self._store(path, stamp, *loaded)
+        with self._lock:
+            old = self._memory.pop(path, None)
+            if old is not None:
+                self._bytes -= _nbytes(old[2])
+            self._memory[path] = (stamp, *loaded)
+            self._bytes += _nbytes(loaded[1])
+            # Индексы вытесняются по суммарному размеру; последний остается всегда
+            while self._bytes > self.max_bytes and len(self._memory) > 1:
+                self._bytes -= _nbytes(self._memory.popitem(last=False)[1][2])
+        return loaded
+
+    def offsets(self, path: str) -> Sequence[int]:
+        """
+        Возвращает смещения начала строк 1, STRIDE + 1, 2 * STRIDE + 1...
+        (array или memoryview над .idx).
+        """
+        return self._entry(path)[1]
+
+    @staticmethod
+    def _advance(mm, offset: int, count: int) -> int:
+        """
+        Смещение строки, которая идет через count строк после строки со смещением offset.
+        """
+        for _ in range(count):
+            offset = mm.find(b"\n", offset) + 1
+        return offset
+
+    def line_range(self, path: str, first: int, count: int) -> tuple[int, int]:
+        """
+        Возвращает байтовый диапазон строк [first, first + count), строки нумеруются с 1.
+        """
+        lines, offsets = self._entry(path)
+        start_line = max(first - 1, 0)
+        end_line = start_line + max(count, 0)
+        with open_map(path) as mm:
+            size = len(mm) if mm is not None else 0
+            if start_line >= lines:
+                return size, size
+            start = self._advance(mm, offsets[start_line // STRIDE], start_line % STRIDE)
+            if end_line >= lines:
+                return start, size
+            # Конец ищем от начала диапазона, если до него ближе, чем от сохраненной строки
+            if end_line - start_line <= end_line % STRIDE:
+                return start, self._advance(mm, start, end_line - start_line)
+            return start, self._advance(mm, offsets[end_line // STRIDE], end_line % STRIDE)
+
+    def line_count(self, path: str) -> int:
+        return self._entry(path)[0]
+
+
+def _nbytes(offsets: Sequence[int]) -> int:
+    return offsets.nbytes if isinstance(offsets, memoryview) else len(offsets) * offsets.itemsize
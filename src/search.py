@@ -0,0 +1,377 @@
+import base64
+import functools
+import json
+import mmap
+import os
+import re
+import stat
+import sys
+import threading
+from array import array
+from typing import NamedTuple
+
+from src import metrics
+from src.pools import process_pool
+
+# Файл считается двоичным, если в начале есть нулевой байт
+BINARY_PROBE = 8192
+# Более крупные файлы не индексируются и всегда просматриваются целиком
+MAX_INDEXED_SIZE = 64 * 1024 * 1024
+# Меньший объем выгоднее просмотреть в текущем потоке, чем запускать процессы
+PARALLEL_THRESHOLD = 8 * 1024 * 1024
+MAX_LINE = 200
+
+
+class Match(NamedTuple):
+    """
+    Найденная строка: путь к файлу, номер строки (с 1) и ее текст.
+    """
+    path: str
+    line: int
+    text: str
+
+
+def is_binary(data) -> bool:
+    return b"\0" in data[:BINARY_PROBE]
+
+
+def case_pattern(needle: bytes) -> re.Pattern:
+    """
+    Регулярное выражение для байтов UTF-8, совпадающее с needle без учета
+    регистра: каждый символ заменяется группой байтовых последовательностей
+    его вариантов (строчного, прописного). Так регистр учитывается и для
+    кириллицы, а файл просматривается через mmap без декодирования.
+    Свертка посимвольная: "ß" и "SS" считаются разными строками.
+    """
+    parts = []
+    for char in needle.decode("utf-8", errors="surrogateescape"):
+        variants = {char, char.lower(), char.upper(), char.lower().upper(), char.upper().lower()}
+        encoded = sorted({variant.encode("utf-8", errors="surrogateescape")
+                          for variant in variants if len(variant) == 1})
+        if len(encoded) == 1:
+            parts.append(re.escape(encoded[0]))
+        else:
+            parts.append(b"(?:" + b"|".join(re.escape(variant) for variant in encoded) + b")")
+    return re.compile(b"".join(parts))
+
+
+def fold_case(data: bytes) -> bytes:
+    """
+    Приводит текст UTF-8 к нижнему регистру (некорректные байты остаются как есть).
+    """
+    return data.decode("utf-8", errors="surrogateescape").lower().encode("utf-8", errors="surrogateescape")
+
+
+def search_file(path: str, needle: bytes, ignore_case: bool = False, limit: int = None) -> list[tuple[int, str]] | None:
+    """
+    Ищет needle в файле через mmap. Возвращает (номер строки, текст строки)
+    для каждой строки с совпадением или None для двоичного файла.
+    ignore_case учитывает регистр любых букв UTF-8, не только латиницы.
+    Выполняется и в рабочих процессах, поэтому возвращает только простые типы.
+    """
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if is_binary(mm):
+                    return None
+                return _search_map(mm, needle, ignore_case, limit)
+    except (FileNotFoundError, PermissionError, IsADirectoryError):
+        return []
+
+
+def _search_map(mm: mmap.mmap, needle: bytes, ignore_case: bool, limit: int | None) -> list[tuple[int, str]]:
+    pattern = case_pattern(needle) if ignore_case else None
+    found = []
+    line = 1
+    counted = 0
+    pos = 0
+    while limit is None or len(found) < limit:
+        if pattern is None:
+            pos = mm.find(needle, pos)
+        else:
+            match = pattern.search(mm, pos)
+            pos = match.start() if match else -1
+        if pos < 0:
+            break
+        start = mm.rfind(b"\n", 0, pos) + 1
+        end = mm.find(b"\n", pos)
+        end = len(mm) if end < 0 else end
+        line += mm[counted:start].count(b"\n")
+        counted = start
+        found.append((line, mm[start:min(end, start + MAX_LINE)].decode("utf-8", errors="replace").rstrip("\r")))
+        # Каждая строка выводится один раз
+        pos = end + 1
+    return found
+
+
+def file_trigrams(path: str) -> tuple[str, list[int]]:
+    """
+    Возвращает вид файла (text, binary или large) и отсортированный список
+    его триграмм (три байта текста в нижнем регистре, см. fold_case,
+    упакованные в число).
+    """
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > MAX_INDEXED_SIZE:
+                return "large", []
+            data = f.read()
+    except (FileNotFoundError, PermissionError, IsADirectoryError):
+        return "binary", []
+    if is_binary(data):
+        return "binary", []
+    return "text", sorted(_trigrams(fold_case(data)))
+
+
+def _trigrams(data: bytes) -> set[int]:
+    return {(a << 16) | (b << 8) | c for a, b, c in set(zip(data, data[1:], data[2:]))}
+
+
+def _pack(grams: list[int]) -> str:
+    packed = array("I", grams)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode("ascii")
+
+
+def _unpack(text: str) -> array:
+    grams = array("I")
+    grams.frombytes(base64.b64decode(text))
+    if sys.byteorder == "big":
+        grams.byteswap()
+    return grams
+
+
+def _parallel(total: int) -> bool:
+    # На одном ядре процессы только добавляют накладные расходы
+    return total >= PARALLEL_THRESHOLD and (os.cpu_count() or 1) > 1
+
+
+class TrigramIndex:
+    """
+    Персистентный триграммный индекс файлов рабочей директории.
+
+    Для каждого файла хранятся размер, mtime и множество триграмм содержимого.
+    Поиск берет только файлы, содержащие все триграммы искомой строки, и
+    проверяет их. refresh сверяет индекс с диском по размеру и mtime и
+    переиндексирует только изменившиеся файлы (параллельно в процессах);
+    операции менеджера сообщают об изменениях через update/remove.
+
+    Индекс избавляет от чтения файлов без совпадений, но не от обхода:
+    перед каждым поиском refresh делает stat всех файлов папки поиска,
+    поэтому время ответа растет с числом файлов в ней.
+    """
+
+    VERSION = 3
+
+    def __init__(self, root: str, index_path: str, ignore: set[str] = frozenset()):
+        self.root = os.path.abspath(root)
+        self.index_path = index_path
+        self.ignore = set(ignore)
+        # rel -> [size, mtime_ns, вид, триграммы]
+        self._files: dict[str, list] = {}
+        self._postings: dict[int, set[str]] = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION and data.get("root") == self.root:
+                for rel, (size, mtime, kind, grams) in data["files"].items():
+                    self._add(rel, [size, mtime, kind, _unpack(grams)])
+                self._dirty = False
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            self._files.clear()
+            self._postings.clear()
+
+    def _add(self, rel: str, entry: list) -> None:
+        self._remove(rel)
+        self._files[rel] = entry
+        for gram in entry[3]:
+            self._postings.setdefault(gram, set()).add(rel)
+        self._dirty = True
+
+    def _remove(self, rel: str) -> None:
+        entry = self._files.pop(rel, None)
+        if entry is None:
+            return
+        for gram in entry[3]:
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(rel)
+                if not postings:
+                    del self._postings[gram]
+        self._dirty = True
+
+    def _prefix(self, folder: str | None) -> str | None:
+        """
+        Префикс путей файлов папки folder в индексе (None — весь индекс).
+        """
+        if folder is None or os.path.abspath(folder) == self.root:
+            return None
+        return os.path.join(os.path.relpath(os.path.abspath(folder), self.root), "")
+
+    def _scan(self, folder: str = None) -> dict[str, tuple[int, int]]:
+        """
+        Возвращает (размер, mtime) всех обычных файлов папки folder (по умолчанию корня).
+        """
+        skip = len(os.path.join(self.root, ""))
+        return {path[skip:]: (st.st_size, st.st_mtime_ns)
+                for path, st in iter_files(folder or self.root, self.ignore)}
+
+    def refresh(self, workers: int = None, folder: str = None) -> int:
+        """
+        Сверяет с диском файлы папки folder (по умолчанию всего индекса).
+        Возвращает число переиндексированных файлов.
+        """
+        with self._lock:
+            current = self._scan(folder)
+            prefix = self._prefix(folder)
+            for rel in [rel for rel in self._files if prefix is None or rel.startswith(prefix)]:
+                if rel not in current:
+                    self._remove(rel)
+            changed = [rel for rel, stamp in current.items()
+                       if rel not in self._files or tuple(self._files[rel][:2]) != stamp]
+            paths = [os.path.join(self.root, rel) for rel in changed]
+            with metrics.phase("read"):
+                if not _parallel(sum(current[rel][0] for rel in changed)):
+                    results = map(file_trigrams, paths)
+                    self._store(changed, current, results)
+                else:
+                    with process_pool(workers) as pool:
+                        self._store(changed, current, pool.map(file_trigrams, paths, chunksize=16))
+            return len(changed)
+
+    def _store(self, changed: list[str], stamps: dict, results) -> None:
+        for rel, (kind, grams) in zip(changed, results):
+            self._add(rel, [*stamps[rel], kind, grams])
+
+    def update(self, path: str) -> None:
+        """
+        Переиндексирует один файл (после создания или записи).
+        """
+        with self._lock:
+            rel = os.path.relpath(os.path.abspath(path), self.root)
+            try:
+                st = os.stat(path, follow_symlinks=False)
+            except FileNotFoundError:
+                self._remove(rel)
+                return
+            if not stat.S_ISREG(st.st_mode):
+                return
+            kind, grams = file_trigrams(path)
+            self._add(rel, [st.st_size, st.st_mtime_ns, kind, grams])
+
+    def remove(self, path: str) -> None:
+        with self._lock:
+            self._remove(os.path.relpath(os.path.abspath(path), self.root))
+
+    def candidates(self, needle: bytes, folder: str = None) -> list[tuple[str, int]]:
+        """
+        Возвращает (путь, размер) файлов, которые могут содержать needle.
+        Двоичные файлы отбрасываются, крупные неиндексированные возвращаются всегда.
+        """
+        with self._lock:
+            grams = _trigrams(fold_case(needle))
+            if grams:
+                sets = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+                found = set.intersection(*sets)
+            else:
+                found = {rel for rel, entry in self._files.items() if entry[2] == "text"}
+            found |= {rel for rel, entry in self._files.items() if entry[2] == "large"}
+            prefix = self._prefix(folder)
+            return [(os.path.join(self.root, rel), self._files[rel][0]) for rel in found
+                    if prefix is None or rel.startswith(prefix)]
+
+    @property
+    def size(self) -> int:
+        return len(self._files)
+
+    def save(self) -> None:
+        """
+        Атомарно сохраняет индекс на диск, если он изменялся.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            # Триграммы хранятся упакованными (base64 от массива uint32): так индекс грузится быстрее
+            files = {rel: [size, mtime, kind, _pack(grams)] for rel, (size, mtime, kind, grams) in self._files.items()}
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "root": self.root, "files": files}, f)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+
+    def drop(self) -> None:
+        """
+        Удаляет индекс с диска и из памяти.
+        """
+        with self._lock:
+            self._files.clear()
+            self._postings.clear()
+            self._dirty = False
+            try:
+                os.remove(self.index_path)
+            except FileNotFoundError:
+                pass
+
+
+def iter_files(root: str, ignore: set[str] = frozenset()):
+    """
+    Отдает (путь, stat) обычных файлов под root; ссылки не учитываются.
+    """
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        with it:
+            for entry in metrics.timed(it, "walk"):
+                if entry.name in ignore:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    with metrics.phase("stat"):
+                        st = entry.stat(follow_symlinks=False)
+                    if stat.S_ISREG(st.st_mode):
+                        yield entry.path, st
+
+
+def search_files(paths: list[tuple[str, int]], needle: bytes, ignore_case: bool = False, limit: int = None,
+                 workers: int = None) -> list[Match]:
+    """
+    Ищет needle в файлах paths (пары путь, размер). Небольшой объем
+    просматривается в текущем потоке, крупный — параллельно в процессах.
+    Возвращает совпадения в порядке путей (не больше limit).
+    """
+    paths = sorted(paths)
+    total = sum(size for _, size in paths)
+    metrics.count(files=len(paths), bytes=total)
+    search = functools.partial(search_file, needle=needle, ignore_case=ignore_case, limit=limit)
+    names = [path for path, _ in paths]
+    with metrics.phase("read"):
+        if not _parallel(total) or len(paths) < 2:
+            results = map(search, names)
+            return _collect(names, results, limit)
+        pool = process_pool(workers)
+        try:
+            return _collect(names, pool.map(search, names, chunksize=8), limit)
+        finally:
+            # После limit совпадений оставшиеся файлы не просматриваем
+            pool.shutdown(cancel_futures=True)
+
+
+def _collect(names: list[str], results, limit: int | None) -> list[Match]:
+    matches = []
+    for path, found in zip(names, results):
+        if found is None:
+            continue
+        matches.extend(Match(path, line, text) for line, text in found)
+        if limit is not None and len(matches) >= limit:
+            return matches[:limit]
+    return matches
@@ -0,0 +1,382 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import stat
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+
+from src import metrics
+from src.copy_engine import copy_file
+from src.dupes import full_hash
+from src.errors import OperationCancelledError
+from src.paths import O_NOFOLLOW, PathResolver, beneath
+
+# Файлы от этого размера при изменении обновляются поблочно
+DELTA_THRESHOLD = 4 * 1024 * 1024
+BLOCK_SIZE = 64 * 1024
+# Сколько байт подряд без совпадения проверять со сдвигом на один байт,
+# дальше окно двигается целыми блоками (ограничивает работу на сильно измененных файлах)
+ROLL_LIMIT = 16 * BLOCK_SIZE
+_ADLER_MOD = 65521
+
+
+class SyncStats:
+    """
+    Итоги синхронизации: сколько файлов скопировано, обновлено поблочно,
+    обновлено только по метаданным, пропущено и удалено; объем переданных данных.
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.copied = 0
+        self.patched = 0
+        self.touched = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, count: int = 0) -> None:
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+            self.bytes += count
+
+    def __str__(self) -> str:
+        mb = 1024 * 1024
+        deleted = f", удалено {self.deleted}" if self.deleted else ""
+        return (f"{self.files} файлов: скопировано {self.copied}, обновлено поблочно {self.patched}, "
+                f"метаданные {self.touched}, без изменений {self.unchanged}{deleted}; "
+                f"передано {self.bytes / mb:.1f} МБ за {self.seconds:.2f} с")
+
+
+class SyncManifest:
+    """
+    Состояние прошлой синхронизации пары папок: для каждого файла размер,
+    mtime и хэш источника, а также размер и mtime копии. Файлы, у которых
+    обе стороны не изменились, при следующем запуске не читаются.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, source: str, dest: str):
+        self.path = path
+        self.source = source
+        self.dest = dest
+        # rel -> [размер, mtime_ns, хэш, размер копии, mtime_ns копии]
+        self._entries: dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION and (data.get("source"), data.get("dest")) == (source, dest):
+                self._entries = data["files"]
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+    def get(self, rel: str) -> list | None:
+        return self._entries.get(rel)
+
+    def put(self, rel: str, src_st: os.stat_result, digest: str, dst_st: os.stat_result) -> None:
+        with self._lock:
+            self._entries[rel] = [src_st.st_size, src_st.st_mtime_ns, digest, dst_st.st_size, dst_st.st_mtime_ns]
+            self._dirty = True
+
+    def keep(self, alive: set[str]) -> None:
+        """
+        Удаляет записи файлов, которых больше нет в источнике.
+        """
+        with self._lock:
+            for rel in set(self._entries) - alive:
+                del self._entries[rel]
+                self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.VERSION, "source": self.source, "dest": self.dest,
+                           "files": self._entries}, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+
+def walk_tree(root: str, ignore: set[str] = frozenset()) -> dict[str, tuple[str, object]]:
+    """
+    Возвращает содержимое папки: rel -> (вид, данные), где вид — d (папка),
+    f (обычный файл, данные — stat) или l (ссылка, данные — ее цель).
+    """
+    tree = {}
+    stack = [("", root)]
+    while stack:
+        prefix, directory = stack.pop()
+        try:
+            it = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with it:
+            for entry in metrics.timed(it, "walk"):
+                if entry.name in ignore:
+                    continue
+                rel = prefix + entry.name
+                if entry.is_symlink():
+                    tree[rel] = ("l", os.readlink(entry.path))
+                elif entry.is_dir(follow_symlinks=False):
+                    tree[rel] = ("d", None)
+                    stack.append((rel + os.sep, entry.path))
+                else:
+                    with metrics.phase("stat"):
+                        st = entry.stat(follow_symlinks=False)
+                    if stat.S_ISREG(st.st_mode):
+                        tree[rel] = ("f", st)
+    return tree
+
+
+def rolling_checksum(data: bytes) -> int:
+    """
+    Слабая контрольная сумма блока (Adler-32). Ее можно сдвинуть на байт
+    за O(1), см. roll.
+    """
+    return zlib.adler32(data)
+
+
+def roll(checksum: int, out_byte: int, in_byte: int, size: int) -> int:
+    """
+    Сдвигает контрольную сумму окна длины size на один байт:
+    out_byte уходит из начала окна, in_byte добавляется в конец.
+    """
+    a = (checksum & 0xFFFF) - out_byte + in_byte
+    a %= _ADLER_MOD
+    b = ((checksum >> 16) - size * out_byte + a - 1) % _ADLER_MOD
+    return (b << 16) | a
+
+
+def _strong(data) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def block_signatures(path: str, block: int = BLOCK_SIZE) -> dict[int, list[tuple[int, bytes]]]:
+    """
+    Подписи полных блоков файла: слабая сумма -> [(смещение, сильный хэш)].
+    """
+    signatures = {}
+    with open(path, "rb") as f:
+        offset = 0
+        while len(data := f.read(block)) == block:
+            signatures.setdefault(rolling_checksum(data), []).append((offset, _strong(data)))
+            offset += block
+    return signatures
+
+
+def compute_delta(path: str, signatures: dict[int, list[tuple[int, bytes]]],
+                  block: int = BLOCK_SIZE) -> list[tuple[str, int, int]]:
+    """
+    Сравнивает файл path с подписями старой версии и возвращает инструкции
+    сборки новой: ("copy", смещение в старом файле, длина) — блок уже есть,
+    ("data", смещение в path, длина) — данные нужно записать.
+    Совпадения ищутся в любом месте файла скользящим окном, поэтому
+    вставки и удаления сдвигают блоки, но не делают их различающимися.
+    """
+    ops = []
+
+    def emit(kind: str, offset: int, length: int) -> None:
+        if length <= 0:
+            return
+        if ops and ops[-1][0] == kind and ops[-1][1] + ops[-1][2] == offset:
+            ops[-1] = (kind, ops[-1][1], ops[-1][2] + length)
+        else:
+            ops.append((kind, offset, length))
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ops
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = literal = rolled = 0
+            checksum = None
+            while pos + block <= size:
+                if checksum is None:
+                    checksum = rolling_checksum(mm[pos:pos + block])
+                candidates = signatures.get(checksum)
+                if candidates:
+                    strong = _strong(mm[pos:pos + block])
+                    matched = [offset for offset, digest in candidates if digest == strong]
+                    if matched:
+                        emit("data", literal, pos - literal)
+                        # Блок на том же месте позволяет не переписывать его вовсе
+                        emit("copy", pos if pos in matched else matched[0], block)
+                        pos += block
+                        literal = pos
+                        checksum = None
+                        # Лимит сдвигов считается заново после каждого совпадения
+                        rolled = 0
+                        continue
+                if rolled < ROLL_LIMIT and pos + block < size:
+                    checksum = roll(checksum, mm[pos], mm[pos + block], block)
+                    pos += 1
+                    rolled += 1
+                else:
+                    pos += block
+                    checksum = None
+            emit("data", literal, size - literal)
+    return ops
+
+
+def apply_delta(src_path: str, dst_path: str, ops: list[tuple[str, int, int]],
+                resolver: PathResolver = None) -> int:
+    """
+    Приводит dst_path к содержимому src_path по инструкциям compute_delta.
+    Новая версия собирается во временном файле рядом (совпавшие блоки
+    берутся из старой) и атомарно заменяет старую, как в rsync: жесткие
+    ссылки на старый файл не меняются, а прерванная запись его не портит.
+    Возвращает число записанных байт из src_path.
+    Файлы открываются через resolver (по умолчанию с корнем в папке dst_path).
+    """
+    written = 0
+    with beneath(os.path.dirname(dst_path), resolver) as resolver, \
+            resolver.open_target(dst_path, follow=False) as target:
+        tmp_name = os.path.join(os.path.dirname(target.name), f".{os.path.basename(target.name)}.sync")
+
+        def opener(name: str, flags: int) -> int:
+            return os.open(name, flags | O_NOFOLLOW, 0o666, dir_fd=target.dir_fd)
+
+        try:
+            with open(src_path, "rb") as src, open(target.name, "rb", opener=opener) as old, \
+                    open(tmp_name, "wb", opener=opener) as new:
+                for kind, offset, length in ops:
+                    source = old if kind == "copy" else src
+                    with metrics.phase("write"):
+                        new.write(os.pread(source.fileno(), length, offset))
+                    if kind == "data":
+                        written += length
+            os.replace(tmp_name, target.name, src_dir_fd=target.dir_fd, dst_dir_fd=target.dir_fd)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.unlink(tmp_name, dir_fd=target.dir_fd)
+            raise
+    return written
+
+
+def _remove(resolver: PathResolver, path: str, kind: str) -> None:
+    """
+    Удаляет файл, ссылку или папку dest через resolver, не проходя по ссылкам.
+    """
+    with resolver.open_target(path, follow=False) as target:
+        if kind != "d":
+            os.unlink(target.name, dir_fd=target.dir_fd)
+        elif target.dir_fd is not None and sys.version_info >= (3, 11):
+            shutil.rmtree(target.name, dir_fd=target.dir_fd)
+        else:
+            shutil.rmtree(target.path)
+
+
+def sync_trees(source: str, dest: str, manifest: SyncManifest, delete: bool = False, workers: int = None,
+               ignore: set[str] = frozenset(), should_stop: callable = None,
+               resolver: PathResolver = None) -> SyncStats:
+    """
+    Делает dest копией source. Копируются только новые и изменившиеся файлы
+    (по манифесту прошлого запуска), крупные измененные файлы обновляются
+    поблочно, файлы обрабатываются в пуле из workers потоков.
+    delete — удалить из dest то, чего нет в source.
+    should_stop() проверяется перед каждым файлом.
+    Папки, ссылки и файлы копии создаются через resolver (по умолчанию
+    с корнем dest), поэтому ссылки не уводят запись за его пределы.
+    """
+    os.makedirs(dest, exist_ok=True)
+    dest = os.path.realpath(dest)
+    with beneath(dest, resolver) as resolver:
+        return _sync_trees(source, dest, manifest, delete, workers, ignore, should_stop, resolver)
+
+
+def _sync_trees(source: str, dest: str, manifest: SyncManifest, delete: bool, workers: int | None,
+                ignore: set[str], should_stop: callable, resolver: PathResolver) -> SyncStats:
+    started = time.perf_counter()
+    stats = SyncStats()
+    src_tree = walk_tree(source, ignore)
+    dst_tree = walk_tree(dest, ignore)
+
+    # Сначала убираем с пути то, что в копии другого вида
+    for rel, (kind, _) in sorted(dst_tree.items()):
+        src_kind = src_tree.get(rel, (None,))[0]
+        if src_kind is not None and src_kind != kind and os.path.lexists(os.path.join(dest, rel)):
+            _remove(resolver, os.path.join(dest, rel), kind)
+            dst_tree = {key: value for key, value in dst_tree.items()
+                        if key != rel and not key.startswith(rel + os.sep)}
+    for rel, (kind, target) in sorted(src_tree.items()):
+        dst_path = os.path.join(dest, rel)
+        if kind == "d":
+            resolver.makedirs(dst_path)
+        elif kind == "l" and dst_tree.get(rel) != ("l", target):
+            with resolver.open_target(dst_path, follow=False) as link:
+                if rel in dst_tree:
+                    os.unlink(link.name, dir_fd=link.dir_fd)
+                os.symlink(target, link.name, dir_fd=link.dir_fd)
+
+    files = {rel: st for rel, (kind, st) in src_tree.items() if kind == "f"}
+    stats.files = len(files)
+    todo = []
+    for rel, src_st in files.items():
+        entry = manifest.get(rel)
+        dst_kind, dst_st = dst_tree.get(rel, (None, None))
+        if (entry is not None and dst_kind == "f"
+                and entry[:2] == [src_st.st_size, src_st.st_mtime_ns]
+                and entry[3:] == [dst_st.st_size, dst_st.st_mtime_ns]):
+            stats.add("unchanged")
+        else:
+            todo.append((rel, src_st, entry, dst_st if dst_kind == "f" else None))
+
+    def task(rel: str, src_st: os.stat_result, entry: list | None, dst_st: os.stat_result | None) -> None:
+        if should_stop is not None and should_stop():
+            raise OperationCancelledError("Операция отменена")
+        src_path, dst_path = os.path.join(source, rel), os.path.join(dest, rel)
+        with metrics.phase("read"):
+            digest = full_hash(src_path)
+        copy_unchanged = (entry is not None and dst_st is not None
+                          and entry[3:] == [dst_st.st_size, dst_st.st_mtime_ns])
+        if copy_unchanged and entry[2] == digest:
+            # Источник изменился только по mtime
+            kind, count = "touched", 0
+        elif dst_st is not None and src_st.st_size >= DELTA_THRESHOLD:
+            with metrics.phase("read"):
+                ops = compute_delta(src_path, block_signatures(dst_path, BLOCK_SIZE), BLOCK_SIZE)
+            kind, count = "patched", apply_delta(src_path, dst_path, ops, resolver)
+        else:
+            copy_file(src_path, dst_path, opener=resolver.opener)
+            kind, count = "copied", src_st.st_size
+        shutil.copystat(src_path, dst_path)
+        manifest.put(rel, src_st, digest, os.stat(dst_path))
+        stats.add(kind, count)
+
+    task = metrics.bind(task)
+    try:
+        with ThreadPoolExecutor(workers) as pool:
+            futures = [pool.submit(task, *item) for item in todo]
+            errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            raise errors[0]
+        if delete:
+            removed = set()
+            # Родительская папка в отсортированном списке идет раньше своего содержимого
+            for rel, (kind, _) in sorted(dst_tree.items()):
+                if os.path.dirname(rel) in removed:
+                    removed.add(rel)
+                elif rel not in src_tree:
+                    _remove(resolver, os.path.join(dest, rel), kind)
+                    removed.add(rel)
+                    stats.add("deleted")
+    finally:
+        manifest.keep(set(files))
+        manifest.save()
+    metrics.count(files=len(todo), bytes=stats.bytes)
+    stats.seconds = time.perf_counter() - started
+    return stats
@@ -0,0 +1,206 @@
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+
+# Дерево делится на поддеревья до этой глубины, чтобы удалять их параллельно
+SPLIT_DEPTH = 3
+
+# Корзины по папкам: одна на рабочую директорию, сколько бы Operations ее ни использовали
+_shared: dict[str, "Trash"] = {}
+_shared_lock = threading.Lock()
+
+
+class Trash:
+    """
+    Двухфазное удаление папок.
+
+    Сначала папка атомарно переименовывается в скрытую папку корзины внутри
+    рабочей директории и сразу исчезает из дерева. Затем фоновый поток
+    делит ее на поддеревья и удаляет их параллельно в пуле рабочих потоков.
+    Потоки запускаются при первом удалении и останавливаются в shutdown;
+    если программа завершится раньше, остатки удалятся при следующем
+    запуске (recover).
+
+    Корзина одна на папку корзины: ее получают через acquire и отпускают
+    через release, последний release останавливает потоки.
+    """
+
+    def __init__(self, trash_dir: str, workers: int = 4):
+        self.trash_dir = trash_dir
+        self.workers = workers
+        self._items: queue.Queue = queue.Queue()
+        self._subtrees: queue.Queue = queue.Queue()
+        self._pending: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+        self._closing = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._users = 0
+
+    @classmethod
+    def acquire(cls, trash_dir: str, workers: int = 4) -> "Trash":
+        """
+        Возвращает корзину папки trash_dir, общую для всех ее пользователей,
+        и ставит в очередь то, что осталось в корзине. Каждому acquire
+        соответствует один release.
+        """
+        trash_dir = os.path.abspath(trash_dir)
+        with _shared_lock:
+            trash = _shared.get(trash_dir)
+            if trash is None:
+                trash = _shared[trash_dir] = cls(trash_dir, workers)
+            trash._users += 1
+        trash.recover()
+        return trash
+
+    def release(self, timeout: float = None) -> None:
+        """
+        Отпускает корзину; после последнего release останавливает ее потоки.
+        """
+        with _shared_lock:
+            self._users -= 1
+            if self._users > 0:
+                return
+            if _shared.get(self.trash_dir) is self:
+                del _shared[self.trash_dir]
+        self.shutdown(timeout)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._threads or self._closing.is_set():
+                return
+            self._threads.append(threading.Thread(target=self._coordinator, name="trash", daemon=True))
+            self._threads.extend(threading.Thread(target=self._worker, name=f"trash-{i}", daemon=True)
+                                 for i in range(self.workers))
+        for thread in self._threads:
+            thread.start()
+
+    def shutdown(self, timeout: float = None) -> None:
+        """
+        Останавливает потоки: удаление, которое уже идет, прерывается между
+        поддеревьями, очередь не дочищается (ее подберет recover при следующем
+        запуске). Ждет завершения потоков не дольше timeout.
+        """
+        with self._lock:
+            if self._closing.is_set():
+                return
+            self._closing.set()
+            threads = list(self._threads)
+        if not threads:
+            return
+        self._items.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    def discard(self, path: str, label: str = None) -> str:
+        """
+        Переносит папку в корзину (атомарный rename) и ставит ее в очередь на удаление.
+        Возвращает путь внутри корзины.
+        """
+        os.makedirs(self.trash_dir, exist_ok=True)
+        target = os.path.join(self.trash_dir, f"{uuid.uuid4().hex[:12]}-{os.path.basename(path)}")
+        os.rename(path, target)
+        self._schedule(target, label or path)
+        return target
+
+    def _schedule(self, target: str, label: str) -> bool:
+        """
+        Ставит target в очередь на удаление. Возвращает False, если он уже в очереди.
+        """
+        with self._lock:
+            if target in self._pending:
+                return False
+            self._pending[target] = {"label": label, "since": time.time(), "state": "ожидает"}
+            self._idle.clear()
+        self._start()
+        self._items.put(target)
+        return True
+
+    def recover(self) -> int:
+        """
+        Ставит в очередь все, что осталось в корзине после прошлого запуска.
+        Уже стоящее в очереди повторно не добавляется. Возвращает число новых элементов.
+        """
+        try:
+            names = os.listdir(self.trash_dir)
+        except FileNotFoundError:
+            return 0
+        return sum(self._schedule(os.path.join(self.trash_dir, name), name.partition("-")[2] or name)
+                   for name in names)
+
+    def status(self) -> list[dict]:
+        """
+        Возвращает ожидающие удаления: label, since (время постановки), state.
+        """
+        with self._lock:
+            return [dict(item) for item in self._pending.values()]
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Ждет, пока корзина опустеет. Возвращает False, если истек timeout.
+        """
+        return self._idle.wait(timeout)
+
+    def _coordinator(self) -> None:
+        while True:
+            target = self._items.get()
+            if target is None:
+                for _ in range(self.workers):
+                    self._subtrees.put(None)
+                return
+            if self._closing.is_set():
+                continue
+            with self._lock:
+                self._pending[target]["state"] = "удаляется"
+            try:
+                self._purge(target)
+            except OSError:
+                pass
+            with self._lock:
+                self._pending.pop(target, None)
+                if not self._pending:
+                    self._idle.set()
+
+    def _worker(self) -> None:
+        while True:
+            path = self._subtrees.get()
+            try:
+                if path is None:
+                    return
+                if not self._closing.is_set():
+                    shutil.rmtree(path, ignore_errors=True)
+            finally:
+                self._subtrees.task_done()
+
+    def _purge(self, target: str) -> None:
+        """
+        Удаляет target: верхние уровни обходятся здесь, поддеревья под ними
+        раздаются рабочим потокам, затем удаляются оставшиеся пустые папки.
+        """
+        if not os.path.isdir(target) or os.path.islink(target):
+            os.remove(target)
+            return
+        skeleton = []
+        frontier = [target]
+        for _ in range(SPLIT_DEPTH):
+            if len(frontier) >= self.workers * 4:
+                break
+            next_frontier = []
+            for directory in frontier:
+                skeleton.append(directory)
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            next_frontier.append(entry.path)
+                        else:
+                            os.unlink(entry.path)
+            frontier = next_frontier
+        for directory in frontier:
+            self._subtrees.put(directory)
+        self._subtrees.join()
+        for directory in reversed(skeleton):
+            os.rmdir(directory)
@@ -0,0 +1,30 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.run import compare, run_suite
+from benchmarks.treegen import TreeSpec, generate_tree
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_tree_is_deterministic(self):
+        spec = TreeSpec(depth=2, fanout=2, files_per_dir=3, mean_size=512)
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            self.assertEqual(generate_tree(first, spec), generate_tree(second, spec))
+            for dirpath, _, files in os.walk(first):
+                for name in files:
+                    path = os.path.join(dirpath, name)
+                    with open(path, "rb") as f_first, \
+                            open(os.path.join(second, os.path.relpath(path, first)), "rb") as f_second:
+                        self.assertEqual(f_first.read(), f_second.read())
+
+    def test_run_and_compare(self):
+        report = run_suite(["tiny"], repeat=1, only=["list_files", "copy_file_tree"])
+        self.assertEqual({r["name"] for r in report["results"]}, {"list_files", "copy_file_tree"})
+        slower = {"results": [dict(r, min=r["min"] * 2) for r in report["results"]]}
+        self.assertEqual(len(compare(report, slower, threshold=0.5)), 2)
+        self.assertEqual(compare(report, report), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from src.batch import BatchRunner
+from src.client import DaemonClient, main as client_main
+from src.copy_engine import copy_file
+from src.interaction import FileManager
+from src.metrics import Metrics
+
+
+class TestBatchMode(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.manager = FileManager(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_batch(self, text):
+        out = io.StringIO()
+        ok = BatchRunner(self.manager, out, workers=4).run(text.splitlines())
+        return ok, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_results_in_order_without_prompts(self):
+        ok, results = self.run_batch(
+            "mkdir a\nmkdir b\nmkdir c/b\ntouch a/f\nwrite a/f hello\n# comment\n"
+            "cp a/f b\ncat b/f\nnav in a\nlist\n")
+        self.assertTrue(ok)
+        self.assertEqual([r["line"] for r in results], [1, 2, 3, 4, 5, 7, 8, 9, 10])
+        # Из двух папок b выбрана ближайшая к текущему пути
+        self.assertTrue(os.path.isfile(os.path.join(self.manager.working_dir, "b", "f")))
+        self.assertTrue(results[6]["output"].endswith("hello"))
+        self.assertEqual(results[8]["output"], "f")
+
+    def test_failures_are_reported(self):
+        ok, results = self.run_batch("rm missing.txt\nbogus\ntouch ok.txt\n")
+        self.assertFalse(ok)
+        self.assertEqual([r["ok"] for r in results], [False, False, True])
+
+    def test_independent_commands_run_together(self):
+        commands = "".join(f"touch f{i}\n" for i in range(50))
+        ok, results = self.run_batch(commands)
+        self.assertTrue(ok)
+        self.assertEqual(len(os.listdir(self.manager.working_dir)), 50)
+
+    def test_pool_output_goes_to_its_command(self):
+        def noisy_copy(src, dst, *args):
+            print(f"copy {os.path.basename(src)}")
+            return copy_file(src, dst, *args)
+
+        commands = "mkdir d0\nmkdir d1\n" + "".join(f"touch d{i}/f{j}\n" for i in range(2) for j in range(5))
+        commands += "mkdir t0\nmkdir t1\ncp d0 t0\ncp d1 t1\n"
+        out = io.StringIO()
+        with mock.patch("src.copy_engine.copy_file", noisy_copy), redirect_stdout(out):
+            ok, results = self.run_batch(commands)
+        self.assertTrue(ok)
+        self.assertEqual(out.getvalue(), "")
+        for result in results[-2:]:
+            self.assertEqual(sorted(line for line in result["output"].splitlines() if line.startswith("copy")),
+                             [f"copy f{j}" for j in range(5)])
+
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.trace = os.path.join(self.tmp, "trace.jsonl")
+        self.manager = FileManager(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"),
+                                   Metrics(self.trace))
+        self.manager.dest_policy = "first"
+
+    def tearDown(self):
+        self.manager.close()
+        shutil.rmtree(self.tmp)
+
+    def run_commands(self, *lines):
+        with redirect_stdout(io.StringIO()) as out:
+            for line in lines:
+                self.manager.execute(line.split())
+        return out.getvalue()
+
+    def test_commands_are_measured(self):
+        self.run_commands("mkdir src", "mkdir dst", "write src/f hello", "cp src/f dst", "cat missing")
+        summary = self.manager.metrics.summary
+        self.assertEqual(summary["mkdir"]["count"], 2)
+        self.assertEqual(summary["cp"]["files"], 1)
+        self.assertEqual(summary["cp"]["bytes"], 6)
+        self.assertIn("write", summary["cp"]["phases"])
+        self.assertEqual(summary["cat"]["errors"], 1)
+        self.assertIn("cp", self.run_commands("stats"))
+
+        self.manager.close()
+        with open(self.trace, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([r["command"] for r in records], ["mkdir", "mkdir", "write", "cp", "cat", "stats"])
+        self.assertFalse(records[4]["ok"])
+
+    def test_chrome_trace_and_profile(self):
+        trace = os.path.join(self.tmp, "trace.json")
+        self.manager.metrics = Metrics(trace, {"list"}, profile_dir=os.path.join(self.tmp, "profiles"))
+        self.run_commands("mkdir a", "list depth=0")
+        self.manager.close()
+        with open(trace, encoding="utf-8") as f:
+            events = json.loads(f.read().rstrip().rstrip(",") + "]")
+        self.assertEqual([e["name"] for e in events], ["mkdir", "list"])
+        self.assertEqual(events[1]["ph"], "X")
+        self.assertEqual([name.split("-")[0] for name in os.listdir(os.path.join(self.tmp, "profiles"))], ["list"])
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "нужны Unix-сокеты")
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        from src.daemon import DaemonServer
+
+        self.tmp = tempfile.mkdtemp()
+        self.manager = FileManager(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+        self.socket_path = os.path.join(self.tmp, "fm.sock")
+        self.server = DaemonServer(self.manager, self.socket_path)
+        self.thread = threading.Thread(target=self.server.serve)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        shutil.rmtree(self.tmp)
+
+    def test_sessions_keep_own_folder(self):
+        with DaemonClient(self.socket_path) as first, DaemonClient(self.socket_path) as second:
+            self.assertTrue(first.execute("mkdir a")["ok"])
+            self.assertTrue(second.execute("mkdir b")["ok"])
+            self.assertEqual(first.execute("nav in a")["cwd"], "a")
+            self.assertTrue(first.execute("touch inside")["ok"])
+            self.assertEqual(second.execute("list sort=name")["output"].splitlines(), ["a/", "b/"])
+            self.assertEqual(first.execute("list")["output"], "inside")
+            result = second.execute("rm missing")
+            self.assertFalse(result["ok"])
+            self.assertIn("missing", result["output"])
+
+    def test_parallel_clients(self):
+        def work(i):
+            with DaemonClient(self.socket_path) as client:
+                for j in range(10):
+                    client.execute(f"write f{i} line{j}")
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for i in range(8):
+            with open(os.path.join(self.manager.working_dir, f"f{i}")) as f:
+                self.assertEqual(len(f.readlines()), 10)
+
+    def test_client_command_and_stop(self):
+        self.assertEqual(client_main(["--socket", self.socket_path, "touch", "x"]), 0)
+        self.assertEqual(client_main(["--socket", self.socket_path, "rm", "nope"]), 1)
+        self.assertEqual(client_main(["--socket", self.socket_path, "--stop"]), 0)
+        self.thread.join(5)
+        self.assertFalse(os.path.exists(self.socket_path))
+        self.assertEqual(client_main(["--socket", self.socket_path, "list"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,22 @@
+import asyncio
+import errno
+import io
 import unittest
 import os
 import shutil
+import tempfile
+import time
+import zipfile
+from unittest import mock
+from contextlib import redirect_stdout
+from src.archive import RAW_WRITE_VERSIONS, create_zip, extract_zip
+from src.async_api import AsyncOperations
+from src.dupes import edge_hash
+from src.errors import (AmbiguousDestinationError, FileSystemError, InvalidArgumentError, NotFoundError,
+                        OperationCancelledError, OperationTimeoutError, PathEscapeError)
 from src.operations import Operations
+from src.reader import STRIDE, LineIndex
+from src.sync import block_signatures, compute_delta, roll, rolling_checksum
 
 class TestOperations(unittest.TestCase):
     def setUp(self):
@@ -19,24 +34,834 @@ class TestOperations(unittest.TestCase):
 
     def test_validate_path(self):
         valid_path = os.path.join(self.ops.working_dir, "test_folder")
-        result = self.ops._validate_path(valid_path)
+        result = self.ops.validate_path(valid_path)
         self.assertEqual(result, os.path.abspath(valid_path))
 
         # Проверка недопустимого пути (выход за пределы рабочей директории)
         invalid_path = os.path.abspath(os.path.join(self.ops.working_dir, "../hack"))
         with self.assertRaises(PermissionError):
-            self.ops._validate_path(invalid_path)
+            self.ops.validate_path(invalid_path)
 
     def test_get_relative_path(self):
         abs_path = os.path.join(self.ops.working_dir, "test_folder")
-        rel_path = self.ops._get_relative_path(abs_path)
+        rel_path = self.ops.get_relative_path(abs_path)
         self.assertEqual(rel_path, "test_folder")
 
     def test_navigation_safety(self):
         # Попытка выйти за пределы рабочей директории
         with self.assertRaises(PermissionError):
+            self.ops.change_directory("../")
+        # Команда сообщает об ошибке и остается в рабочей директории
+        with redirect_stdout(io.StringIO()) as out:
             self.ops.navigate("in", "../")
+        self.assertIn("запрещен", out.getvalue())
+        self.assertEqual(self.ops.current_path, self.ops.working_dir)
                         
 
+class TestPaths(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.ops = Operations(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+        self.outside = os.path.join(self.tmp, "outside")
+        os.makedirs(self.outside)
+        with open(os.path.join(self.outside, "secret.txt"), "w") as f:
+            f.write("secret")
+
+    def tearDown(self):
+        self.ops.close()
+        shutil.rmtree(self.tmp)
+
+    def test_sibling_with_common_prefix_is_outside(self):
+        os.makedirs(os.path.join(self.tmp, "data_evil"))
+        with self.assertRaises(PathEscapeError):
+            self.ops.validate_path(os.path.join(self.tmp, "data_evil", "x"))
+        with self.assertRaises(PathEscapeError):
+            self.ops.make_file("../data_evil/x")
+
+    def test_symlinks_cannot_escape(self):
+        os.symlink(self.outside, os.path.join(self.ops.working_dir, "out"))
+        os.symlink(os.path.join(self.outside, "secret.txt"), os.path.join(self.ops.working_dir, "secret"))
+        with self.assertRaises(PathEscapeError):
+            self.ops.make_file("out/new.txt")
+        with self.assertRaises(PathEscapeError):
+            self.ops.append_to_file("secret", "overwrite")
+        with self.assertRaises(PathEscapeError):
+            self.ops.read_bytes("out/secret.txt")
+        self.assertEqual(os.listdir(self.outside), ["secret.txt"])
+        # Сама ссылка внутри рабочей директории удаляется, цель остается
+        self.ops.remove_file("secret")
+        self.assertTrue(os.path.exists(os.path.join(self.outside, "secret.txt")))
+
+    def test_internal_symlink_and_rename(self):
+        self.ops.make_folder("a/b")
+        os.symlink("a/b", os.path.join(self.ops.working_dir, "shortcut"))
+        self.ops.append_to_file("shortcut/f.txt", "hello")
+        self.assertEqual(self.ops.read_bytes("a/b/f.txt"), b"hello\n")
+
+        self.ops.rename_path("a", "c")
+        self.ops.make_file("c/b/g.txt")
+        self.assertTrue(os.path.isfile(os.path.join(self.ops.working_dir, "c", "b", "g.txt")))
+        with self.assertRaises(FileNotFoundError):
+            self.ops.make_file("a/b/h.txt")
+
+    def test_nested_symlinks_cannot_escape(self):
+        root = self.ops.working_dir
+        archive = os.path.join(root, "evil.zip")
+        with zipfile.ZipFile(archive, "w") as zipf:
+            zipf.writestr("link/pwned", "x")
+        os.makedirs(os.path.join(root, "restore"))
+        os.symlink(self.outside, os.path.join(root, "restore", "link"))
+        with self.assertRaises(PathEscapeError):
+            self.ops.extract_archive("evil.zip", "restore")
+
+        self.ops.make_folder("src/link")
+        with open(os.path.join(root, "src", "link", "pwned"), "w") as f:
+            f.write("x")
+        os.makedirs(os.path.join(root, "copy"))
+        os.symlink(self.outside, os.path.join(root, "copy", "link"))
+        with self.assertRaises(PathEscapeError):
+            self.ops.copy_path(os.path.join(root, "src"), os.path.join(root, "copy"))
+
+        # Ссылка на месте файла в копии заменяется файлом, цель не меняется
+        os.makedirs(os.path.join(root, "mirror", "link"))
+        os.symlink(os.path.join(self.outside, "secret.txt"), os.path.join(root, "mirror", "link", "pwned"))
+        self.ops.synchronize("src", "mirror")
+        self.assertFalse(os.path.islink(os.path.join(root, "mirror", "link", "pwned")))
+        # Отдельный файл тоже не копируется через ссылку на папку
+        with self.assertRaises(PathEscapeError):
+            self.ops.copy_path(os.path.join(root, "src", "link", "pwned"),
+                               os.path.join(root, "copy", "link", "pwned"))
+        self.assertEqual(os.listdir(self.outside), ["secret.txt"])
+        with open(os.path.join(self.outside, "secret.txt")) as f:
+            self.assertEqual(f.read(), "secret")
+
+    def test_navigation_keeps_current_folder(self):
+        self.ops.make_folder("a/b")
+        with redirect_stdout(io.StringIO()):
+            self.ops.navigate("in", "a")
+            self.ops.navigate("in", "b")
+            self.ops.make_file("f.txt")
+            self.ops.navigate("up")
+            self.ops.navigate("up")
+            self.ops.navigate("up")
+        self.assertEqual(self.ops.current_path, self.ops.working_dir)
+        self.assertTrue(os.path.isfile(os.path.join(self.ops.working_dir, "a", "b", "f.txt")))
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.ops = Operations(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+        self.ops.make_folder("logs/old")
+        with open(os.path.join(self.ops.working_dir, "logs", "app.log"), "w") as f:
+            f.write("start\nERROR disk full\nok\nerror again\n")
+        with open(os.path.join(self.ops.working_dir, "logs", "old", "app.log"), "w") as f:
+            f.write("ERROR old\n")
+        with open(os.path.join(self.ops.working_dir, "blob.bin"), "wb") as f:
+            f.write(b"\0ERROR\0")
+
+    def tearDown(self):
+        self.ops.close()
+        shutil.rmtree(self.tmp)
+
+    def found(self, *args, **kwargs):
+        return [(self.ops.get_relative_path(m.path), m.line, m.text)
+                for m in self.ops.find_text(*args, **kwargs)]
+
+    def test_scan_skips_binary_files(self):
+        self.assertEqual(self.found("ERROR"), [
+            (os.path.join("logs", "app.log"), 2, "ERROR disk full"),
+            (os.path.join("logs", "old", "app.log"), 1, "ERROR old"),
+        ])
+        self.assertEqual(len(self.found("error", "logs", ignore_case=True)), 3)
+        self.assertEqual(self.found("ERROR", "logs/old"), [(os.path.join("logs", "old", "app.log"), 1, "ERROR old")])
+
+    def test_ignore_case_for_cyrillic(self):
+        self.ops.append_to_file("disk.log", "Ошибка диска")
+        expected = [("disk.log", 1, "Ошибка диска")]
+        self.assertEqual(self.found("ошибка", ignore_case=True), expected)
+        self.assertEqual(self.found("ОШИБКА", ignore_case=True, index=True), expected)
+        self.assertEqual(self.found("ошибка"), [])
+
+    def test_parallel_scan(self):
+        with mock.patch("src.search.PARALLEL_THRESHOLD", 0), mock.patch("os.cpu_count", return_value=2):
+            self.assertEqual(len(self.found("ERROR")), 2)
+
+    def test_index_follows_changes(self):
+        self.assertEqual(len(self.found("ERROR", index=True)), 2)
+        self.assertIsNotNone(self.ops.trigram_index())
+        self.ops.append_to_file("notes.txt", "needle in a haystack")
+        self.assertEqual(self.found("haystack"), [("notes.txt", 1, "needle in a haystack")])
+        self.ops.remove_file("notes.txt")
+        self.assertEqual(self.found("haystack"), [])
+        # Изменения в обход менеджера находятся по mtime
+        with open(os.path.join(self.ops.working_dir, "logs", "app.log"), "a") as f:
+            f.write("haystack outside\n")
+        self.assertEqual(self.found("haystack"), [(os.path.join("logs", "app.log"), 5, "haystack outside")])
+        self.assertEqual(self.ops.trigram_index().candidates(b"zzzzz"), [])
+
+        # Индекс сохраняется и используется в следующей сессии
+        self.ops.close()
+        ops = Operations(self.ops.working_dir, self.ops.cache_dir)
+        self.assertIsNotNone(ops.trigram_index())
+        self.assertEqual(len(ops.find_text("haystack")), 1)
+        ops.close()
+
+
+class TestDirIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        # Очистка в обратном порядке: сначала закрываются все Operations теста, потом удаляется папка
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.ops = Operations(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+        self.addCleanup(self.ops.close)
+
+    def test_find_dest_folders_tracks_operations(self):
+        self.ops.create_folder(os.path.join("a", "target"))
+        self.ops.create_folder("b")
+        self.assertEqual(self.ops.find_dest_folders("target"),
+                         [os.path.join(self.ops.working_dir, "a", "target")])
+
+        self.ops.rename_file("a", "c")
+        self.assertEqual(self.ops.find_dest_folders("target"),
+                         [os.path.join(self.ops.working_dir, "c", "target")])
+
+        self.ops.delete_folder("c")
+        self.assertEqual(self.ops.find_dest_folders("target"), [])
+
+    def test_index_persists_and_sees_outside_changes(self):
+        self.ops.create_folder("x")
+        self.ops.close()
+        os.makedirs(os.path.join(self.ops.working_dir, "x", "outside"))
+
+        ops = Operations(self.ops.working_dir, self.ops.cache_dir)
+        self.addCleanup(ops.close)
+        self.assertEqual(ops.find_dest_folders("outside"),
+                         [os.path.join(ops.working_dir, "x", "outside")])
+
+    def test_outside_folders_found_after_interval(self):
+        self.ops.create_folder(os.path.join("a", "x"))
+        self.assertEqual(len(self.ops.find_dest_folders("x")), 1)
+        os.makedirs(os.path.join(self.ops.working_dir, "b", "x"))
+        with mock.patch.object(self.ops.dir_index, "refresh", wraps=self.ops.dir_index.refresh) as refresh:
+            for _ in range(5):
+                self.ops.find_dest_folders("missing")
+            self.assertEqual(refresh.call_count, 0)
+
+            with mock.patch("src.dir_index.REFRESH_INTERVAL", 0):
+                self.assertEqual(self.ops.find_dest_folders("x"),
+                                 [os.path.join(self.ops.working_dir, "a", "x"),
+                                  os.path.join(self.ops.working_dir, "b", "x")])
+            self.assertEqual(refresh.call_count, 1)
+
+
+class TestCopy(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.ops = Operations(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+        src = os.path.join(self.ops.working_dir, "src")
+        os.makedirs(os.path.join(src, "sub", "deep"))
+        os.makedirs(os.path.join(self.ops.working_dir, "dst"))
+        for name in ("a.bin", os.path.join("sub", "b.bin"), os.path.join("sub", "deep", "c.bin")):
+            with open(os.path.join(src, name), "wb") as f:
+                f.write(os.urandom(100_000))
+
+    def tearDown(self):
+        self.ops.close()
+        shutil.rmtree(self.tmp)
+
+    def assertSameTree(self, left, right):
+        for root, dirs, files in os.walk(left):
+            for file in files:
+                path = os.path.join(root, file)
+                with open(path, "rb") as a, open(os.path.join(right, os.path.relpath(path, left)), "rb") as b:
+                    self.assertEqual(a.read(), b.read())
+
+    def test_copy_directory_reports_progress(self):
+        updates = []
+        self.ops.copy_file("src", "dst", progress=updates.append)
+        self.assertTrue(updates)
+        self.assertSameTree(os.path.join(self.ops.working_dir, "src"),
+                            os.path.join(self.ops.working_dir, "dst", "src"))
+        self.assertEqual(updates[-1].bytes, 300_000)
+        self.assertEqual(updates[-1].files, 3)
+        self.assertEqual(len(self.ops.find_dest_folders("deep")), 2)
+
+    def test_copy_again_replaces_links(self):
+        src = os.path.join(self.ops.working_dir, "src")
+        os.symlink("a.bin", os.path.join(src, "lnk"))
+        self.ops.copy_path(src, os.path.join(self.ops.working_dir, "dst", "src"))
+        os.remove(os.path.join(src, "lnk"))
+        os.symlink(os.path.join("sub", "b.bin"), os.path.join(src, "lnk"))
+        # В копии ссылка на месте файла: файл не пишется через нее
+        copy = os.path.join(self.ops.working_dir, "dst", "src")
+        os.remove(os.path.join(copy, "sub", "b.bin"))
+        os.symlink(os.path.join("..", "a.bin"), os.path.join(copy, "sub", "b.bin"))
+
+        self.ops.copy_path(src, copy)
+        self.assertEqual(os.readlink(os.path.join(copy, "lnk")), os.path.join("sub", "b.bin"))
+        self.assertFalse(os.path.islink(os.path.join(copy, "sub", "b.bin")))
+        self.assertSameTree(src, copy)
+
+    def test_file_operation_copies_by_default(self):
+        self.ops.file_operation(os.path.join("src", "a.bin"), "dst")
+        with open(os.path.join(self.ops.working_dir, "src", "a.bin"), "rb") as a, \
+                open(os.path.join(self.ops.working_dir, "dst", "a.bin"), "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+
+class TestReadFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.ops = Operations(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+        self.addCleanup(self.ops.close)
+        with open(os.path.join(self.ops.working_dir, "log.txt"), "w") as f:
+            f.writelines(f"line {i}\n" for i in range(1, 101))
+
+    def cat(self, *args):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.ops.read_file("log.txt", *args)
+        return out.getvalue().split(":\n", 1)[1]
+
+    def test_modes(self):
+        self.assertEqual(self.cat(), "".join(f"line {i}\n" for i in range(1, 101)))
+        self.assertEqual(self.cat("head", 2), "line 1\nline 2\n")
+        self.assertEqual(self.cat("tail", 2), "line 99\nline 100\n")
+        self.assertEqual(self.cat("lines", 50, 51), "line 50\nline 51\n")
+        self.assertEqual(self.cat("bytes", 0, 4), "line")
+
+    def test_page_stops_on_request(self):
+        self.ops.next_page = lambda shown, total: False
+        self.assertEqual(self.cat("page", 3), "line 1\nline 2\nline 3\n")
+
+    def test_invalid_arguments(self):
+        self.assertEqual(self.cat("head", 0), "")
+        self.assertEqual(self.cat("tail", 0), "")
+        for args in (("lines",), ("lines", 5, 3), ("head", -1), ("bytes", 4, 0), ("page", 0)):
+            with self.subTest(args=args), redirect_stdout(io.StringIO()), \
+                    mock.patch.object(self.ops, "error") as error:
+                self.ops.read_file("log.txt", *args)
+            error.assert_called_once()
+
+    def test_line_index_is_persisted(self):
+        path = os.path.join(self.ops.working_dir, "log.txt")
+        self.assertEqual(self.ops.line_index.line_count(path), 100)
+        fresh = Operations(self.ops.working_dir, self.ops.cache_dir)
+        self.addCleanup(fresh.close)
+        # Смещения читаются прямо из отображенного файла индекса
+        self.assertIsInstance(fresh.line_index.offsets(path), memoryview)
+        self.assertEqual(fresh.line_index.line_count(path), 100)
+        start, end = fresh.line_index.line_range(path, 99, 2)
+        self.assertEqual(self.ops.read_bytes("log.txt", start, end), b"line 99\nline 100\n")
+
+        os.remove(path)
+        self.assertEqual(self.ops.line_index.prune(), 1)
+        self.assertEqual(os.listdir(os.path.join(self.ops.cache_dir, "lines")), [])
+
+    def test_line_index_across_chunks(self):
+        path = os.path.join(self.ops.working_dir, "log.txt")
+        with open(path, "a") as f:
+            f.writelines(f"line {i}\n" for i in range(101, 1001))
+        with mock.patch("src.reader.CHUNK_SIZE", 7):
+            lines, offsets = LineIndex._build(path)
+        self.assertEqual((lines, list(offsets)), (1000, list(LineIndex._build(path)[1])))
+        # Сохраняется только начало каждой STRIDE-й строки
+        self.assertEqual(len(offsets), -(-1000 // STRIDE))
+        start, end = self.ops.line_index.line_range(path, STRIDE + 3, STRIDE)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read()[start:end].splitlines()[::STRIDE - 1],
+                             [f"line {STRIDE + 3}".encode(), f"line {2 * STRIDE + 2}".encode()])
+
+
+class TestListFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.ops = Operations(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+        os.makedirs(os.path.join(self.ops.working_dir, "sub", "deep"))
+        for name, size in (("b.log", 30), ("a.txt", 10), (os.path.join("sub", "c.log"), 20)):
+            with open(os.path.join(self.ops.working_dir, name), "wb") as f:
+                f.write(b"x" * size)
+
+    def tearDown(self):
+        self.ops.close()
+        shutil.rmtree(self.tmp)
+
+    def ls(self, **options):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.ops.list_files(**options)
+        return out.getvalue().splitlines()
+
+    def test_depth_defaults_to_current_directory(self):
+        self.assertEqual(self.ls(sort="name"), ["a.txt", "b.log", "sub" + os.sep])
+        self.assertIn(os.path.join("sub", "deep") + os.sep, self.ls(depth=0))
+
+    def test_sort_filter_and_pages(self):
+        self.assertEqual(self.ls(depth=0, sort="size", reverse=True, kind="f"),
+                         ["b.log", os.path.join("sub", "c.log"), "a.txt"])
+        self.assertEqual(self.ls(depth=0, pattern="*.log", sort="name"), ["b.log", os.path.join("sub", "c.log")])
+        self.assertEqual(self.ls(sort="name", limit=2, page=2), ["sub" + os.sep])
+
+
+class TestTrash(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.ops = Operations(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+        self.addCleanup(self.ops.close)
+        for i in range(5):
+            path = os.path.join(self.ops.working_dir, "big", f"d{i}", "nested")
+            os.makedirs(path)
+            for j in range(20):
+                open(os.path.join(path, f"f{j}"), "w").close()
+
+    def test_folder_disappears_then_is_purged(self):
+        self.ops.delete_folder("big")
+        self.assertFalse(os.path.exists(os.path.join(self.ops.working_dir, "big")))
+        self.assertTrue(self.ops.trash.wait(10))
+        self.assertEqual(os.listdir(self.ops.trash.trash_dir), [])
+        self.assertEqual(self.ops.trash.status(), [])
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.ops.list_files()
+        self.assertEqual(out.getvalue(), "")
+
+    def test_leftovers_are_cleaned_on_start(self):
+        leftover = os.path.join(self.ops.working_dir, ".trash", "0123-old")
+        os.makedirs(leftover)
+        ops = Operations(self.ops.working_dir, self.ops.cache_dir)
+        self.addCleanup(ops.close)
+        self.assertTrue(ops.trash.wait(10))
+        self.assertFalse(os.path.exists(leftover))
+
+    def test_trash_is_shared_and_stops_on_close(self):
+        other = Operations(self.ops.working_dir, self.ops.cache_dir)
+        self.assertIs(other.trash, self.ops.trash)
+        self.ops.remove_folder("big")
+        self.assertTrue(self.ops.trash.wait(10))
+        threads = list(self.ops.trash._threads)
+        self.assertEqual(len(threads), self.ops.trash.workers + 1)
+        other.close()
+        self.assertTrue(all(thread.is_alive() for thread in threads))
+        self.ops.close()
+        self.ops.close()
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        # Следующий запуск получает новую корзину
+        ops = Operations(self.ops.working_dir, self.ops.cache_dir)
+        self.assertIsNot(ops.trash, self.ops.trash)
+        ops.close()
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.ops = Operations(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+        src = os.path.join(self.ops.working_dir, "src", "nested")
+        os.makedirs(src)
+        for i in range(20):
+            with open(os.path.join(src, f"file{i}.txt"), "w") as f:
+                f.write(f"line {i}\n" * 1000)
+        with open(os.path.join(src, "photo.jpg"), "wb") as f:
+            f.write(os.urandom(4096))
+
+    def tearDown(self):
+        self.ops.close()
+        shutil.rmtree(self.tmp)
+
+    def test_parallel_zip_roundtrip(self):
+        # Пустой набор версий включает последовательную запись через открытый API zipfile
+        for versions in (RAW_WRITE_VERSIONS, set()):
+            for method in ("deflate", "stored", "bzip2", "lzma"):
+                archive = f"out_{method}_{len(versions)}.zip"
+                with self.subTest(method=method, raw=bool(versions)), \
+                        mock.patch("src.archive.RAW_WRITE_VERSIONS", versions):
+                    self.ops.zip_file_or_folder("src", archive, method, workers=4)
+                    with zipfile.ZipFile(os.path.join(self.ops.working_dir, archive)) as zipf:
+                        self.assertIsNone(zipf.testzip())
+                        self.assertEqual(len(zipf.namelist()), 21)
+                        self.assertEqual(zipf.read(os.path.join("nested", "file3.txt")), b"line 3\n" * 1000)
+                        self.assertEqual(zipf.getinfo(os.path.join("nested", "photo.jpg")).compress_type,
+                                         zipfile.ZIP_STORED)
+
+    def test_zip_skips_trash(self):
+        leftover = os.path.join(self.ops.working_dir, ".trash", "0123-old")
+        os.makedirs(leftover)
+        open(os.path.join(leftover, "f"), "w").close()
+        self.ops.make_archive(".", "all.zip")
+        with zipfile.ZipFile(os.path.join(self.ops.working_dir, "all.zip")) as zipf:
+            self.assertFalse([name for name in zipf.namelist() if name.startswith(".trash")])
+            self.assertEqual(len(zipf.namelist()), 21)
+
+    def test_selective_unzip_skips_unchanged(self):
+        self.ops.zip_file_or_folder("src", "out.zip", workers=4)
+        self.ops.unzip_archive("out.zip", "restored", ["nested/file1*"], workers=3)
+        restored = os.path.join(self.ops.working_dir, "restored", "nested")
+        self.assertEqual(sorted(os.listdir(restored)), ["file1.txt"] + [f"file{i}.txt" for i in range(10, 20)])
+
+        with open(os.path.join(restored, "file1.txt"), "w") as f:
+            f.write("changed")
+        archive = os.path.join(self.ops.working_dir, "out.zip")
+        stats = extract_zip(archive, os.path.join(self.ops.working_dir, "restored"), workers=3)
+        self.assertEqual(stats.skipped, 10)
+        self.assertEqual(stats.files, 11)
+        # Скорость распаковки считается по распакованным данным
+        self.assertEqual(stats.throughput, stats.bytes_out / stats.seconds)
+        with open(os.path.join(restored, "file1.txt")) as f:
+            self.assertEqual(f.read(), "line 1\n" * 1000)
+
+    def test_cancel_leaves_nothing_behind(self):
+        archive = os.path.join(self.ops.working_dir, "out.zip")
+        with self.assertRaises(OperationCancelledError):
+            create_zip(os.path.join(self.ops.working_dir, "src"), archive, workers=2, should_stop=lambda: True)
+        self.assertFalse(os.path.exists(archive))
+
+        self.ops.zip_file_or_folder("src", "out.zip", workers=2)
+        calls = []
+
+        def stop_later() -> bool:
+            calls.append(None)
+            return len(calls) > 5
+
+        restored = os.path.join(self.ops.working_dir, "restored")
+        with self.assertRaises(OperationCancelledError):
+            extract_zip(archive, restored, workers=2, should_stop=stop_later)
+        self.assertFalse(os.path.exists(restored))
+
+
+class TestDuplicates(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.ops = Operations(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+        # Последний байт c.bin гарантированно отличается от a.bin
+        big = os.urandom(49_999) + b"?"
+        os.makedirs(os.path.join(self.ops.working_dir, "sub"))
+        for name, data in (("a.bin", big), (os.path.join("sub", "b.bin"), big),
+                           ("c.bin", big[:-1] + b"!"), ("s1.txt", b"same"), ("s2.txt", b"same"),
+                           ("u.txt", b"uniq")):
+            with open(os.path.join(self.ops.working_dir, name), "wb") as f:
+                f.write(data)
+
+    def tearDown(self):
+        self.ops.close()
+        shutil.rmtree(self.tmp)
+
+    def test_groups_and_hardlinks(self):
+        groups = self.ops.collect_duplicates()
+        self.assertEqual([[self.ops.get_relative_path(info.path) for info in group] for group in groups],
+                         [["a.bin", os.path.join("sub", "b.bin")], ["s1.txt", "s2.txt"]])
+
+        linked, freed = self.ops.link_duplicates(groups, "hardlink")
+        self.assertEqual((linked, freed), (2, 50_004))
+        self.assertTrue(os.path.samefile(os.path.join(self.ops.working_dir, "a.bin"),
+                                         os.path.join(self.ops.working_dir, "sub", "b.bin")))
+        # Жесткие ссылки на один inode больше не считаются дубликатами
+        self.assertEqual(self.ops.collect_duplicates(), [])
+
+    def test_changed_keeper_skips_group(self):
+        groups = self.ops.collect_duplicates()
+        keeper = os.path.join(self.ops.working_dir, "a.bin")
+        with open(keeper, "ab") as f:
+            f.write(b"edited")
+        os.utime(keeper, ns=(0, groups[0][0].mtime + 1))
+        self.assertEqual(self.ops.link_duplicates(groups, "hardlink"), (1, 4))
+        with open(os.path.join(self.ops.working_dir, "sub", "b.bin"), "rb") as f:
+            self.assertEqual(len(f.read()), 50_000)
+
+    def test_cache_keeps_other_folders(self):
+        for folder in ("x", "y"):
+            os.makedirs(os.path.join(self.ops.working_dir, folder))
+            for name in ("1.txt", "2.txt"):
+                with open(os.path.join(self.ops.working_dir, folder, name), "w") as f:
+                    f.write(f"{folder} data")
+        self.ops.collect_duplicates("x")
+        self.ops.collect_duplicates("y")
+        with mock.patch("src.dupes.edge_hash", wraps=edge_hash) as hasher:
+            self.assertEqual(len(self.ops.collect_duplicates("x")), 1)
+        hasher.assert_not_called()
+
+
+class TestSync(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.ops = Operations(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+        self.src = os.path.join(self.ops.working_dir, "src")
+        self.dst = os.path.join(self.ops.working_dir, "mirror")
+        os.makedirs(os.path.join(self.src, "sub"))
+        self.write("a.txt", b"alpha")
+        self.write(os.path.join("sub", "big.bin"), os.urandom(20_000))
+
+    def tearDown(self):
+        self.ops.close()
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, data, mode="wb"):
+        with open(os.path.join(self.src, name), mode) as f:
+            f.write(data)
+
+    def read(self, root, name):
+        with open(os.path.join(root, name), "rb") as f:
+            return f.read()
+
+    def test_rolling_checksum(self):
+        data = os.urandom(300)
+        checksum = rolling_checksum(data[:100])
+        for i in range(200):
+            checksum = roll(checksum, data[i], data[i + 100], 100)
+            self.assertEqual(checksum, rolling_checksum(data[i + 1:i + 101]))
+
+    def test_delta_finds_shifted_blocks(self):
+        old = os.urandom(4096)
+        new = old[:1000] + b"inserted" + old[1000:]
+        with open(os.path.join(self.tmp, "old"), "wb") as f:
+            f.write(old)
+        with open(os.path.join(self.tmp, "new"), "wb") as f:
+            f.write(new)
+        ops = compute_delta(os.path.join(self.tmp, "new"), block_signatures(os.path.join(self.tmp, "old"), 512), 512)
+        literal = sum(length for kind, _, length in ops if kind == "data")
+        self.assertLess(literal, 1024 + 8)
+        rebuilt = b"".join(old[offset:offset + length] if kind == "copy" else new[offset:offset + length]
+                           for kind, offset, length in ops)
+        self.assertEqual(rebuilt, new)
+
+    def test_delta_finds_blocks_after_many_insertions(self):
+        old = os.urandom(64 * 512)
+        new = bytearray(old)
+        # Вставки в середине блоков по всему файлу: после каждой окно сдвигается заново
+        for position in sorted(range(300, len(old), 5000), reverse=True):
+            new[position:position] = b"inserted"
+        new = bytes(new)
+        with open(os.path.join(self.tmp, "old"), "wb") as f:
+            f.write(old)
+        with open(os.path.join(self.tmp, "new"), "wb") as f:
+            f.write(new)
+        with mock.patch("src.sync.ROLL_LIMIT", 2 * 512):
+            ops = compute_delta(os.path.join(self.tmp, "new"),
+                                block_signatures(os.path.join(self.tmp, "old"), 512), 512)
+        literal = sum(length for kind, _, length in ops if kind == "data")
+        insertions = len(range(300, len(old), 5000))
+        self.assertLessEqual(literal, insertions * (512 + 8))
+        rebuilt = b"".join(old[offset:offset + length] if kind == "copy" else new[offset:offset + length]
+                           for kind, offset, length in ops)
+        self.assertEqual(rebuilt, new)
+
+    def test_copies_only_changes(self):
+        stats = self.ops.synchronize("src", "mirror")
+        self.assertEqual((stats.files, stats.copied), (2, 2))
+        self.assertEqual(self.read(self.dst, "a.txt"), b"alpha")
+
+        stats = self.ops.synchronize("src", "mirror")
+        self.assertEqual((stats.unchanged, stats.copied, stats.bytes), (2, 0, 0))
+
+        # Изменилось только время: данные не копируются
+        os.utime(os.path.join(self.src, "a.txt"), ns=(0, 10**18))
+        self.write("new.txt", b"new")
+        stats = self.ops.synchronize("src", "mirror")
+        self.assertEqual((stats.touched, stats.copied, stats.unchanged), (1, 1, 1))
+        self.assertEqual(os.stat(os.path.join(self.dst, "a.txt")).st_mtime_ns, 10**18)
+
+    def test_large_files_are_patched(self):
+        self.ops.synchronize("src", "mirror")
+        name = os.path.join("sub", "big.bin")
+        data = bytearray(self.read(self.src, name))
+        data[5000:5010] = b"0123456789"
+        self.write(name, bytes(data))
+        with mock.patch("src.sync.DELTA_THRESHOLD", 0), mock.patch("src.sync.BLOCK_SIZE", 1024):
+            stats = self.ops.synchronize("src", "mirror")
+        self.assertEqual(stats.patched, 1)
+        # Из источника передаются только блоки вокруг изменения
+        self.assertLess(stats.bytes, 2 * 1024)
+        self.assertEqual(self.read(self.dst, name), bytes(data))
+
+        self.write(name, b"tail", "ab")
+        with mock.patch("src.sync.DELTA_THRESHOLD", 0), mock.patch("src.sync.BLOCK_SIZE", 1024):
+            self.ops.synchronize("src", "mirror")
+        self.assertEqual(self.read(self.dst, name), bytes(data) + b"tail")
+
+        # Новая версия заменяет файл целиком: жесткая ссылка на старую не меняется
+        backup = os.path.join(self.tmp, "backup.bin")
+        os.link(os.path.join(self.dst, name), backup)
+        self.write(name, b"more", "ab")
+        with mock.patch("src.sync.DELTA_THRESHOLD", 0), mock.patch("src.sync.BLOCK_SIZE", 1024):
+            self.assertEqual(self.ops.synchronize("src", "mirror").patched, 1)
+        self.assertEqual(self.read(self.dst, name), bytes(data) + b"tailmore")
+        with open(backup, "rb") as f:
+            self.assertEqual(f.read(), bytes(data) + b"tail")
+        self.assertEqual(sorted(os.listdir(os.path.join(self.dst, "sub"))), ["big.bin"])
+
+    def test_delete_extra_files(self):
+        self.ops.synchronize("src", "mirror")
+        os.remove(os.path.join(self.src, "a.txt"))
+        os.makedirs(os.path.join(self.dst, "extra", "deep"))
+        self.assertEqual(self.ops.synchronize("src", "mirror").deleted, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.dst, "a.txt")))
+        self.assertEqual(self.ops.synchronize("src", "mirror", delete=True).deleted, 2)
+        self.assertEqual(sorted(os.listdir(self.dst)), ["sub"])
+
+    def test_nested_folders_rejected(self):
+        with self.assertRaises(ValueError):
+            self.ops.synchronize("src", os.path.join("src", "sub"))
+
+
+class TestDiskUsage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.ops = Operations(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"))
+        root = self.ops.working_dir
+        os.makedirs(os.path.join(root, "logs", "old"))
+        os.makedirs(os.path.join(root, "docs"))
+        for name, size in ((os.path.join("logs", "a.log"), 1000), (os.path.join("logs", "old", "b.log"), 3000),
+                           (os.path.join("docs", "c.txt"), 10), ("top.bin", 5)):
+            with open(os.path.join(root, name), "wb") as f:
+                f.write(b"x" * size)
+
+    def tearDown(self):
+        self.ops.close()
+        shutil.rmtree(self.tmp)
+
+    def usage(self, *args, **kwargs):
+        return [(self.ops.get_relative_path(path), size, files)
+                for path, size, files in self.ops.folder_usage(*args, **kwargs)]
+
+    def test_aggregates(self):
+        self.assertEqual(self.usage(), [(".", 4015, 4), ("logs", 4000, 2), ("docs", 10, 1)])
+        self.assertEqual(self.usage("logs", depth=0), [("logs", 4000, 2), (os.path.join("logs", "old"), 3000, 1)])
+
+    def test_operations_update_totals(self):
+        self.usage()
+        self.ops.append_to_file(os.path.join("docs", "c.txt"), "12345")
+        root = self.ops.working_dir
+        self.ops.copy_path(os.path.join(root, "logs"), os.path.join(root, "docs", "logs"))
+        self.ops.remove_file("top.bin")
+        self.ops.rename_path("logs", "archive")
+        self.ops.make_folder(os.path.join("new", "empty"))
+        self.ops.make_file(os.path.join("new", "empty", "f"))
+        self.ops.make_archive("docs", os.path.join("new", "docs.zip"))
+        expected = self.usage()
+        with mock.patch.object(self.ops.disk_usage, "_scan", side_effect=AssertionError("rescan")):
+            self.assertEqual(self.usage(), expected)
+        zip_size = os.path.getsize(os.path.join(self.ops.working_dir, "new", "docs.zip"))
+        self.assertEqual(expected[0], (".", 8016 + zip_size, 7))
+        self.assertEqual(self.usage(rescan=True), expected)
+
+    def test_hardlinks_counted_once(self):
+        root = self.ops.working_dir
+        os.link(os.path.join(root, "logs", "old", "b.log"), os.path.join(root, "docs", "b.log"))
+        self.assertEqual(self.usage()[0], (".", 4015, 4))
+        self.assertEqual(self.usage("docs")[0], ("docs", 3010, 2))
+        # Удаление одной из ссылок оставляет файл в итогах
+        self.ops.remove_file(os.path.join("logs", "old", "b.log"))
+        self.assertEqual(self.usage()[0], (".", 4015, 4))
+        self.ops.remove_file(os.path.join("docs", "b.log"))
+        self.assertEqual(self.usage()[0], (".", 1015, 3))
+        self.assertEqual(self.usage(rescan=True)[0], (".", 1015, 3))
+
+    def test_refresh_by_mtime_and_persistence(self):
+        self.usage()
+        self.ops.close()
+        ops = Operations(self.ops.working_dir, self.ops.cache_dir)
+        with open(os.path.join(ops.working_dir, "logs", "old", "new.log"), "wb") as f:
+            f.write(b"y" * 500)
+        scanned = []
+        scan = ops.disk_usage._scan
+        with mock.patch.object(ops.disk_usage, "_scan", side_effect=lambda rel: scanned.append(rel) or scan(rel)):
+            total = ops.folder_usage()[0]
+        self.assertEqual(total[1:], (4515, 5))
+        self.assertEqual(scanned, [os.path.join("logs", "old")])
+        ops.close()
+
+
+class TestAsyncOperations(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_async(self, coro_factory):
+        async def main():
+            async with AsyncOperations(os.path.join(self.tmp, "data"), os.path.join(self.tmp, "cache"),
+                                       limits={"copy": 2}) as api:
+                return await coro_factory(api)
+        return asyncio.run(main())
+
+    def test_concurrent_operations_return_results(self):
+        async def scenario(api):
+            await api.mkdir("dst")
+            await asyncio.gather(*(api.write(f"f{i}.txt", f"data {i}") for i in range(10)))
+            results = await asyncio.gather(*(api.copy(f"f{i}.txt", "dst") for i in range(10)))
+            stats = await api.zip("dst", "dst.zip")
+            entries = await api.list_files("dst", sort="name")
+            return results, stats, entries
+
+        results, stats, entries = self.run_async(scenario)
+        self.assertEqual(results[3][0], os.path.join(self.tmp, "data", "dst", "f3.txt"))
+        self.assertEqual(stats.files, 10)
+        self.assertEqual([entry.rel for entry in entries], sorted(f"f{i}.txt" for i in range(10)))
+
+    def test_typed_errors(self):
+        async def scenario(api):
+            await api.mkdir("a/x")
+            await api.mkdir("b/x")
+            await api.touch("f")
+            errors = []
+            for call in (api.rm("missing"), api.copy("f", "x"), api.mkdir("../escape")):
+                try:
+                    await call
+                except Exception as e:
+                    errors.append(type(e))
+            return errors
+
+        self.assertEqual(self.run_async(scenario), [NotFoundError, AmbiguousDestinationError, PathEscapeError])
+
+    def test_timeout_cancels_copy(self):
+        async def scenario(api):
+            await api.mkdir("dst")
+            await api.write("big.txt", "x" * 20 * 1024 * 1024)
+            with self.assertRaises(OperationTimeoutError):
+                await api.copy("big.txt", "dst", progress=lambda stats: time.sleep(0.2), timeout=0.05)
+            await asyncio.sleep(0.3)
+            return os.listdir(os.path.join(api.ops.working_dir, "dst"))
+
+        self.assertEqual(self.run_async(scenario), [])
+
+    def test_timeout_waits_for_running_operation(self):
+        finished = []
+
+        def slow() -> None:
+            time.sleep(0.2)
+            finished.append(True)
+
+        async def scenario(api):
+            with self.assertRaises(OperationTimeoutError):
+                await api._run("copy", slow, timeout=0.01)
+            # Лимит отпущен только после завершения потока
+            return list(finished), api._limits["copy"]._value
+
+        self.assertEqual(self.run_async(scenario), ([True], 2))
+
+    def test_os_errors_are_typed(self):
+        async def scenario(api):
+            await api.mkdir("folder")
+            with self.assertRaises(FileSystemError) as caught:
+                await api.rm("folder")
+            return caught.exception.errno
+
+        self.assertEqual(self.run_async(scenario), errno.EISDIR)
+
+    def test_list_hides_service_folders(self):
+        async def scenario(api):
+            await api.mkdir("x/y")
+            os.makedirs(os.path.join(api.ops.working_dir, ".trash", "0123-old"))
+            entries = await api.list_files(".", depth=0, sort="name")
+            for options in ({"sort": "color"}, {"colour": True}):
+                with self.assertRaises(InvalidArgumentError):
+                    await api.list_files(".", **options)
+            return [entry.rel for entry in entries]
+
+        self.assertEqual(self.run_async(scenario), ["x", os.path.join("x", "y")])
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file